@@ -1,96 +1,1180 @@
+import atexit
+import copy
 import json
 import os
 import logging
-from datetime import datetime
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
-from collections import defaultdict
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows dev environment: single worker, no locking
+    fcntl = None
+
+from app.utils.top_k import SpaceSaving, TOP_K_CAPACITY
+from app.utils.unique_counter import UniqueCounter
 
 logger = logging.getLogger(__name__)
 
+# Legacy single-file stats; imported once into shard 0
 STATS_FILE = Path("backend/data/analytics.json")
+# Кожен воркер uvicorn пише лише у свій шард: знімок + append-only журнал подій
+SHARDS_DIR = STATS_FILE.parent / "analytics_shards"
+MAX_SHARDS = int(os.getenv("ANALYTICS_MAX_SHARDS", "64"))
+SNAPSHOT_NAME = "snapshot.json"
+
+# Знімок агрегатів записується кожні N подій або раз на T секунд
+SNAPSHOT_EVERY_EVENTS = int(os.getenv("ANALYTICS_SNAPSHOT_EVERY", "500"))
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("ANALYTICS_SNAPSHOT_INTERVAL", "60"))
+
+# Фонова черга подій: обмежений розмір, пакетна обробка, семплювання при перевантаженні
+QUEUE_MAX_SIZE = int(os.getenv("ANALYTICS_QUEUE_SIZE", "10000"))
+QUEUE_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "100"))
+QUEUE_OVERLOAD_RATIO = float(os.getenv("ANALYTICS_OVERLOAD_RATIO", "0.8"))
+QUEUE_OVERLOAD_SAMPLE_RATE = float(os.getenv("ANALYTICS_OVERLOAD_SAMPLE_RATE", "0.1"))
+
+# Перегляди можна семплювати під навантаженням, дії користувачів - ні
+SAMPLED_ACTIVITY_TYPES = {"club_view", "book_view", "activity_feed_view", "search_used"}
+CLUB_ACTIVITY_TYPES = {"club_view", "activity_feed_view", "search_used"}
+BOOK_ACTIVITY_TYPES = {"book_view", "review_created", "book_borrowed", "book_returned"}
+
+RECENT_ACTIVITY_LIMIT = 50
+
+# (HTTP метод, шаблон маршруту FastAPI) -> activity_type
+ACTIVITY_ROUTES = {
+    ("GET", "/api/clubs/{club_id}"): "club_view",
+    ("GET", "/api/clubs/{club_id}/activity"): "activity_feed_view",
+    ("GET", "/api/books/book/{book_id}"): "book_view",
+    ("POST", "/api/books/{book_id}/review"): "review_created",
+    ("POST", "/api/books/{book_id}/borrow"): "book_borrowed",
+    ("POST", "/api/books/{book_id}/return"): "book_returned",
+    # Рахується лише якщо є непорожній ?search=
+    ("GET", "/api/books/club/{club_id}"): "search_used",
+}
+
+DAILY_FIELDS = {
+    "clubs_views": 0,
+    "books_views": 0,
+    "reviews": 0,
+    "joins": 0,
+    "activity_feed_views": 0,
+    "search_count": 0,
+    "app_opens": 0,
+    "new_users": 0
+}
+
+# activity_type -> лічильник у daily_activity
+DAILY_COUNTERS = {
+    "club_view": "clubs_views",
+    "book_view": "books_views",
+    "review_created": "reviews",
+    "member_joined": "joins",
+    "activity_feed_view": "activity_feed_views",
+    "search_used": "search_count",
+    "app_opened": "app_opens",
+}
+
+# Rollup-и за часом: гранулярність -> (крок, максимум бакетів у запиті)
+ROLLUP_GRANULARITIES = {
+    "hour": (timedelta(hours=1), 24 * 31),
+    "day": (timedelta(days=1), 366 * 2),
+    "week": (timedelta(weeks=1), 53 * 5),
+}
+ROLLUP_METRICS = [
+    "club_view", "book_view", "activity_feed_view", "search_used", "app_opened",
+    "review_created", "book_borrowed", "book_returned", "member_joined",
+]
+
+# Версія структури знімка; міграція виконується лише для старіших знімків
+SCHEMA_VERSION = 3
+
+# Ретеншн: старіші дні згортаються в місячні агрегати, неактивні клуби/книги видаляються
+DAILY_RETENTION_DAYS = int(os.getenv("ANALYTICS_DAILY_RETENTION_DAYS", "90"))
+ENTITY_RETENTION_DAYS = int(os.getenv("ANALYTICS_ENTITY_RETENTION_DAYS", "180"))
+
+# Рейтинги top-K: метрика -> {activity_type: вага}
+TOP_METRICS = {
+    "club_views": {"club_view": 1},
+    "book_views": {"book_view": 1},
+    "book_borrows": {"book_borrowed": 1},
+    "book_reviews": {"review_created": 1},
+    # Та ж формула, що й "топ за активністю" у дашборді
+    "book_activity": {"book_view": 1, "book_borrowed": 2, "review_created": 3},
+}
+TOP_PERIODS = {"day": 1, "week": 7, "month": 30}
+# Скільки книг клубу (обкладинки для картки в дашборді) віддається з позицією рейтингу клубів
+TOP_CLUB_BOOKS = 6
+TOP_CAPACITY = int(os.getenv("ANALYTICS_TOP_K_CAPACITY", str(TOP_K_CAPACITY)))
+# Денні рейтинги потрібні лише для періодів day/week/month
+TOP_DAILY_RETENTION_DAYS = max(TOP_PERIODS.values())
+
+# Короткі ключі записів у журналі подій
+EVENT_KEYS = {
+    "user_id": "u",
+    "club_id": "c",
+    "club_name": "cn",
+    "club_cover": "cc",
+    "book_id": "b",
+    "book_title": "bt",
+    "book_cover": "bc",
+    "members_count": "mc",
+    "books_count": "bk",
+}
+
+
+def default_stats() -> Dict[str, Any]:
+    return {
+        "clubs": {},  # {club_id: {name, views, members_count, books_count, last_activity}}
+        "books": {},  # {book_id: {title, club_name, views, borrows, reviews, last_activity}}
+        "reviews_total": 0,
+        "unique_users": UniqueCounter(),  # усі користувачі за весь час
+        "daily_activity": {},  # {date: {clubs_views, books_views, reviews, joins, app_opens, new_users}}
+        "daily_users": {},  # {date: UniqueCounter} - активні користувачі за день
+        "daily_app_users": {},  # {date: UniqueCounter} - хто відкривав додаток за день
+        "monthly_activity": {},  # {YYYY-MM: ті ж поля, що й daily_activity} - дні старші за ретеншн
+        "monthly_users": {},  # {YYYY-MM: UniqueCounter}
+        "monthly_app_users": {},  # {YYYY-MM: UniqueCounter}
+        "rollups": {granularity: {} for granularity in ROLLUP_GRANULARITIES},  # {granularity: {bucket: {metric: n}}}
+        "top": {"all": {}, "daily": {}},  # {"all": {metric: SpaceSaving}, "daily": {date: {metric: SpaceSaving}}}
+        "recent_activity": [],  # Last 50 activities
+        "first_activity": None,
+        "last_activity": None,
+        "_schema": SCHEMA_VERSION
+    }
+
+
+def rollup_bucket(granularity: str, moment: datetime) -> str:
+    """Ключ бакета: 2026-10-18T13 (hour), 2026-10-18 (day), 2026-W42 (week)"""
+    if granularity == "hour":
+        return moment.strftime("%Y-%m-%dT%H")
+    if granularity == "day":
+        return moment.strftime("%Y-%m-%d")
+    year, week, _ = moment.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def hydrate_stats(stats: Dict[str, Any]):
+    """Перетворює JSON-представлення лічильників унікальних користувачів на UniqueCounter"""
+    stats["unique_users"] = UniqueCounter.from_json(stats["unique_users"])
+    for key in ("daily_users", "daily_app_users", "monthly_users", "monthly_app_users"):
+        stats[key] = {date: UniqueCounter.from_json(data) for date, data in stats[key].items()}
+    for club in stats["clubs"].values():
+        if "users" in club:
+            club["users"] = UniqueCounter.from_json(club["users"])
+    top = stats["top"]
+    top["all"] = {metric: SpaceSaving.from_json(data) for metric, data in top["all"].items()}
+    top["daily"] = {
+        date: {metric: SpaceSaving.from_json(data) for metric, data in metrics.items()}
+        for date, metrics in top["daily"].items()
+    }
+
+    # Старий формат: окремий запис на кожного користувача у app_opens
+    legacy_opens = stats.pop("app_opens", None)
+    if legacy_opens:
+        for user_id, opens in legacy_opens.items():
+            for ts in (opens["first_open"], opens["last_open"]):
+                stats["daily_app_users"].setdefault(ts[:10], UniqueCounter()).add(user_id)
+        logger.info(f"Analytics migration: folded {len(legacy_opens)} app_opens entries into daily counters")
+
+
+def encode_stats(value):
+    """json.dump default= для UniqueCounter і SpaceSaving"""
+    if isinstance(value, (UniqueCounter, SpaceSaving)):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def migrate_stats(stats: Dict[str, Any]) -> bool:
+    """
+    Доводить структуру знімка до SCHEMA_VERSION.
+
+    Знімки поточної версії не обходяться, тож повний прохід по датах
+    виконується один раз - при першому старті після оновлення, після чого
+    воркер одразу перезаписує свій знімок. Повертає True, якщо була міграція.
+    """
+    if stats.get("_schema") == SCHEMA_VERSION:
+        return False
+
+    # Міграція структури: додаємо нові поля якщо їх немає
+    for key, default_value in default_stats().items():
+        if key not in stats:
+            stats[key] = default_value
+            logger.info(f"Analytics migration: added missing key '{key}'")
+
+    # Мігруємо daily_activity: додаємо нові поля в існуючі дати
+    for date, daily_data in stats.get("daily_activity", {}).items():
+        for field, default_val in DAILY_FIELDS.items():
+            daily_data.setdefault(field, default_val)
 
-def ensure_stats_file():
-    STATS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    if not STATS_FILE.exists():
-        STATS_FILE.write_text(json.dumps({
-            "clubs": {},  # {club_id: {name, views, members_count, books_count, last_activity}}
-            "books": {},  # {book_id: {title, club_name, views, borrows, reviews, last_activity}}
-            "reviews_total": 0,
-            "unique_users": [],
-            "daily_activity": {},  # {date: {clubs_views, books_views, reviews, joins, app_opens, new_users}}
-            "recent_activity": [],  # Last 50 activities
-            "first_activity": None,
-            "last_activity": None,
-            "app_opens": {}  # {user_id: {first_open, last_open, total_opens}}
-        }, indent=2))
-
-def load_stats() -> Dict[str, Any]:
-    ensure_stats_file()
+    stats["_schema"] = SCHEMA_VERSION
+    return True
+
+
+def load_stats(path: Path = STATS_FILE) -> Dict[str, Any]:
+    if not path.exists():
+        return default_stats()
     try:
-        with open(STATS_FILE, 'r', encoding='utf-8') as f:
+        with open(path, 'r', encoding='utf-8') as f:
             stats = json.load(f)
-        
-        # Міграція структури: додаємо нові поля якщо їх немає
-        migrated = False
-        
-        # Перевіряємо основні ключі
-        default_structure = {
-            "clubs": {},
-            "books": {},
-            "reviews_total": 0,
-            "unique_users": [],
-            "daily_activity": {},
-            "recent_activity": [],
-            "first_activity": None,
-            "last_activity": None,
-            "app_opens": {}  # {user_id: {first_open, last_open, total_opens}}
-        }
-        
-        for key, default_value in default_structure.items():
-            if key not in stats:
-                stats[key] = default_value
-                migrated = True
-                logger.info(f"Analytics migration: added missing key '{key}'")
-        
-        # Мігруємо daily_activity: додаємо нові поля в існуючі дати
-        required_daily_fields = {
-            "clubs_views": 0,
-            "books_views": 0,
-            "reviews": 0,
-            "joins": 0,
-            "activity_feed_views": 0,
-            "search_count": 0,
-            "app_opens": 0,
-            "new_users": 0
-        }
-        
-        for date, daily_data in stats.get("daily_activity", {}).items():
-            for field, default_val in required_daily_fields.items():
-                if field not in daily_data:
-                    daily_data[field] = default_val
-                    migrated = True
-        
-        if migrated:
-            logger.info("Analytics structure migrated successfully")
-            save_stats(stats)
-        
+
+        migrate_stats(stats)
+        hydrate_stats(stats)
         return stats
-        
+
     except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse analytics.json: {e}")
-        return default_structure
+        logger.error(f"Failed to parse {path}: {e}")
+        return default_stats()
     except Exception as e:
         logger.error(f"Failed to load analytics: {e}")
-        return default_structure
+        return default_stats()
+
+def save_stats(stats: Dict[str, Any], path: Path = STATS_FILE) -> bool:
+    """
+    Атомарно записує знімок: тимчасовий файл + fsync, rename, fsync каталогу.
 
-def save_stats(stats: Dict[str, Any]):
-    ensure_stats_file()
+    Повертає False, якщо знімок не записано: тоді сегменти журналу, які він
+    мав замінити, видаляти не можна.
+    """
+    tmp_file = path.with_suffix(".tmp")
     try:
-        with open(STATS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(stats, f, indent=2, ensure_ascii=False)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, separators=(",", ":"), default=encode_stats)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+        # rename durable лише після fsync каталогу (на Windows каталог не відкрити)
+        if os.name == "posix":
+            dir_fd = os.open(path.parent, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        return True
     except Exception as e:
         logger.error(f"Failed to save analytics: {e}")
+        try:
+            tmp_file.unlink()
+        except OSError:
+            pass
+        return False
+
+
+def apply_event(stats: Dict[str, Any], event: Dict[str, Any]):
+    """Застосовує одну подію журналу до агрегатів у пам'яті"""
+    activity_type = event["a"]
+    now = event["ts"]
+    today = now[:10]
+    user_id = event.get("u")
+    club_id = event.get("c")
+    club_name = event.get("cn")
+    club_cover = event.get("cc")
+    book_id = event.get("b")
+    book_title = event.get("bt")
+    book_cover = event.get("bc")
+    members_count = event.get("mc")
+    books_count = event.get("bk")
+
+    # Track unique users: O(1) для точної множини і для скетчу
+    if user_id:
+        stats["unique_users"].add(user_id)
+        daily_users = stats["daily_users"].get(today)
+        if daily_users is None:
+            daily_users = stats["daily_users"][today] = UniqueCounter()
+        daily_users.add(user_id)
+
+    # Track clubs
+    if club_id and club_name:
+        club_key = str(club_id)
+        if club_key not in stats["clubs"]:
+            stats["clubs"][club_key] = {
+                "name": club_name,
+                "cover_url": club_cover,
+                "views": 0,
+                "members_count": members_count or 0,
+                "books_count": books_count or 0,
+                "books": {},
+                "users": UniqueCounter(),
+                "last_activity": now
+            }
+
+        club = stats["clubs"][club_key]
+        if user_id:
+            if "users" not in club:
+                club["users"] = UniqueCounter()
+            club["users"].add(user_id)
+        club["name"] = club_name  # Update in case changed
+        if club_cover:
+            club["cover_url"] = club_cover
+        club["last_activity"] = now
+
+        if activity_type == "club_view":
+            club["views"] += 1
+
+        # Update counts if provided
+        if members_count is not None:
+            club["members_count"] = members_count
+        if books_count is not None:
+            club["books_count"] = books_count
+
+    # Track books
+    if book_id and book_title:
+        book_key = str(book_id)
+        if book_key not in stats["books"]:
+            stats["books"][book_key] = {
+                "title": book_title,
+                "cover_url": book_cover,
+                "club_name": club_name or "Unknown",
+                "views": 0,
+                "borrows": 0,
+                "reviews": 0,
+                "last_activity": now
+            }
+
+        book = stats["books"][book_key]
+        book["title"] = book_title  # Update in case changed
+        if book_cover:
+            book["cover_url"] = book_cover
+        book["last_activity"] = now
+
+        # Add book to club's books list
+        if club_id:
+            club_key = str(club_id)
+            if club_key in stats["clubs"]:
+                stats["clubs"][club_key].setdefault("books", {})[book_key] = {
+                    "title": book_title,
+                    "cover_url": book_cover
+                }
+
+        if activity_type == "book_view":
+            book["views"] += 1
+        elif activity_type == "book_borrowed":
+            book["borrows"] += 1
+        elif activity_type == "review_created":
+            book["reviews"] += 1
+            stats["reviews_total"] += 1
+
+    # Daily activity
+    daily = stats["daily_activity"].get(today)
+    if daily is None:
+        daily = stats["daily_activity"][today] = dict(DAILY_FIELDS)
+
+    counter = DAILY_COUNTERS.get(activity_type)
+    if counter:
+        daily[counter] += 1
+
+    # Рейтинги top-K: за весь час і за день
+    if club_id and activity_type in TOP_METRICS["club_views"]:
+        update_top(stats["top"], today, "club_views", club_id, 1)
+    if book_id:
+        for metric in ("book_views", "book_borrows", "book_reviews", "book_activity"):
+            weight = TOP_METRICS[metric].get(activity_type)
+            if weight:
+                update_top(stats["top"], today, metric, book_id, weight)
+
+    # Rollup-и оновлюються інкрементально, запит за діапазоном не сканує історію
+    moment = datetime.fromisoformat(now)
+    for granularity, series in stats["rollups"].items():
+        bucket = rollup_bucket(granularity, moment)
+        counters = series.get(bucket)
+        if counters is None:
+            counters = series[bucket] = {}
+        counters[activity_type] = counters.get(activity_type, 0) + 1
+
+    # Хто відкривав додаток за день; new_users виводиться з цих лічильників у recount_new_users
+    if activity_type == "app_opened" and user_id:
+        app_users = stats["daily_app_users"].get(today)
+        if app_users is None:
+            app_users = stats["daily_app_users"][today] = UniqueCounter()
+        app_users.add(user_id)
+
+    # Recent activity log (keep last 50)
+    activity_entry = {
+        "timestamp": now,
+        "type": activity_type,
+        "user_id": user_id
+    }
+    if club_name:
+        activity_entry["club"] = club_name
+    if book_title:
+        activity_entry["book"] = book_title
+
+    recent = stats["recent_activity"]
+    recent.insert(0, activity_entry)
+    del recent[RECENT_ACTIVITY_LIMIT:]
+
+    # Timestamps
+    if not stats["first_activity"]:
+        stats["first_activity"] = now
+    stats["last_activity"] = now
+
+
+def compact_stats(stats: Dict[str, Any], now: Optional[datetime] = None) -> int:
+    """
+    Тримає розмір агрегатів обмеженим.
+
+    - дні, старші за DAILY_RETENTION_DAYS, згортаються у monthly_activity
+      (лічильники додаються, унікальні користувачі зливаються в місячні);
+    - бакети rollup-ів, старші за максимальний діапазон запиту, видаляються;
+    - клуби та книги без активності довше ENTITY_RETENTION_DAYS видаляються.
+
+    Повертає кількість згорнутих/видалених записів.
+    """
+    now = now or datetime.now()
+    removed = 0
+
+    daily_cutoff = (now - timedelta(days=DAILY_RETENTION_DAYS)).strftime("%Y-%m-%d")
+    for date in [d for d in stats["daily_activity"] if d < daily_cutoff]:
+        daily = stats["daily_activity"].pop(date)
+        monthly = stats["monthly_activity"].setdefault(date[:7], dict(DAILY_FIELDS))
+        for field, value in daily.items():
+            monthly[field] = monthly.get(field, 0) + value
+        removed += 1
+
+    for daily_key, monthly_key in (("daily_users", "monthly_users"),
+                                   ("daily_app_users", "monthly_app_users")):
+        for date in [d for d in stats[daily_key] if d < daily_cutoff]:
+            counter = stats[daily_key].pop(date)
+            month = stats[monthly_key].get(date[:7])
+            if month is None:
+                stats[monthly_key][date[:7]] = counter
+            else:
+                month.merge(counter)
+
+    for granularity, (step, max_buckets) in ROLLUP_GRANULARITIES.items():
+        series = stats["rollups"].get(granularity, {})
+        # Ключі бакетів упорядковані лексикографічно так само, як за часом
+        cutoff = rollup_bucket(granularity, now - step * max_buckets)
+        for bucket in [b for b in series if b < cutoff]:
+            del series[bucket]
+            removed += 1
+
+    entity_cutoff = (now - timedelta(days=ENTITY_RETENTION_DAYS)).isoformat()
+    for key in ("clubs", "books"):
+        for entity_key in [k for k, v in stats[key].items() if v.get("last_activity", "") < entity_cutoff]:
+            del stats[key][entity_key]
+            removed += 1
+    for club in stats["clubs"].values():
+        books = club.get("books", {})
+        for book_key in [k for k in books if k not in stats["books"]]:
+            del books[book_key]
+
+    top_cutoff = (now - timedelta(days=TOP_DAILY_RETENTION_DAYS)).strftime("%Y-%m-%d")
+    for date in [d for d in stats["top"]["daily"] if d < top_cutoff]:
+        del stats["top"]["daily"][date]
+        removed += 1
+    for metric, summary in stats["top"]["all"].items():
+        entities = stats["clubs"] if metric.startswith("club_") else stats["books"]
+        for key in [k for k in summary.counters if k not in entities]:
+            summary.discard(key)
+
+    return removed
+
+
+def update_top(top: Dict[str, Any], date: str, metric: str, key, weight: int):
+    for summaries in (top["all"], top["daily"].setdefault(date, {})):
+        summary = summaries.get(metric)
+        if summary is None:
+            summary = summaries[metric] = SpaceSaving(TOP_CAPACITY)
+        summary.add(key, weight)
+
+
+def merge_top(target: Dict[str, SpaceSaving], other: Dict[str, SpaceSaving]):
+    for metric, summary in other.items():
+        if metric in target:
+            target[metric].merge(summary)
+        else:
+            target[metric] = summary.copy()
+
+
+def segment_path(shard_dir: Path, segment_id: int) -> Path:
+    return shard_dir / f"segment_{segment_id:06d}.jsonl"
+
+
+def list_segments(shard_dir: Path) -> List[int]:
+    segments = []
+    for path in shard_dir.glob("segment_*.jsonl"):
+        try:
+            segments.append(int(path.stem.split("_", 1)[1]))
+        except ValueError:
+            continue
+    return sorted(segments)
+
+
+def replay_segment(stats: Dict[str, Any], path: Path) -> int:
+    replayed = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                # Обірваний рядок: аварійна зупинка або запис, що ще триває
+                continue
+            apply_event(stats, event)
+            replayed += 1
+    return replayed
+
+
+def read_shard(shard_dir: Path) -> Dict[str, Any]:
+    """
+    Читає чужий шард: знімок + хвіст журналу після нього.
+
+    Власник шарду може зробити новий знімок і видалити сегменти, поки ми
+    читаємо, тому після читання перевіряємо, що знімок не змінився.
+    """
+    snapshot = shard_dir / SNAPSHOT_NAME
+    for _ in range(5):
+        stats = load_stats(snapshot)
+        first_segment = stats.get("_segment", 0)
+        try:
+            for segment_id in list_segments(shard_dir):
+                if segment_id >= first_segment:
+                    replay_segment(stats, segment_path(shard_dir, segment_id))
+        except FileNotFoundError:
+            continue
+        if load_stats(snapshot).get("_segment", 0) == first_segment:
+            return stats
+    logger.warning(f"Analytics: shard {shard_dir.name} kept changing while reading")
+    return stats
+
+
+def merge_stats(target: Dict[str, Any], other: Dict[str, Any]):
+    """Додає агрегати шарду other до target"""
+    for club_key, club in other["clubs"].items():
+        mine = target["clubs"].get(club_key)
+        if mine is None:
+            target["clubs"][club_key] = copy.deepcopy(club)
+            continue
+        mine["views"] += club.get("views", 0)
+        mine.setdefault("books", {}).update(club.get("books", {}))
+        if "users" in club:
+            if "users" in mine:
+                mine["users"].merge(club["users"])
+            else:
+                mine["users"] = club["users"].copy()
+        # Назва, обкладинка та лічильники - з найсвіжішої події
+        if club.get("last_activity", "") > mine.get("last_activity", ""):
+            for field in ("name", "cover_url", "members_count", "books_count", "last_activity"):
+                if club.get(field) is not None:
+                    mine[field] = club[field]
+
+    for book_key, book in other["books"].items():
+        mine = target["books"].get(book_key)
+        if mine is None:
+            target["books"][book_key] = copy.deepcopy(book)
+            continue
+        for field in ("views", "borrows", "reviews"):
+            mine[field] += book.get(field, 0)
+        if book.get("last_activity", "") > mine.get("last_activity", ""):
+            for field in ("title", "cover_url", "club_name", "last_activity"):
+                if book.get(field) is not None:
+                    mine[field] = book[field]
+
+    target["reviews_total"] += other["reviews_total"]
+
+    merge_top(target["top"]["all"], other["top"]["all"])
+    for date, summaries in other["top"]["daily"].items():
+        merge_top(target["top"]["daily"].setdefault(date, {}), summaries)
+
+    for granularity, series in other["rollups"].items():
+        merge_rollups(target["rollups"].setdefault(granularity, {}), series)
+
+    target["unique_users"].merge(other["unique_users"])
+
+    for date, daily in other["daily_activity"].items():
+        mine = target["daily_activity"].setdefault(date, dict(DAILY_FIELDS))
+        for field, value in daily.items():
+            mine[field] = mine.get(field, 0) + value
+
+    for date, monthly in other["monthly_activity"].items():
+        mine = target["monthly_activity"].setdefault(date, dict(DAILY_FIELDS))
+        for field, value in monthly.items():
+            mine[field] = mine.get(field, 0) + value
+
+    for key in ("daily_users", "daily_app_users", "monthly_users", "monthly_app_users"):
+        for date, counter in other[key].items():
+            if date in target[key]:
+                target[key][date].merge(counter)
+            else:
+                target[key][date] = counter.copy()
+
+    recent = target["recent_activity"] + other["recent_activity"]
+    recent.sort(key=lambda entry: entry["timestamp"], reverse=True)
+    target["recent_activity"] = recent[:RECENT_ACTIVITY_LIMIT]
+
+    firsts = [ts for ts in (target["first_activity"], other["first_activity"]) if ts]
+    target["first_activity"] = min(firsts) if firsts else None
+    lasts = [ts for ts in (target["last_activity"], other["last_activity"]) if ts]
+    target["last_activity"] = max(lasts) if lasts else None
+
+
+def merge_rollups(target: Dict[str, Dict[str, int]], series: Dict[str, Dict[str, int]]):
+    for bucket, counters in series.items():
+        mine = target.get(bucket)
+        if mine is None:
+            target[bucket] = dict(counters)
+            continue
+        for metric, value in counters.items():
+            mine[metric] = mine.get(metric, 0) + value
+
+
+def recount_new_users(stats: Dict[str, Any]):
+    """
+    Виводить daily new_users з денних лічильників daily_app_users.
+
+    Новий користувач дня - той, кого немає в об'єднанні всіх попередніх днів.
+    Так користувач, що вперше відкрив додаток у різних воркерах, рахується
+    один раз, і не потрібно зберігати запис на кожного користувача.
+    Згорнуті місяці передують усім денним записам (див. compact_stats).
+    """
+    for daily in list(stats["monthly_activity"].values()) + list(stats["daily_activity"].values()):
+        daily["new_users"] = 0
+
+    seen = UniqueCounter()
+    for month in sorted(stats["monthly_app_users"]):
+        before = seen.count()
+        seen.merge(stats["monthly_app_users"][month])
+        monthly = stats["monthly_activity"].get(month)
+        if monthly is not None:
+            monthly["new_users"] = max(seen.count() - before, 0)
+
+    for date in sorted(stats["daily_app_users"]):
+        before = seen.count()
+        seen.merge(stats["daily_app_users"][date])
+        daily = stats["daily_activity"].get(date)
+        if daily is not None:
+            daily["new_users"] = max(seen.count() - before, 0)
+
+
+def present_stats(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Замінює лічильники унікальних користувачів на числа для API"""
+    stats.pop("_segment", None)
+    stats.pop("_schema", None)
+    stats.pop("rollups", None)
+    stats.pop("top", None)
+    stats["unique_users_count"] = stats.pop("unique_users").count()
+    daily_users = stats.pop("daily_users")
+    stats.pop("daily_app_users")
+    for date, daily in stats["daily_activity"].items():
+        counter = daily_users.get(date)
+        daily["active_users"] = counter.count() if counter else 0
+    monthly_users = stats.pop("monthly_users")
+    stats.pop("monthly_app_users")
+    for month, monthly in stats["monthly_activity"].items():
+        counter = monthly_users.get(month)
+        monthly["active_users"] = counter.count() if counter else 0
+    for club in stats["clubs"].values():
+        users = club.pop("users", None)
+        club["unique_users"] = users.count() if users else 0
+    return stats
+
+
+class AnalyticsEngine:
+    """
+    Агрегати аналітики в пам'яті + append-only журнал подій.
+
+    Кожна подія дописується одним компактним рядком у поточний сегмент журналу,
+    тому вартість події не залежить від розміру історії. Періодично агрегати
+    зберігаються атомарним знімком, а сегменти, що вже увійшли до знімка,
+    видаляються. При старті знімок доповнюється лише хвостом журналу.
+
+    Кожен процес (воркер uvicorn) захоплює власний шард через flock, тому
+    у файли шарду завжди пише рівно один процес. get_stats() зливає свій
+    шард з усіма іншими.
+    """
+
+    def __init__(self, shards_dir: Path = SHARDS_DIR):
+        self.shards_dir = shards_dir
+        self.shard_dir: Optional[Path] = None
+        self._shard_lock = None
+        self._lock = threading.Lock()
+        self._stats: Optional[Dict[str, Any]] = None
+        self._segment_id = 0
+        self._segment = None
+        self._events_since_snapshot = 0
+        self._last_snapshot = time.monotonic()
+        self._compacted_on: Optional[str] = None
+        self._shard_cache: Dict[Path, Tuple[Any, Dict[str, Any]]] = {}
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.shard_dir / SNAPSHOT_NAME
+
+    def _claim_shard(self):
+        """Захоплює перший вільний шард (лок тримається до завершення процесу)"""
+        for shard_id in range(MAX_SHARDS):
+            shard_dir = self.shards_dir / f"shard_{shard_id:02d}"
+            shard_dir.mkdir(parents=True, exist_ok=True)
+            lock_file = open(shard_dir / ".lock", 'a')
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    continue
+            self.shard_dir = shard_dir
+            self._shard_lock = lock_file
+            logger.info(f"Analytics: process {os.getpid()} writes to {shard_dir.name}")
+            return
+        raise RuntimeError(f"No free analytics shard out of {MAX_SHARDS}")
+
+    def _ensure_loaded(self):
+        if self._stats is not None:
+            return
+
+        self._claim_shard()
+        if self.snapshot_path.exists():
+            self._stats = load_stats(self.snapshot_path)
+        elif self.shard_dir.name == "shard_00" and STATS_FILE.exists():
+            # Одноразовий імпорт старого analytics.json
+            self._stats = load_stats(STATS_FILE)
+            self._stats["_segment"] = 0
+            save_stats(self._stats, self.snapshot_path)
+            logger.info(f"Analytics: imported legacy {STATS_FILE} into shard_00")
+        else:
+            self._stats = default_stats()
+        first_segment = self._stats.get("_segment", 0)
+
+        replayed = 0
+        tail = [s for s in list_segments(self.shard_dir) if s >= first_segment]
+        for segment_id in tail:
+            replayed += replay_segment(self._stats, segment_path(self.shard_dir, segment_id))
+        if replayed:
+            logger.info(f"Analytics: replayed {replayed} events from journal tail")
+
+        self._segment_id = tail[-1] if tail else first_segment
+        self._segment = open(segment_path(self.shard_dir, self._segment_id), 'a', encoding='utf-8')
+        # Знімок при старті: хвіст журналу згортається, міграція структури
+        # (load_stats) і компакція зберігаються, тож наступні завантаження їх не повторюють
+        self._compact_locked()
+        self._snapshot_locked()
+
+    def _compact_locked(self):
+        """Компакція раз на календарний день (під self._lock)"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        if self._compacted_on == today:
+            return
+        removed = compact_stats(self._stats)
+        self._compacted_on = today
+        if removed:
+            logger.info(f"Analytics: compacted {removed} entries in {self.shard_dir.name}")
+
+    def _snapshot_locked(self):
+        """Зберігає знімок і починає новий сегмент журналу (під self._lock)"""
+        old_segment_id = self._segment_id
+        self._segment.close()
+        self._compact_locked()
+
+        self._segment_id += 1
+        self._stats["_segment"] = self._segment_id
+
+        # Сегменти до знімка більше не потрібні - але лише якщо знімок на диску.
+        # Інакше на диску лишається попередній знімок, і після рестарту ці сегменти
+        # (разом з новим) відтворюються поверх нього
+        if save_stats(self._stats, self.snapshot_path):
+            for segment_id in list_segments(self.shard_dir):
+                if segment_id <= old_segment_id:
+                    try:
+                        segment_path(self.shard_dir, segment_id).unlink()
+                    except OSError as e:
+                        logger.warning(f"Analytics: failed to remove segment {segment_id}: {e}")
+        else:
+            logger.warning(f"Analytics: snapshot of {self.shard_dir.name} failed, keeping journal segments")
+
+        self._segment = open(segment_path(self.shard_dir, self._segment_id), 'a', encoding='utf-8')
+        self._events_since_snapshot = 0
+        self._last_snapshot = time.monotonic()
+
+    def track(self, event: Dict[str, Any]):
+        self.track_many([event])
+
+    def track_many(self, events: List[Dict[str, Any]]):
+        lines = "".join(
+            json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for event in events
+        )
+        with self._lock:
+            self._ensure_loaded()
+            for event in events:
+                apply_event(self._stats, event)
+            # Один write на пакет: рядки не перемішуються з частковими записами
+            self._segment.write(lines)
+            self._segment.flush()
+            self._events_since_snapshot += len(events)
+
+            if (self._events_since_snapshot >= SNAPSHOT_EVERY_EVENTS or
+                    time.monotonic() - self._last_snapshot >= SNAPSHOT_INTERVAL_SECONDS):
+                self._snapshot_locked()
+
+    def _read_other_shard(self, shard_dir: Path) -> Dict[str, Any]:
+        """
+        read_shard з кешем: шард перечитується, лише якщо змінився його знімок
+        або сегменти журналу. Результат не можна змінювати - merge_stats копіює.
+        """
+        try:
+            snapshot = shard_dir / SNAPSHOT_NAME
+            signature = (
+                snapshot.stat().st_mtime_ns if snapshot.exists() else None,
+                tuple((s, segment_path(shard_dir, s).stat().st_size) for s in list_segments(shard_dir))
+            )
+        except FileNotFoundError:
+            signature = None
+
+        cached = self._shard_cache.get(shard_dir)
+        if signature is not None and cached and cached[0] == signature:
+            return cached[1]
+
+        stats = read_shard(shard_dir)
+        if signature is not None:
+            self._shard_cache[shard_dir] = (signature, stats)
+        return stats
+
+    def _other_shards(self) -> List[Path]:
+        return [
+            shard_dir for shard_dir in sorted(self.shards_dir.glob("shard_*"))
+            if shard_dir != self.shard_dir and shard_dir.is_dir()
+        ]
+
+    def get_rollups(self, granularity: str, buckets: List[str]) -> Dict[str, Dict[str, int]]:
+        """Лічильники лише для вказаних бакетів, злиті з усіх шардів"""
+        with self._lock:
+            self._ensure_loaded()
+            local = self._stats["rollups"][granularity]
+            result = {bucket: dict(local.get(bucket, {})) for bucket in buckets}
+
+        for shard_dir in self._other_shards():
+            series = self._read_other_shard(shard_dir)["rollups"].get(granularity, {})
+            for bucket in buckets:
+                counters = series.get(bucket)
+                if counters:
+                    mine = result[bucket]
+                    for metric, value in counters.items():
+                        mine[metric] = mine.get(metric, 0) + value
+        return result
+
+    def get_top(self, metric: str, dates: Optional[List[str]], limit: int) -> List[Dict[str, Any]]:
+        """
+        Топ елементів за метрикою: dates=None - за весь час, інакше сума денних рейтингів.
+
+        Зливаються лише рейтинги (не більше TOP_CAPACITY записів на шард і день),
+        метадані беруться точковими зверненнями до clubs/books.
+        """
+        entity_key = "clubs" if metric.startswith("club_") else "books"
+
+        def summaries_of(stats):
+            top = stats["top"]
+            if dates is None:
+                return [top["all"].get(metric)]
+            return [top["daily"].get(date, {}).get(metric) for date in dates]
+
+        merged = SpaceSaving(TOP_CAPACITY)
+        with self._lock:
+            self._ensure_loaded()
+            for summary in summaries_of(self._stats):
+                if summary:
+                    merged.merge(summary)
+            sources = [self._stats[entity_key]]
+
+        for shard_dir in self._other_shards():
+            stats = self._read_other_shard(shard_dir)
+            for summary in summaries_of(stats):
+                if summary:
+                    merged.merge(summary)
+            sources.append(stats[entity_key])
+
+        items = []
+        with self._lock:
+            for key, count, error in merged.top(limit):
+                item = {"id": int(key) if key.isdigit() else key, "count": count, "error": error}
+                # Найсвіжіші метадані серед шардів
+                found = [source[key] for source in sources if key in source]
+                if found:
+                    entity = max(found, key=lambda e: e.get("last_activity", ""))
+                    for field in ("name", "title", "cover_url", "club_name", "members_count",
+                                  "books_count", "last_activity"):
+                        if field in entity:
+                            item[field] = entity[field]
+                    # Лічильники шардів адитивні
+                    for field in ("views", "borrows", "reviews"):
+                        if field in entity:
+                            item[field] = sum(e.get(field, 0) for e in found)
+                    if entity_key == "clubs":
+                        books = {}
+                        for e in found:
+                            books.update(e.get("books", {}))
+                        item["books"] = [
+                            {"id": int(book_key) if book_key.isdigit() else book_key, **book}
+                            for book_key, book in list(books.items())[:TOP_CLUB_BOOKS]
+                        ]
+                items.append(item)
+        return items
+
+    def get_local_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure_loaded()
+            return copy.deepcopy(self._stats)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Merge-on-read: власний шард з пам'яті + інші шарди з диска"""
+        stats = self.get_local_stats()
+        for shard_dir in self._other_shards():
+            merge_stats(stats, self._read_other_shard(shard_dir))
+        # Шарди компактуються незалежно; вирівнюємо межу згортання для злитого результату
+        compact_stats(stats)
+        recount_new_users(stats)
+        return present_stats(stats)
+
+    def get_summary(self) -> Dict[str, Any]:
+        """
+        Підсумки для дашборду без словників clubs/books/daily_activity.
+
+        Розмір відповіді не залежить від історії: лічильники, унікальні користувачі
+        та останні RECENT_ACTIVITY_LIMIT подій, злиті з усіх шардів.
+        """
+        club_keys, book_keys = set(), set()
+        unique_users, app_users = UniqueCounter(), UniqueCounter()
+        summary = {"reviews_total": 0, "first_activity": None, "last_activity": None}
+        recent: List[Dict[str, Any]] = []
+
+        def add(stats):
+            club_keys.update(stats["clubs"])
+            book_keys.update(stats["books"])
+            summary["reviews_total"] += stats.get("reviews_total", 0)
+            unique_users.merge(stats["unique_users"])
+            # Нові користувачі за весь час - об'єднання всіх, хто відкривав додаток
+            # (сума new_users з recount_new_users телескопується до цього ж числа)
+            for key in ("monthly_app_users", "daily_app_users"):
+                for counter in stats[key].values():
+                    app_users.merge(counter)
+            recent.extend(stats["recent_activity"])
+            firsts = [ts for ts in (summary["first_activity"], stats["first_activity"]) if ts]
+            summary["first_activity"] = min(firsts) if firsts else None
+            lasts = [ts for ts in (summary["last_activity"], stats["last_activity"]) if ts]
+            summary["last_activity"] = max(lasts) if lasts else None
+
+        with self._lock:
+            self._ensure_loaded()
+            add(self._stats)
+        for shard_dir in self._other_shards():
+            add(self._read_other_shard(shard_dir))
+
+        recent.sort(key=lambda entry: entry["timestamp"], reverse=True)
+        summary.update({
+            "clubs_count": len(club_keys),
+            "books_count": len(book_keys),
+            "unique_users_count": unique_users.count(),
+            "new_users_total": app_users.count(),
+            "recent_activity": copy.deepcopy(recent[:RECENT_ACTIVITY_LIMIT]),
+        })
+        return summary
+
+    def flush(self):
+        with self._lock:
+            if self._stats is not None and self._events_since_snapshot:
+                self._snapshot_locked()
+
+
+def classify_request(request) -> Optional[Tuple[str, Dict[str, int]]]:
+    """
+    Визначає activity_type за маршрутом, який FastAPI вже зіставив із запитом.
+
+    Returns:
+        (activity_type, {"club_id": ..., "book_id": ...}) або None
+    """
+    route = request.scope.get("route")
+    if route is None:
+        return None
+
+    activity_type = ACTIVITY_ROUTES.get((request.method, route.path))
+    if activity_type is None:
+        return None
+    if activity_type == "search_used" and not request.query_params.get("search"):
+        return None
+
+    params = {}
+    for name, value in request.scope.get("path_params", {}).items():
+        try:
+            params[name] = int(value)
+        except (TypeError, ValueError):
+            return None
+    return activity_type, params
+
+
+def build_event(activity_type: str, timestamp: Optional[str] = None, **values) -> Dict[str, Any]:
+    """Формує компактний запис журналу; None-значення не зберігаються"""
+    event = {"ts": timestamp or datetime.now().isoformat(), "a": activity_type}
+    for name, value in values.items():
+        if value is not None:
+            event[EVENT_KEYS[name]] = value
+    return event
+
+
+def enrich_activity(db, activity: Dict[str, Any]):
+    """
+    Додає назви та обкладинки клубу/книги до події (виконується у фоновому потоці).
+
+    Метадані беруться з entity_cache, тож у звичайному випадку DB не запитується:
+    сесія SQLAlchemy відкриває з'єднання лише при першому реальному запиті.
+    """
+    from app.services.entity_cache import get_club_meta, get_book_meta
+
+    activity_type = activity["activity_type"]
+    club_id = activity.get("club_id")
+    book_id = activity.get("book_id")
+
+    if activity_type in BOOK_ACTIVITY_TYPES and book_id:
+        book = get_book_meta(db, book_id)
+        if not book:
+            return
+        activity["book_title"] = book["title"]
+        activity["book_cover"] = book["cover_url"]
+        club_id = activity["club_id"] = book["club_id"]
+
+    if club_id and (activity_type in CLUB_ACTIVITY_TYPES or activity_type in BOOK_ACTIVITY_TYPES):
+        with_counts = activity_type == "club_view"
+        club = get_club_meta(db, club_id, with_counts=with_counts)
+        if not club:
+            return
+        activity["club_name"] = club["name"]
+        activity["club_cover"] = club["cover_url"]
+        if with_counts:
+            activity["members_count"] = club["members_count"]
+            activity["books_count"] = club["books_count"]
+
+
+class AnalyticsIngestion:
+    """
+    Обмежена черга подій з фоновим споживачем.
+
+    Обробник запиту лише кладе подію в чергу (без SQL та запису на диск).
+    Споживач забирає події пакетами, збагачує їх однією DB-сесією на пакет
+    і передає в AnalyticsEngine. Якщо черга майже заповнена, перегляди
+    семплюються, а при переповненні подія відкидається - запит користувача
+    ніколи не чекає на аналітику.
+    """
+
+    _STOP = object()
+
+    def __init__(self, engine: AnalyticsEngine, max_size: int = QUEUE_MAX_SIZE):
+        self.engine = engine
+        self.max_size = max_size
+        self._queue = queue.Queue(maxsize=max_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+        self.counters = {
+            "enqueued": 0,
+            "processed": 0,
+            "dropped": 0,
+            "sampled_out": 0,
+            "failed": 0,
+            "batches": 0,
+        }
+
+    def _count(self, name: str, value: int = 1):
+        with self._counters_lock:
+            self.counters[name] += value
+
+    def start(self):
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="analytics-ingestion", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, activity: Dict[str, Any]) -> bool:
+        if not self._thread:
+            self.start()
+
+        activity.setdefault("timestamp", datetime.now().isoformat())
+
+        if (activity["activity_type"] in SAMPLED_ACTIVITY_TYPES and
+                self._queue.qsize() >= self.max_size * QUEUE_OVERLOAD_RATIO and
+                random.random() >= QUEUE_OVERLOAD_SAMPLE_RATE):
+            self._count("sampled_out")
+            return False
+
+        try:
+            self._queue.put_nowait(activity)
+        except queue.Full:
+            self._count("dropped")
+            return False
+
+        self._count("enqueued")
+        return True
+
+    def _next_batch(self) -> List[Any]:
+        batch = [self._queue.get()]
+        while len(batch) < QUEUE_BATCH_SIZE and batch[-1] is not self._STOP:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is self._STOP
+            activities = [item for item in batch if item is not self._STOP]
+            if activities:
+                self._process(activities)
+            if stop:
+                break
+
+    def _process(self, activities: List[Dict[str, Any]]):
+        events = []
+        db = None
+        try:
+            for activity in activities:
+                if activity.get("enrich"):
+                    if db is None:
+                        from app.database import SessionLocal
+                        db = SessionLocal()
+                    try:
+                        enrich_activity(db, activity)
+                    except Exception as e:
+                        logger.debug(f"Analytics enrichment failed for {activity['activity_type']}: {e}")
+
+                values = {name: activity.get(name) for name in EVENT_KEYS}
+                events.append(build_event(activity["activity_type"], activity["timestamp"], **values))
+
+            self.engine.track_many(events)
+            self._count("processed", len(events))
+            self._count("batches")
+        except Exception as e:
+            self._count("failed", len(activities))
+            logger.error(f"Failed to process analytics batch: {e}")
+        finally:
+            if db is not None:
+                db.close()
+
+    def stop(self, timeout: float = 10.0):
+        """Дочекатися обробки всіх подій у черзі та зупинити споживача"""
+        if self._thread and self._thread.is_alive():
+            try:
+                self._queue.put(self._STOP, timeout=timeout)
+            except queue.Full:
+                logger.warning("Analytics queue is full on shutdown, pending events are lost")
+            self._thread.join(timeout)
+        self._thread = None
+
+    def get_counters(self) -> Dict[str, int]:
+        with self._counters_lock:
+            counters = dict(self.counters)
+        counters["queued"] = self._queue.qsize()
+        return counters
+
+
+_engine = AnalyticsEngine()
+_ingestion = AnalyticsIngestion(_engine)
+atexit.register(_engine.flush)
+
 
 def track_activity(activity_type: str, user_id: Optional[str] = None,
                    club_id: Optional[int] = None, club_name: Optional[str] = None,
@@ -100,155 +1184,148 @@ def track_activity(activity_type: str, user_id: Optional[str] = None,
                    members_count: Optional[int] = None, books_count: Optional[int] = None):
     """
     Track business activity instead of raw requests
-    
+
     activity_type: 'club_view', 'book_view', 'review_created', 'member_joined', 'book_borrowed', etc.
     """
     try:
-        stats = load_stats()
-        
-        now = datetime.now().isoformat()
-        today = datetime.now().strftime("%Y-%m-%d")
-        
-        # Track unique users
-        if user_id and user_id not in stats["unique_users"]:
-            stats["unique_users"].append(user_id)
-        
-        # Track clubs
-        if club_id and club_name:
-            club_key = str(club_id)
-            if club_key not in stats["clubs"]:
-                stats["clubs"][club_key] = {
-                    "name": club_name,
-                    "cover_url": club_cover,
-                    "views": 0,
-                    "members_count": members_count or 0,
-                    "books_count": books_count or 0,
-                    "books": {},
-                    "last_activity": now
-                }
-            
-            stats["clubs"][club_key]["name"] = club_name  # Update in case changed
-            if club_cover:
-                stats["clubs"][club_key]["cover_url"] = club_cover
-            stats["clubs"][club_key]["last_activity"] = now
-            
-            if activity_type == "club_view":
-                stats["clubs"][club_key]["views"] += 1
-            elif activity_type == "member_joined":
-                if members_count is not None:
-                    stats["clubs"][club_key]["members_count"] = members_count
-            
-            # Update counts if provided
-            if members_count is not None:
-                stats["clubs"][club_key]["members_count"] = members_count
-            if books_count is not None:
-                stats["clubs"][club_key]["books_count"] = books_count
-        
-        # Track books
-        if book_id and book_title:
-            book_key = str(book_id)
-            if book_key not in stats["books"]:
-                stats["books"][book_key] = {
-                    "title": book_title,
-                    "cover_url": book_cover,
-                    "club_name": club_name or "Unknown",
-                    "views": 0,
-                    "borrows": 0,
-                    "reviews": 0,
-                    "last_activity": now
-                }
-            
-            stats["books"][book_key]["title"] = book_title  # Update in case changed
-            if book_cover:
-                stats["books"][book_key]["cover_url"] = book_cover
-            stats["books"][book_key]["last_activity"] = now
-            
-            # Add book to club's books list
-            if club_id:
-                club_key = str(club_id)
-                if club_key in stats["clubs"]:
-                    if "books" not in stats["clubs"][club_key]:
-                        stats["clubs"][club_key]["books"] = {}
-                    stats["clubs"][club_key]["books"][book_key] = {
-                        "title": book_title,
-                        "cover_url": book_cover
-                    }
-            
-            if activity_type == "book_view":
-                stats["books"][book_key]["views"] += 1
-            elif activity_type == "book_borrowed":
-                stats["books"][book_key]["borrows"] += 1
-            elif activity_type == "review_created":
-                stats["books"][book_key]["reviews"] += 1
-                stats["reviews_total"] += 1
-        
-        # Daily activity
-        if today not in stats["daily_activity"]:
-            stats["daily_activity"][today] = {
-                "clubs_views": 0,
-                "books_views": 0,
-                "reviews": 0,
-                "joins": 0,
-                "activity_feed_views": 0,
-                "search_count": 0,
-                "app_opens": 0,
-                "new_users": 0
-            }
-        
-        if activity_type == "club_view":
-            stats["daily_activity"][today]["clubs_views"] += 1
-        elif activity_type == "book_view":
-            stats["daily_activity"][today]["books_views"] += 1
-        elif activity_type == "review_created":
-            stats["daily_activity"][today]["reviews"] += 1
-        elif activity_type == "member_joined":
-            stats["daily_activity"][today]["joins"] += 1
-        elif activity_type == "activity_feed_view":
-            stats["daily_activity"][today]["activity_feed_views"] += 1
-        elif activity_type == "search_used":
-            stats["daily_activity"][today]["search_count"] += 1
-        elif activity_type == "app_opened":
-            stats["daily_activity"][today]["app_opens"] += 1
-            
-            # Track per-user app opens
-            if user_id:
-                if "app_opens" not in stats:
-                    stats["app_opens"] = {}
-                
-                if user_id not in stats["app_opens"]:
-                    stats["app_opens"][user_id] = {
-                        "first_open": now,
-                        "last_open": now,
-                        "total_opens": 1
-                    }
-                    stats["daily_activity"][today]["new_users"] += 1
-                else:
-                    stats["app_opens"][user_id]["last_open"] = now
-                    stats["app_opens"][user_id]["total_opens"] += 1
-        
-        # Recent activity log (keep last 50)
-        activity_entry = {
-            "timestamp": now,
-            "type": activity_type,
-            "user_id": user_id
-        }
-        if club_name:
-            activity_entry["club"] = club_name
-        if book_title:
-            activity_entry["book"] = book_title
-        
-        stats["recent_activity"].insert(0, activity_entry)
-        stats["recent_activity"] = stats["recent_activity"][:50]
-        
-        # Timestamps
-        if not stats["first_activity"]:
-            stats["first_activity"] = now
-        stats["last_activity"] = now
-        
-        save_stats(stats)
-        
+        event = build_event(
+            activity_type,
+            user_id=user_id,
+            club_id=club_id,
+            club_name=club_name,
+            club_cover=club_cover,
+            book_id=book_id,
+            book_title=book_title,
+            book_cover=book_cover,
+            members_count=members_count,
+            books_count=books_count
+        )
+        _engine.track(event)
+
     except Exception as e:
         logger.error(f"Failed to track activity '{activity_type}': {e}")
 
+def enqueue_activity(activity_type: str, user_id: Optional[str] = None,
+                     club_id: Optional[int] = None, book_id: Optional[int] = None,
+                     enrich: bool = False) -> bool:
+    """
+    Non-blocking variant of track_activity for the request path.
+
+    With enrich=True club/book names, covers and counts are looked up
+    by the background consumer instead of the request handler.
+    """
+    try:
+        return _ingestion.enqueue({
+            "activity_type": activity_type,
+            "user_id": user_id,
+            "club_id": club_id,
+            "book_id": book_id,
+            "enrich": enrich
+        })
+    except Exception as e:
+        logger.error(f"Failed to enqueue activity '{activity_type}': {e}")
+        return False
+
+def start_ingestion():
+    _ingestion.start()
+
+def stop_ingestion(timeout: float = 10.0):
+    """Drain the queue and write a final snapshot"""
+    _ingestion.stop(timeout)
+    _engine.flush()
+
+def get_ingestion_stats() -> Dict[str, int]:
+    return _ingestion.get_counters()
+
 def get_stats() -> Dict[str, Any]:
-    return load_stats()
+    return _engine.get_stats()
+
+def get_summary() -> Dict[str, Any]:
+    return _engine.get_summary()
+
+def flush_stats():
+    """Примусово зберегти знімок агрегатів (наприклад, при зупинці сервера)"""
+    _engine.flush()
+
+def get_top(metric: str = "book_views", period: str = "all", limit: int = 10) -> Dict[str, Any]:
+    """
+    Рейтинг top-K для метрики за період all | day | week | month.
+
+    Вартість - O(K x днів у періоді x шардів), незалежно від кількості
+    клубів і книг. Кидає ValueError на некоректні параметри.
+    """
+    if metric not in TOP_METRICS:
+        raise ValueError(f"metric must be one of: {', '.join(TOP_METRICS)}")
+    if period != "all" and period not in TOP_PERIODS:
+        raise ValueError(f"period must be one of: all, {', '.join(TOP_PERIODS)}")
+    if not 1 <= limit <= TOP_CAPACITY:
+        raise ValueError(f"limit must be between 1 and {TOP_CAPACITY}")
+
+    dates = None
+    if period != "all":
+        today = datetime.now()
+        dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(TOP_PERIODS[period])]
+
+    return {
+        "metric": metric,
+        "period": period,
+        "items": _engine.get_top(metric, dates, limit)
+    }
+
+def parse_rollup_moment(value: str) -> datetime:
+    """Приймає 2026-10-18, 2026-10-18T13 або повний ISO datetime"""
+    if len(value) == 13:
+        value += ":00"
+    return datetime.fromisoformat(value)
+
+def query_activity(granularity: str = "day", date_from: Optional[str] = None,
+                   date_to: Optional[str] = None, metrics: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Часовий ряд з rollup-ів за діапазоном [date_from, date_to].
+
+    Вартість залежить лише від кількості бакетів у діапазоні, а не від
+    обсягу історії. Кидає ValueError на некоректні параметри.
+    """
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(ROLLUP_GRANULARITIES)}")
+    step, max_buckets = ROLLUP_GRANULARITIES[granularity]
+
+    metrics = metrics or ROLLUP_METRICS
+    unknown = [metric for metric in metrics if metric not in ROLLUP_METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metric: {', '.join(unknown)}")
+
+    end = parse_rollup_moment(date_to) if date_to else datetime.now()
+    start = parse_rollup_moment(date_from) if date_from else end - step * 29
+    if start > end:
+        raise ValueError("'from' must not be after 'to'")
+
+    buckets = []
+    moment = start
+    while moment <= end or rollup_bucket(granularity, moment) == rollup_bucket(granularity, end):
+        bucket = rollup_bucket(granularity, moment)
+        if not buckets or buckets[-1] != bucket:
+            buckets.append(bucket)
+        if len(buckets) > max_buckets:
+            raise ValueError(f"Range is too long: at most {max_buckets} {granularity} buckets")
+        moment += step
+
+    rollups = _engine.get_rollups(granularity, buckets)
+    series = []
+    totals = dict.fromkeys(metrics, 0)
+    for bucket in buckets:
+        row = {"bucket": bucket}
+        for metric in metrics:
+            value = rollups[bucket].get(metric, 0)
+            row[metric] = value
+            totals[metric] += value
+        series.append(row)
+
+    return {
+        "granularity": granularity,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "metrics": metrics,
+        "series": series,
+        "totals": totals
+    }
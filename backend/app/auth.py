@@ -91,7 +91,8 @@ async def get_current_user(x_telegram_init_data: Optional[str] = Header(None)):
     if not x_telegram_init_data:
         raise HTTPException(status_code=401, detail="Missing Telegram auth data")
     
-    logger.debug(f"Init data received: {x_telegram_init_data[:100]}...")
+    # lazy: рядок формується лише якщо якийсь sink приймає DEBUG
+    logger.opt(lazy=True).debug("Init data received: {}...", lambda: x_telegram_init_data[:100])
     
     # Dev режим - дозволено ТІЛЬКИ не в production
     env = os.getenv('ENV', 'development')
@@ -140,7 +141,8 @@ def validate_telegram_init_data_wrapper(x_telegram_init_data: Optional[str]):
     if not x_telegram_init_data:
         raise HTTPException(status_code=401, detail="Missing Telegram auth data")
     
-    logger.debug(f"Init data received: {x_telegram_init_data[:100]}...")
+    # lazy: рядок формується лише якщо якийсь sink приймає DEBUG
+    logger.opt(lazy=True).debug("Init data received: {}...", lambda: x_telegram_init_data[:100])
     
     # Dev режим - дозволено ТІЛЬКИ не в production
     env = os.getenv('ENV', 'development')
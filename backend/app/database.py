@@ -1,8 +1,13 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional, Tuple
 import os
+import re
+import time
 
 load_dotenv()
 
@@ -16,6 +21,85 @@ engine = create_engine(
     echo=os.getenv('DEBUG', 'False') == 'True'
 )
 
+# Ліміт запитів на один HTTP-запит; більше - ймовірно N+1
+QUERY_BUDGET = int(os.getenv("DB_QUERY_BUDGET", "20"))
+# Поріг slow query log (див. app.slow_queries)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+
+class QueryStats:
+    """Кількість SQL-запитів і сумарний час БД в межах одного HTTP-запиту"""
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope
+        self.count = 0
+        self.total_time = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        # Параметри вже винесені у плейсхолдери, тож запити з циклу мають однаковий текст
+        self.statements[statement] += 1
+
+    @property
+    def route(self) -> Optional[str]:
+        """Шаблон маршруту FastAPI (scope заповнюється роутером) або шлях"""
+        if self.scope is None:
+            return None
+        route = self.scope.get("route")
+        if route is not None:
+            return f"{self.scope.get('method')} {route.path}"
+        return f"{self.scope.get('method')} {self.scope.get('path')}"
+
+    def most_repeated(self) -> Tuple[str, int]:
+        statement, count = self.statements.most_common(1)[0]
+        return re.sub(r"\s+", " ", statement).strip(), count
+
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def begin_query_tracking(scope: Optional[dict] = None) -> QueryStats:
+    """Починає підрахунок запитів для поточного HTTP-запиту (викликається з middleware)"""
+    stats = QueryStats(scope)
+    _query_stats.set(stats)
+    return stats
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _query_stats.get()
+
+
+def instrument_engine(target_engine):
+    """Хуки SQLAlchemy: час кожного запиту додається до QueryStats поточного контексту"""
+
+    @event.listens_for(target_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(target_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+        if elapsed * 1000 >= SLOW_QUERY_MS and not conn.get_execution_options().get("skip_slow_query_log"):
+            from app.slow_queries import record_slow_query
+            record_slow_query(statement, parameters, elapsed,
+                              stats.route if stats is not None else None, executemany)
+
+    @event.listens_for(target_engine, "handle_error")
+    def _handle_error(exception_context):
+        # Запит з помилкою не доходить до after_cursor_execute
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+
+
+instrument_engine(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -1,10 +1,16 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, PlainTextResponse
 from dotenv import load_dotenv
+from urllib.parse import parse_qs
+import json
 import os
+import random
 import sys
+import time
+import uuid
 from loguru import logger
+from typing import Optional
 
 # Завантаження змінних середовища
 load_dotenv()
@@ -12,11 +18,36 @@ load_dotenv()
 # Налаштування loguru
 logger.remove()  # Видаляємо стандартний handler
 
+# text (за замовчуванням) або json - JSON Lines з request_id, route, latency, кількістю запитів
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Частка успішних швидких запитів, що логуються; повільні та помилки логуються завжди
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_SLOW_REQUEST_MS = float(os.getenv("LOG_SLOW_REQUEST_MS", "1000"))
+
+
+def json_log_format(record) -> str:
+    """Форматер loguru для LOG_FORMAT=json: один JSON-об'єкт на рядок"""
+    payload = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": f"{record['name']}:{record['function']}:{record['line']}",
+        "message": record["message"],
+    }
+    payload.update({key: value for key, value in record["extra"].items() if not key.startswith("_")})
+    if record["exception"] is not None:
+        payload["exception"] = repr(record["exception"].value)
+    record["extra"]["_json"] = json.dumps(payload, ensure_ascii=False, default=str)
+    return "{extra[_json]}\n"
+
+
 # Console logging з кольорами
 logger.add(
     sys.stderr,
-    format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-    level=os.getenv('LOG_LEVEL', 'INFO')
+    format=json_log_format if LOG_FORMAT == "json" else "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    # Повільні запити з EXPLAIN - лише в logs/slow_queries.log
+    filter=lambda record: "slow_query" not in record["extra"],
+    enqueue=True  # Запис у фоновому потоці, запит не чекає на I/O
 )
 
 # File logging (rotated)
@@ -25,16 +56,40 @@ logger.add(
     rotation="00:00",  # Новий файл щодня о півночі
     retention="30 days",  # Зберігати логи 30 днів
     compression="zip",  # Стиснення старих логів
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-    level="DEBUG"
+    format=json_log_format if LOG_FORMAT == "json" else "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {extra[request_id]} | {name}:{function}:{line} - {message}",
+    level=os.getenv('LOG_FILE_LEVEL', 'DEBUG'),
+    filter=lambda record: "slow_query" not in record["extra"],
+    enqueue=True
 )
 
+# Slow query log: окремий файл з ротацією за розміром
+logger.add(
+    "logs/slow_queries.log",
+    rotation="10 MB",
+    retention=5,
+    format=json_log_format if LOG_FORMAT == "json" else "{time:YYYY-MM-DD HH:mm:ss} | {extra[request_id]} | {message}",
+    level="WARNING",
+    filter=lambda record: "slow_query" in record["extra"],
+    enqueue=True
+)
+
+# request_id за замовчуванням для записів поза запитом (старт, фонові потоки)
+logger.configure(extra={"request_id": "-"})
+
 logger.info("📚 Book Club Mini App starting...")
 logger.info(f"Environment: {os.getenv('ENV', 'development')}")
 logger.info(f"Debug mode: {os.getenv('DEBUG', 'False')}")
 
 # Імпорт роутерів
 from app.routers import books, user, clubs
+from app.analytics import (
+    classify_request, enqueue_activity, start_ingestion, stop_ingestion, get_ingestion_stats
+)
+from app.metrics import observe_request, observe_db, track_in_flight, start_metrics, stop_metrics
+from app.database import begin_query_tracking, QUERY_BUDGET
+
+# X-DB-Queries / X-DB-Time лише поза production
+SHOW_DB_HEADERS = os.getenv("ENV", "development") != "production"
 
 # Створення FastAPI app
 app = FastAPI(
@@ -47,253 +102,116 @@ app = FastAPI(
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     """Логування всіх HTTP запитів"""
-    import time
-    import re
-    from app.analytics import track_activity
-    
     start_time = time.time()
-    logger.info(f"➡️  {request.method} {request.url.path}")
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+    track_in_flight(1)
+    status_code = 500
+    # Лічильник SQL-запитів цього HTTP-запиту (хуки в app.database)
+    query_stats = begin_query_tracking(request.scope)
     
+    # request_id потрапляє в усі записи цього запиту, включно з роутерами
+    with logger.contextualize(request_id=request_id):
+        logger.debug(f"➡️  {request.method} {request.url.path}")
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            process_time = (time.time() - start_time) * 1000
+            route = request.scope.get("route")
+            
+            # Один підсумковий рядок на запит; успішні швидкі - з семплюванням,
+            # повільні та помилки - завжди
+            is_slow = process_time >= LOG_SLOW_REQUEST_MS
+            if status_code >= 400 or is_slow or random.random() < LOG_SAMPLE_RATE:
+                logger.bind(
+                    method=request.method,
+                    path=request.url.path,
+                    route=route.path if route is not None else None,
+                    status=status_code,
+                    latency_ms=round(process_time, 2),
+                    db_queries=query_stats.count,
+                    db_time_ms=round(query_stats.total_time * 1000, 2)
+                ).log(
+                    "WARNING" if is_slow or status_code >= 500 else "INFO",
+                    f"⬅️  {request.method} {request.url.path} - "
+                    f"Status: {status_code} - "
+                    f"Time: {process_time:.2f}ms - "
+                    f"DB: {query_stats.count} queries / {query_stats.total_time * 1000:.2f}ms"
+                )
+            
+            response.headers["X-Request-ID"] = request_id
+            if SHOW_DB_HEADERS:
+                response.headers["X-DB-Queries"] = str(query_stats.count)
+                response.headers["X-DB-Time"] = f"{query_stats.total_time * 1000:.2f}ms"
+            
+            if query_stats.count > QUERY_BUDGET:
+                statement, repeats = query_stats.most_repeated()
+                repeated = f"repeated {repeats}x: {statement[:300]}" if repeats > 1 else "no repeated statements"
+                logger.warning(
+                    f"🐢 {request.method} {request.url.path} executed {query_stats.count} SQL queries "
+                    f"(budget {QUERY_BUDGET}); {repeated}"
+                )
+            
+            # Track business activity: маршрут уже зіставлено роутером FastAPI,
+            # тож статика, /api/internal/ та /api/health просто не мають activity_type.
+            # Подія лише ставиться в чергу: назви/обкладинки підтягує фоновий споживач
+            if response.status_code < 400:
+                try:
+                    activity = classify_request(request)
+                    if activity:
+                        activity_type, params = activity
+                        enqueue_activity(
+                            activity_type=activity_type,
+                            user_id=extract_user_id(request),
+                            club_id=params.get("club_id"),
+                            book_id=params.get("book_id"),
+                            enrich=True
+                        )
+                except Exception as e:
+                    logger.debug(f"Analytics tracking error: {e}")
+            
+            return response
+        except Exception as e:
+            logger.error(f"❌ Request failed: {request.method} {request.url.path} - {str(e)}")
+            raise
+        finally:
+            track_in_flight(-1)
+            # Шаблон маршруту замість шляху: /api/books/club/{club_id}, а не /api/books/club/42
+            route = request.scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            observe_request(request.method, route_path, status_code, time.time() - start_time)
+            observe_db(request.method, route_path, query_stats.count, query_stats.total_time)
+
+
+def extract_user_id(request: Request):
+    """Telegram user id з X-Telegram-Init-Data (без перевірки підпису - лише для аналітики)"""
+    init_data = request.headers.get("X-Telegram-Init-Data", "")
+    if not init_data:
+        return None
     try:
-        response = await call_next(request)
-        process_time = (time.time() - start_time) * 1000
-        
-        logger.info(
-            f"⬅️  {request.method} {request.url.path} - "
-            f"Status: {response.status_code} - "
-            f"Time: {process_time:.2f}ms"
-        )
-        
-        # Track business activity (skip static files, internal endpoints, and health checks)
-        if (response.status_code < 400 and 
-            not request.url.path.startswith(("/css/", "/js/", "/images/", "/favicon", "/api/internal/", "/api/health"))):
-            try:
-                # Extract user_id from validated Telegram init data
-                user_id = None
-                init_data = request.headers.get("X-Telegram-Init-Data", "")
-                if init_data:
-                    try:
-                        from urllib.parse import parse_qs
-                        parsed = parse_qs(init_data)
-                        if "user" in parsed:
-                            import json
-                            user_data = json.loads(parsed["user"][0])
-                            user_id = str(user_data.get("id"))
-                    except:
-                        pass
-                
-                # Determine activity type and extract resources
-                activity_type = None
-                club_id = None
-                club_name = None
-                club_cover = None
-                book_id = None
-                book_title = None
-                book_cover = None
-                members_count = None
-                books_count = None
-                
-                # Club views
-                club_match = re.search(r'/clubs/(\d+)$', request.url.path)
-                if club_match and request.method == "GET":
-                    activity_type = "club_view"
-                    club_id = int(club_match.group(1))
-                    
-                    try:
-                        from app.database import SessionLocal
-                        from app.models.db_models import Club, ClubMember, Book
-                        
-                        db = SessionLocal()
-                        try:
-                            club = db.query(Club).filter(Club.id == club_id).first()
-                            if club:
-                                club_name = club.name
-                                club_cover = club.cover_url
-                                members_count = db.query(ClubMember).filter(ClubMember.club_id == club_id).count()
-                                books_count = db.query(Book).filter(Book.club_id == club_id).count()
-                        finally:
-                            db.close()
-                    except:
-                        pass
-                
-                # Activity Feed views
-                activity_feed_match = re.search(r'/clubs/(\d+)/activity$', request.url.path)
-                if activity_feed_match and request.method == "GET":
-                    activity_type = "activity_feed_view"
-                    club_id = int(activity_feed_match.group(1))
-                    
-                    try:
-                        from app.database import SessionLocal
-                        from app.models.db_models import Club
-                        
-                        db = SessionLocal()
-                        try:
-                            club = db.query(Club).filter(Club.id == club_id).first()
-                            if club:
-                                club_name = club.name
-                                club_cover = club.cover_url
-                        finally:
-                            db.close()
-                    except:
-                        pass
-                
-                # Book views
-                book_match = re.search(r'/books/book/(\d+)$', request.url.path)
-                if book_match and request.method == "GET":
-                    activity_type = "book_view"
-                    book_id = int(book_match.group(1))
-                    
-                    try:
-                        from app.database import SessionLocal
-                        from app.models.db_models import Book, Club
-                        
-                        db = SessionLocal()
-                        try:
-                            book = db.query(Book).filter(Book.id == book_id).first()
-                            if book:
-                                book_title = book.title
-                                book_cover = book.cover_url
-                                club = db.query(Club).filter(Club.id == book.club_id).first()
-                                if club:
-                                    club_id = club.id
-                                    club_name = club.name
-                                    club_cover = club.cover_url
-                        finally:
-                            db.close()
-                    except:
-                        pass
-                
-                # Review created
-                if re.search(r'/books/\d+/review$', request.url.path) and request.method == "POST":
-                    activity_type = "review_created"
-                    book_id_match = re.search(r'/books/(\d+)/review$', request.url.path)
-                    if book_id_match:
-                        book_id = int(book_id_match.group(1))
-                        
-                        try:
-                            from app.database import SessionLocal
-                            from app.models.db_models import Book, Club
-                            
-                            db = SessionLocal()
-                            try:
-                                book = db.query(Book).filter(Book.id == book_id).first()
-                                if book:
-                                    book_title = book.title
-                                    book_cover = book.cover_url
-                                    club = db.query(Club).filter(Club.id == book.club_id).first()
-                                    if club:
-                                        club_id = club.id
-                                        club_name = club.name
-                                        club_cover = club.cover_url
-                            finally:
-                                db.close()
-                        except:
-                            pass
-                
-                # Book borrowed
-                borrow_match = re.search(r'/books/(\d+)/borrow$', request.url.path)
-                if borrow_match and request.method == "POST":
-                    activity_type = "book_borrowed"
-                    book_id = int(borrow_match.group(1))
-                    
-                    try:
-                        from app.database import SessionLocal
-                        from app.models.db_models import Book, Club
-                        
-                        db = SessionLocal()
-                        try:
-                            book = db.query(Book).filter(Book.id == book_id).first()
-                            if book:
-                                book_title = book.title
-                                book_cover = book.cover_url
-                                club = db.query(Club).filter(Club.id == book.club_id).first()
-                                if club:
-                                    club_id = club.id
-                                    club_name = club.name
-                                    club_cover = club.cover_url
-                        finally:
-                            db.close()
-                    except:
-                        pass
-                
-                # Book returned
-                return_match = re.search(r'/books/(\d+)/return$', request.url.path)
-                if return_match and request.method == "POST":
-                    activity_type = "book_returned"
-                    book_id = int(return_match.group(1))
-                    
-                    try:
-                        from app.database import SessionLocal
-                        from app.models.db_models import Book, Club
-                        
-                        db = SessionLocal()
-                        try:
-                            book = db.query(Book).filter(Book.id == book_id).first()
-                            if book:
-                                book_title = book.title
-                                book_cover = book.cover_url
-                                club = db.query(Club).filter(Club.id == book.club_id).first()
-                                if club:
-                                    club_id = club.id
-                                    club_name = club.name
-                                    club_cover = club.cover_url
-                        finally:
-                            db.close()
-                    except:
-                        pass
-                
-                # Member joined (approved join request)
-                if re.search(r'/clubs/\d+/requests/\d+$', request.url.path) and request.method == "POST":
-                    # Will be tracked when processing the join request with action=approve
-                    pass
-                
-                # Search used
-                books_list_match = re.search(r'/books/club/(\d+)$', request.url.path)
-                if books_list_match and request.method == "GET":
-                    # Check if search parameter is present
-                    if "search=" in str(request.url.query):
-                        search_value = request.query_params.get("search", "")
-                        if search_value and len(search_value) > 0:
-                            activity_type = "search_used"
-                            club_id = int(books_list_match.group(1))
-                            
-                            try:
-                                from app.database import SessionLocal
-                                from app.models.db_models import Club
-                                
-                                db = SessionLocal()
-                                try:
-                                    club = db.query(Club).filter(Club.id == club_id).first()
-                                    if club:
-                                        club_name = club.name
-                                        club_cover = club.cover_url
-                                finally:
-                                    db.close()
-                            except:
-                                pass
-                
-                # Track if we identified an activity
-                if activity_type:
-                    track_activity(
-                        activity_type=activity_type,
-                        user_id=user_id,
-                        club_id=club_id,
-                        club_name=club_name,
-                        club_cover=club_cover,
-                        book_id=book_id,
-                        book_title=book_title,
-                        book_cover=book_cover,
-                        members_count=members_count,
-                        books_count=books_count
-                    )
-            except Exception as e:
-                logger.debug(f"Analytics tracking error: {e}")
-                pass
-        
-        return response
-    except Exception as e:
-        logger.error(f"❌ Request failed: {request.method} {request.url.path} - {str(e)}")
-        raise
+        parsed = parse_qs(init_data)
+        if "user" in parsed:
+            user_data = json.loads(parsed["user"][0])
+            return str(user_data.get("id"))
+    except Exception:
+        pass
+    return None
+
+
+@app.on_event("startup")
+async def start_analytics():
+    """Запуск фонового споживача аналітики та скидання метрик"""
+    start_ingestion()
+    start_metrics()
+
+
+@app.on_event("shutdown")
+async def stop_analytics():
+    """Обробити залишок черги аналітики та зберегти знімок"""
+    stop_ingestion()
+    stop_metrics()
+    logger.info(f"Analytics ingestion stopped: {get_ingestion_stats()}")
+    # Дочекатися запису черги логів (enqueue=True)
+    await logger.complete()
 
 
 # CORS налаштування
@@ -306,6 +224,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Request-ID", "X-DB-Queries", "X-DB-Time"],
 )
 
 # Реєстрація роутерів
@@ -344,10 +263,68 @@ async def health_check():
 
 
 @app.get("/api/internal/analytics")
-async def get_analytics():
-    """Get analytics data"""
-    from app.analytics import get_stats
-    return get_stats()
+async def get_analytics(
+    granularity: Optional[str] = Query(None, description="hour | day | week - повернути лише часовий ряд"),
+    date_from: Optional[str] = Query(None, alias="from", description="Початок діапазону (ISO дата або дата-час)"),
+    date_to: Optional[str] = Query(None, alias="to", description="Кінець діапазону (ISO дата або дата-час)"),
+    metric: Optional[str] = Query(None, description="Метрики через кому, напр. club_view,book_view")
+):
+    """
+    Аналітика для дашборду.
+    
+    Без параметрів - підсумки (get_summary): лічильники та останні події, розмір
+    не залежить від історії. З granularity/from/to/metric - часовий ряд з rollup-ів.
+    Рейтинги клубів і книг - /api/internal/analytics/top.
+    """
+    from app.analytics import get_summary, query_activity
+    from app.services.entity_cache import get_cache_stats
+    
+    if granularity or date_from or date_to or metric:
+        try:
+            return query_activity(
+                granularity=granularity or "day",
+                date_from=date_from,
+                date_to=date_to,
+                metrics=metric.split(",") if metric else None
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    summary = get_summary()
+    summary["ingestion"] = get_ingestion_stats()
+    summary["entity_cache"] = get_cache_stats()
+    return summary
+
+
+@app.get("/api/internal/analytics/top")
+async def get_analytics_top(
+    metric: str = Query("book_views", description="club_views | book_views | book_borrows | book_reviews | book_activity"),
+    period: str = Query("all", description="all | day | week | month"),
+    limit: int = Query(10, description="Кількість позицій у рейтингу")
+):
+    """Top-K clubs/books leaderboard"""
+    from app.analytics import get_top
+    
+    try:
+        return get_top(metric=metric, period=period, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/internal/metrics")
+async def get_metrics():
+    """Prometheus metrics (агреговані по всіх воркерах)"""
+    from app.metrics import render_metrics
+    
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/internal/slow-queries")
+async def get_slow_queries():
+    """Повільні SQL-запити та їх EXPLAIN-плани (поточного воркера)"""
+    from app.slow_queries import get_slow_queries
+    
+    return get_slow_queries()
 
 
 @app.exception_handler(Exception)
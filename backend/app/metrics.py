@@ -0,0 +1,315 @@
+"""
+Метрики сервісу у форматі Prometheus.
+
+Кожен воркер uvicorn накопичує гістограми та gauge-і у пам'яті й періодично
+скидає їх у власний файл-слот (flock, як шарди аналітики). Ендпоїнт метрик
+зливає свій стан з файлами інших воркерів, тож результат агрегований по всіх
+процесах без спільної пам'яті.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows dev environment: single worker, no locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = Path("backend/data/metrics")
+MAX_WORKERS = int(os.getenv("METRICS_MAX_WORKERS", "64"))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+# Логарифмічні бакети: 1 мс .. ~16 с, кожен удвічі ширший за попередній
+LATENCY_BUCKETS = tuple(round(0.001 * 2 ** i, 3) for i in range(15))
+# Кількість SQL-запитів на HTTP-запит: 1 .. 256
+QUERY_COUNT_BUCKETS = tuple(2 ** i for i in range(9))
+
+# Опис метрик: name -> (help, бакети); для gauge бакетів немає
+HISTOGRAMS = {
+    "http_request_duration_seconds": ("HTTP request latency by route template and status class", LATENCY_BUCKETS),
+    "http_request_db_queries": ("SQL queries executed per HTTP request", QUERY_COUNT_BUCKETS),
+    "http_request_db_seconds": ("Total database time per HTTP request", LATENCY_BUCKETS),
+}
+GAUGES = {
+    "http_requests_in_flight": "HTTP requests currently being processed",
+}
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class MetricsRegistry:
+    """Гістограми й gauge-і одного процесу + злиття з файлами інших воркерів"""
+
+    def __init__(self, directory: Path = METRICS_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # {name: {labels: [counts по бакетах..., +Inf count, sum]}}
+        self._histograms: Dict[str, Dict[LabelKey, List[float]]] = {name: {} for name in HISTOGRAMS}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {name: {} for name in GAUGES}
+        self._slot_path: Optional[Path] = None
+        self._slot_lock = None
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = HISTOGRAMS[name][1]
+        key = label_key(labels)
+        with self._lock:
+            series = self._histograms[name].get(key)
+            if series is None:
+                series = self._histograms[name][key] = [0] * (len(buckets) + 1) + [0.0]
+            # Кумулятивні лічильники рахуються при експорті, тут - лише свій бакет
+            index = len(buckets)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    index = i
+                    break
+            series[index] += 1
+            series[-1] += value
+
+    def inc(self, name: str, delta: float = 1, **labels):
+        key = label_key(labels)
+        with self._lock:
+            gauge = self._gauges[name]
+            gauge[key] = gauge.get(key, 0) + delta
+
+    # ---- Файли воркерів ----
+
+    def _claim_slot(self):
+        """Захоплює вільний слот; стан попереднього власника слоту продовжується"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for slot in range(MAX_WORKERS):
+            lock_file = open(self.directory / f"worker_{slot:02d}.lock", 'a')
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    continue
+            self._slot_lock = lock_file
+            self._slot_path = self.directory / f"worker_{slot:02d}.json"
+            # Лічильники гістограм монотонні між рестартами воркера
+            previous = self._read_file(self._slot_path)
+            if previous:
+                for name, series in previous["histograms"].items():
+                    if name in self._histograms:
+                        for key, values in series.items():
+                            self._histograms[name][key] = values
+            return
+        raise RuntimeError(f"No free metrics slot out of {MAX_WORKERS}")
+
+    @staticmethod
+    def _read_file(path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        return {
+            "pid": data.get("pid"),
+            "histograms": {
+                name: {tuple(map(tuple, labels)): values for labels, values in series}
+                for name, series in data.get("histograms", {}).items()
+            },
+            "gauges": {
+                name: {tuple(map(tuple, labels)): value for labels, value in series}
+                for name, series in data.get("gauges", {}).items()
+            },
+        }
+
+    def flush(self):
+        with self._lock:
+            if self._slot_path is None:
+                self._claim_slot()
+            data = {
+                "pid": os.getpid(),
+                "histograms": {name: [[list(k), list(v)] for k, v in series.items()]
+                               for name, series in self._histograms.items()},
+                "gauges": {name: [[list(k), v] for k, v in series.items()]
+                           for name, series in self._gauges.items()},
+            }
+        tmp_file = self._slot_path.with_suffix(".tmp")
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_file, self._slot_path)
+        except OSError as e:
+            logger.error(f"Failed to save metrics: {e}")
+
+    def start(self):
+        if self._flusher is not None:
+            return
+        self._stop.clear()
+        self._flusher = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def _run(self):
+        while not self._stop.wait(FLUSH_INTERVAL_SECONDS):
+            self.flush()
+
+    def stop(self):
+        if self._flusher is not None:
+            self._stop.set()
+            self._flusher.join(timeout=FLUSH_INTERVAL_SECONDS)
+            self._flusher = None
+        self.flush()
+
+    # ---- Експорт ----
+
+    def collect(self) -> Tuple[Dict[str, Dict[LabelKey, List[float]]], Dict[str, Dict[LabelKey, float]]]:
+        """Власний стан + файли інших воркерів (gauge-і - лише живих процесів)"""
+        self.flush()
+        histograms = {name: {} for name in HISTOGRAMS}
+        gauges = {name: {} for name in GAUGES}
+        for path in sorted(self.directory.glob("worker_*.json")):
+            data = self._read_file(path)
+            if data is None:
+                continue
+            for name, series in data["histograms"].items():
+                target = histograms.get(name)
+                if target is None:
+                    continue
+                for key, values in series.items():
+                    mine = target.get(key)
+                    if mine is None:
+                        target[key] = list(values)
+                    else:
+                        for i, value in enumerate(values):
+                            mine[i] += value
+            if not _pid_alive(data["pid"]):
+                continue
+            for name, series in data["gauges"].items():
+                target = gauges.get(name)
+                if target is None:
+                    continue
+                for key, value in series.items():
+                    target[key] = target.get(key, 0) + value
+        return histograms, gauges
+
+    def render(self) -> str:
+        histograms, gauges = self.collect()
+        lines = []
+        for name, series in histograms.items():
+            help_text, buckets = HISTOGRAMS[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, values in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(buckets, values):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(key, le=bound)} {cumulative}")
+                total = cumulative + values[len(buckets)]
+                lines.append(f'{name}_bucket{format_labels(key, le="+Inf")} {total}')
+                lines.append(f"{name}_sum{format_labels(key)} {values[-1]:.6f}")
+                lines.append(f"{name}_count{format_labels(key)} {total}")
+
+            # Оцінка квантилів з бакетів (як histogram_quantile), щоб p50/p95/p99
+            # було видно без Prometheus
+            if name.endswith("_seconds"):
+                quantile_name = name[:-len("_seconds")] + "_quantile_seconds"
+            else:
+                quantile_name = name + "_quantile"
+            lines.append(f"# HELP {quantile_name} Estimated quantiles of {name}")
+            lines.append(f"# TYPE {quantile_name} gauge")
+            for key, values in sorted(series.items()):
+                for q in QUANTILES:
+                    value = estimate_quantile(buckets, values, q)
+                    if value is not None:
+                        lines.append(f"{quantile_name}{format_labels(key, quantile=q)} {value:.6f}")
+
+        for name, series in gauges.items():
+            lines.append(f"# HELP {name} {GAUGES[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            if not series:
+                lines.append(f"{name} 0")
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{format_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def format_labels(key: LabelKey, **extra) -> str:
+    pairs = list(key) + [(name, str(value)) for name, value in extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def estimate_quantile(buckets: Tuple[float, ...], values: List[float], q: float) -> Optional[float]:
+    """Лінійна інтерполяція всередині бакета; для +Inf повертає верхню межу останнього"""
+    total = sum(values[:-1])
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(buckets, values):
+        if count and cumulative + count >= rank:
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound
+    return buckets[-1]
+
+
+def status_class(status_code: int) -> str:
+    return f"{status_code // 100}xx"
+
+
+# Глобальний реєстр процесу
+_registry = MetricsRegistry()
+atexit.register(_registry.flush)
+
+
+def observe_request(method: str, route: str, status_code: int, seconds: float):
+    _registry.observe("http_request_duration_seconds", seconds,
+                      method=method, route=route, status=status_class(status_code))
+
+
+def observe_db(method: str, route: str, queries: int, seconds: float):
+    _registry.observe("http_request_db_queries", queries, method=method, route=route)
+    _registry.observe("http_request_db_seconds", seconds, method=method, route=route)
+
+
+def track_in_flight(delta: int):
+    _registry.inc("http_requests_in_flight", delta)
+
+
+def start_metrics():
+    _registry.start()
+
+
+def stop_metrics():
+    _registry.stop()
+
+
+def render_metrics() -> str:
+    return _registry.render()
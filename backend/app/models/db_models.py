@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum, Boolean, Index, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum, Boolean, Index, Float, Numeric, Computed
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -62,6 +62,8 @@ class Club(Base):
     cover_url = Column(String(500))  # URL аватару клубу (300x300px max)
     requires_approval = Column(Boolean, default=True)  # Чи потрібне схвалення заявок (False = auto-approve)
     status = Column(Enum(ClubStatus), default=ClubStatus.ACTIVE)
+    # Версія даних клубу для ETag (app.utils.etag): збільшується кожною зміною книг, учасників, відгуків
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -127,12 +129,60 @@ class Book(Base):
     cover_source = Column(Enum(CoverSource), default=CoverSource.DEFAULT)  # Джерело обкладинки
     description_source = Column(Enum(DescriptionSource), default=DescriptionSource.EMPTY)  # Джерело опису
     
+    # Останнє позичання (book_loans.id), оновлюється в borrow_book; без FK, щоб не створювати цикл books <-> book_loans
+    last_loan_id = Column(Integer, nullable=True)
+    
+    # Денормалізована статистика: оновлюється атомарно при записі відгуків/позичань,
+    # відновлюється з book_reviews/book_loans командою python -m app.repair_book_stats.
+    # Типи - як у міграції 011 (DECIMAL); asdecimal=False - у коді значення лишаються float.
+    # SQLite (тести, бенчмарки) зберігає цілі DECIMAL як INTEGER і ділив би націло - там REAL
+    rating_sum = Column(
+        Numeric(10, 1, asdecimal=False).with_variant(Float(), "sqlite"),
+        nullable=False, default=0, server_default="0"
+    )
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    readers_count = Column(Integer, nullable=False, default=0, server_default="0")  # Унікальні читачі
+    waitlist_count = Column(Integer, nullable=False, default=0, server_default="0")  # Позичання зі статусом WAITING
+    rating_avg = Column(  # Для сортування за індексом
+        Numeric(4, 2, asdecimal=False).with_variant(Float(), "sqlite"),
+        Computed("rating_sum / NULLIF(rating_count, 0)", persisted=True)
+    )
+    
+    # Гістограма оцінок (app.utils.rating_histogram): кількість відгуків з оцінкою 0.5 .. 5.0
+    rating_05 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_10 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_15 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_20 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_25 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_30 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_35 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_40 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_45 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_50 = Column(Integer, nullable=False, default=0, server_default="0")
+    
+    # Документ пошуку (app.utils.book_search): назва, автор, власник, останній читач
+    search_text = Column(Text)
+    
+    # Версія клубу (clubs.data_version) на момент останньої зміни книги - для /changes?since=
+    row_version = Column(Integer, nullable=False, default=0, server_default="0")
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
     club = relationship("Club", back_populates="books")
     loans = relationship("BookLoan", back_populates="book")
     reviews = relationship("BookReview", back_populates="book", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index('idx_books_club_rating', 'club_id', 'rating_avg'),
+        Index('idx_books_club_readers', 'club_id', 'readers_count'),
+        # Keyset-пагінація списку клубу (get_books)
+        Index('idx_books_club_created', 'club_id', 'created_at', 'id'),
+        Index('idx_books_club_title', 'club_id', 'title', 'id'),
+        Index('idx_books_club_author', 'club_id', 'author', 'title'),
+        Index('ft_books_search', 'search_text', mysql_prefix='FULLTEXT'),
+        Index('idx_books_club_row_version', 'club_id', 'row_version'),
+    )
 
 
 class BookLoan(Base):
@@ -149,6 +199,14 @@ class BookLoan(Base):
     
     # Relationships
     book = relationship("Book", back_populates="loans")
+    
+    __table_args__ = (
+        # Історія позичань книги: keyset-пагінація від найновіших
+        Index('idx_book_loans_book_borrowed', 'book_id', 'borrowed_at', 'id'),
+        # Черга очікування (status = WAITING, FIFO за id): наступний у черзі та позиція
+        Index('idx_book_loans_book_status', 'book_id', 'status', 'id'),
+        Index('idx_book_loans_user_status', 'user_id', 'status'),
+    )
 
 
 class BookReview(Base):
@@ -171,6 +229,9 @@ class BookReview(Base):
     # Унікальний індекс: один користувач може залишити тільки один відгук на книгу
     __table_args__ = (
         Index('idx_book_user_review', 'book_id', 'user_id', unique=True),
+        # Відгуки книги: keyset-пагінація від найновіших
+        Index('idx_book_reviews_book_created', 'book_id', 'created_at', 'id'),
+        Index('idx_book_reviews_book_rating', 'book_id', 'rating', 'created_at', 'id'),
     )
 
 
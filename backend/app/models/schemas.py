@@ -116,19 +116,46 @@ class BookResponse(BaseModel):
     holder_id: Optional[str] = None
     holder_name: Optional[str] = None
     holder_username: Optional[str] = None
+    waitlist_count: int = 0  # Кількість учасників у черзі
+    waitlist_position: Optional[int] = None  # Позиція поточного користувача в черзі (з 1)
     
     class Config:
         from_attributes = True
 
 
+class WaitlistResponse(BaseModel):
+    """Стан черги очікування книги для поточного користувача"""
+    book_id: int
+    waitlist_count: int
+    waitlist_position: Optional[int] = None
+
+
+class RatingBucket(BaseModel):
+    rating: float  # 0.5 .. 5.0
+    count: int
+
+
 class BookDetailResponse(BookResponse):
+    # Перші сторінки історії; наступні - GET /api/books/{id}/loans і /reviews з cursor
     loans: List[BookLoanResponse] = []
     reviews: List[BookReviewResponse] = []
+    loans_next_cursor: Optional[str] = None
+    reviews_next_cursor: Optional[str] = None
+    # Розподіл оцінок (усі 10 кроків, від 0.5 до 5.0) та загальна кількість відгуків
+    rating_count: int = 0
+    rating_histogram: List[RatingBucket] = []
     
     class Config:
         from_attributes = True
 
 
+class BookChangesResponse(BaseModel):
+    """Зміни книг клубу з версії since (GET /api/books/club/{id}/changes)"""
+    version: int  # Поточна версія клубу - since для наступного запиту
+    changed: List[BookResponse] = []  # Створені або змінені книги
+    deleted: List[int] = []  # ID видалених книг
+
+
 class BorrowBookRequest(BaseModel):
     chat_id: str
 
@@ -0,0 +1,92 @@
+"""
+Перерахунок денормалізованої статистики книг (rating_sum, rating_count, гістограма
+оцінок rating_05 .. rating_50, readers_count, waitlist_count) з таблиць book_reviews та book_loans.
+Запуск: python -m app.repair_book_stats [--dry-run]
+"""
+
+import sys
+from collections import defaultdict
+
+from sqlalchemy import func
+
+from app.database import SessionLocal
+from app.models.db_models import Book, BookLoan, BookReview, LoanStatus
+from app.utils.rating_histogram import RATING_BUCKETS, rating_bucket_field
+
+BATCH_SIZE = 1000
+
+
+def repair_book_stats(dry_run: bool = False) -> int:
+    """Повертає кількість книг, лічильники яких розходилися з вихідними таблицями"""
+    db = SessionLocal()
+    try:
+        ratings = dict(
+            (book_id, (rating_sum, rating_count))
+            for book_id, rating_sum, rating_count in db.query(
+                BookReview.book_id, func.sum(BookReview.rating), func.count(BookReview.id)
+            ).group_by(BookReview.book_id)
+        )
+        histograms = defaultdict(dict)
+        for book_id, rating, count in db.query(
+            BookReview.book_id, BookReview.rating, func.count(BookReview.id)
+        ).group_by(BookReview.book_id, BookReview.rating):
+            field = rating_bucket_field(rating)
+            histograms[book_id][field] = histograms[book_id].get(field, 0) + count
+        readers = dict(
+            db.query(BookLoan.book_id, func.count(func.distinct(BookLoan.user_id)))
+            .filter(BookLoan.status != LoanStatus.WAITING)
+            .group_by(BookLoan.book_id)
+        )
+        waiting = dict(
+            db.query(BookLoan.book_id, func.count(BookLoan.id))
+            .filter(BookLoan.status == LoanStatus.WAITING)
+            .group_by(BookLoan.book_id)
+        )
+
+        fixed = 0
+        last_id = 0
+        while True:
+            # Пакет читається повністю до UPDATE: потоковий курсор (yield_per) не переживає
+            # інших запитів у тій самій сесії
+            books = db.query(Book).filter(Book.id > last_id).order_by(Book.id).limit(BATCH_SIZE).all()
+            if not books:
+                break
+            last_id = books[-1].id
+            for book in books:
+                rating_sum, rating_count = ratings.get(book.id, (0, 0))
+                readers_count = readers.get(book.id, 0)
+                waitlist_count = waiting.get(book.id, 0)
+                counts = histograms.get(book.id, {})
+                histogram = {field: counts.get(field, 0) for field in map(rating_bucket_field, RATING_BUCKETS)}
+                current_histogram = {field: getattr(book, field) for field in histogram}
+                if (float(book.rating_sum or 0) != float(rating_sum or 0) or
+                        book.rating_count != rating_count or book.readers_count != readers_count or
+                        book.waitlist_count != waitlist_count or current_histogram != histogram):
+                    print(
+                        f"  book {book.id}: rating {book.rating_sum}/{book.rating_count} -> {rating_sum}/{rating_count}, "
+                        f"readers {book.readers_count} -> {readers_count}, waitlist {book.waitlist_count} -> {waitlist_count}"
+                        + (f", histogram {list(current_histogram.values())} -> {list(histogram.values())}"
+                           if current_histogram != histogram else "")
+                    )
+                    fixed += 1
+                    if not dry_run:
+                        db.query(Book).filter(Book.id == book.id).update({
+                            Book.rating_sum: rating_sum or 0,
+                            Book.rating_count: rating_count,
+                            Book.readers_count: readers_count,
+                            Book.waitlist_count: waitlist_count,
+                            **{getattr(Book, field): count for field, count in histogram.items()}
+                        }, synchronize_session=False)
+
+        if not dry_run:
+            db.commit()
+        return fixed
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    dry_run = "--dry-run" in sys.argv
+    print("🔧 Перерахунок статистики книг" + (" (dry run)" if dry_run else "") + "...")
+    fixed = repair_book_stats(dry_run=dry_run)
+    print(f"✅ Готово: {'знайдено' if dry_run else 'виправлено'} розбіжностей - {fixed}")
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Query, Request, Response
 import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
 from sqlalchemy import desc, func
 from typing import List, Optional
 from loguru import logger
@@ -12,34 +12,57 @@ import io
 from app.database import get_db
 from app.models.db_models import Book, BookLoan, BookStatus, LoanStatus, Club, BookReview, ClubMember
 from app.models.schemas import (
-    BookCreate, BookUpdate, BookResponse, 
-    BookDetailResponse, BookReviewCreate, BookReviewUpdate, BookReviewResponse
+    BookCreate, BookUpdate, BookResponse, BookLoanResponse,
+    BookDetailResponse, BookChangesResponse, BookReviewCreate, BookReviewUpdate, BookReviewResponse,
+    WaitlistResponse
 )
 from app.auth import get_current_user, get_current_user_with_internal_id
 from app.utils import file_storage
+from app.utils.pagination import (
+    NEXT_CURSOR_HEADER, decode_cursor, decode_offset_cursor, encode_cursor,
+    keyset_filter, next_cursor, order_by_columns
+)
+from app.utils.book_search import build_search_document, search_clause
+from app.utils.fast_json import FAST_JSON_RESPONSES, fast_json_response
 from app.google_books import GoogleBooksService
+from app.services.entity_cache import invalidate_book
+from app.utils.etag import bump_club_version, club_etag, get_club_version, not_modified
+from app.utils.rating_histogram import rating_bucket_field, rating_histogram
 
 router = APIRouter(prefix="/api/books", tags=["Books"])
 
-def enrich_book_with_stats(book_dict: dict, book_id: int, db: Session) -> dict:
-    """Додає average_rating та readers_count до словника книги"""
-    # Рахуємо середній рейтинг з відгуків
-    reviews = db.query(BookReview).filter(BookReview.book_id == book_id).all()
-    if reviews:
-        avg_rating = sum(r.rating for r in reviews) / len(reviews)
-        book_dict['average_rating'] = round(avg_rating, 2)
+def enrich_book_with_stats(book_dict: dict, book: Book) -> dict:
+    """Додає average_rating та readers_count до словника книги (з лічильників книги, без запитів)"""
+    if book.rating_count:
+        book_dict['average_rating'] = round(book.rating_sum / book.rating_count, 2)
     else:
         book_dict['average_rating'] = None
     
-    # Рахуємо унікальних читачів (всі хто коли-небудь брав книгу)
-    readers_count = db.query(BookLoan.user_id).filter(
-        BookLoan.book_id == book_id
-    ).distinct().count()
-    book_dict['readers_count'] = readers_count
+    # Унікальні читачі (всі хто коли-небудь брав книгу)
+    book_dict['readers_count'] = book.readers_count or 0
     
     return book_dict
 
-def verify_club_membership(db: Session, club_id: int, user_id: str):
+def bump_book_stats(db: Session, book_id: int, **deltas):
+    """Атомарно змінює лічильники книги: UPDATE books SET field = field + delta (у транзакції запиту)"""
+    db.query(Book).filter(Book.id == book_id).update(
+        {getattr(Book, field): getattr(Book, field) + delta for field, delta in deltas.items()},
+        synchronize_session=False
+    )
+
+def refresh_search_document(db: Session, book: Book):
+    """Перебудовує books.search_text з поточних полів книги та її останнього читача"""
+    reader_username = reader_name = None
+    if book.last_loan_id:
+        last_reader = db.query(BookLoan.username, ClubMember.user_name).outerjoin(
+            ClubMember,
+            (BookLoan.user_id == ClubMember.user_id) & (ClubMember.club_id == book.club_id)
+        ).filter(BookLoan.id == book.last_loan_id).first()
+        if last_reader:
+            reader_username, reader_name = last_reader
+    book.search_text = build_search_document(book, reader_username, reader_name)
+
+def verify_club_membership(db: Session, club_id: int, user_id: str) -> ClubMember:
     """Перевіряє, чи користувач є членом клубу. Кидає HTTPException якщо ні."""
     member = db.query(ClubMember).filter(
         ClubMember.club_id == club_id,
@@ -48,16 +71,135 @@ def verify_club_membership(db: Session, club_id: int, user_id: str):
     
     if not member:
         raise HTTPException(status_code=403, detail="Ви не є членом цього клубу")
+    
+    return member
+
+def club_books_query(db: Session, club_id: int):
+    """
+    Книги клубу з останнім читачем: (Book, last_reader_id, last_reader_username, last_reader_name, last_loan_status).
+    
+    Останній loan кожної книги - через вказівник Book.last_loan_id (оновлюється в borrow_book),
+    тобто пошук за первинним ключем лише для книг цього клубу, без вікна по всій історії.
+    """
+    LastLoan = aliased(BookLoan)
+    
+    # Додаємо ClubMember для отримання імені останнього читача
+    return (
+        db.query(
+            Book,
+            LastLoan.user_id.label('last_reader_id'),
+            LastLoan.username.label('last_reader_username'),
+            ClubMember.user_name.label('last_reader_name'),
+            LastLoan.status.label('last_loan_status')
+        )
+        .outerjoin(LastLoan, LastLoan.id == Book.last_loan_id)
+        .outerjoin(
+            ClubMember,
+            (LastLoan.user_id == ClubMember.user_id) & (ClubMember.club_id == club_id)
+        )
+        .filter(Book.club_id == club_id)
+    )
+
+def book_list_item(book: Book, last_reader_id, last_reader_username, last_reader_name, last_loan_status) -> dict:
+    """
+    Елемент списку книг у формі BookResponse: current_reader_id, average_rating, readers_count та holder.
+    
+    Словник збирається напряму з рядка, без проміжної pydantic-моделі (див. app.utils.fast_json).
+    """
+    book_dict = {
+        'id': book.id,
+        'title': book.title,
+        'author': book.author,
+        'owner_id': book.owner_id,
+        'owner_name': book.owner_name,
+        'owner_username': book.owner_username,
+        'status': book.status.value if hasattr(book.status, 'value') else book.status,
+        'current_reader_id': None,
+        'cover_url': book.cover_url,
+        'description': book.description,
+        'created_at': book.created_at,
+        'waitlist_count': book.waitlist_count or 0,
+        'waitlist_position': None,
+    }
+    
+    # Позичити можна лише доступну книгу, тож активний loan - завжди останній
+    if last_loan_status == LoanStatus.READING:
+        book_dict['current_reader_id'] = last_reader_id
+    
+    # Визначаємо holder: якщо є історія читання - останній читач, інакше - власник
+    if last_reader_id:
+        book_dict['holder_id'] = last_reader_id
+        book_dict['holder_username'] = last_reader_username
+        book_dict['holder_name'] = last_reader_name
+    else:
+        # Якщо історії немає - holder це owner
+        book_dict['holder_id'] = book.owner_id
+        book_dict['holder_username'] = book.owner_username
+        book_dict['holder_name'] = book.owner_name
+    
+    # Додаємо статистику
+    return enrich_book_with_stats(book_dict, book)
+
+def waitlist_positions(db: Session, user_id: str, book_ids: List[int]) -> dict:
+    """
+    {book_id: позиція користувача в черзі (з 1)} одним запитом для всіх книг сторінки.
+    
+    Позиція - кількість записів WAITING книги з id <= id запису користувача
+    (черга FIFO за id, індекс (book_id, status, id)).
+    """
+    if not book_ids:
+        return {}
+    Mine = aliased(BookLoan)
+    Ahead = aliased(BookLoan)
+    rows = db.query(Mine.book_id, func.count(Ahead.id)).join(
+        Ahead,
+        (Ahead.book_id == Mine.book_id) & (Ahead.status == LoanStatus.WAITING) & (Ahead.id <= Mine.id)
+    ).filter(
+        Mine.user_id == user_id,
+        Mine.status == LoanStatus.WAITING,
+        Mine.book_id.in_(book_ids)
+    ).group_by(Mine.book_id).all()
+    return dict(rows)
+
+def fill_waitlist_positions(db: Session, user_id: str, items: List[dict]):
+    """Додає waitlist_position до елементів списку; запит лише якщо в якоїсь книги є черга"""
+    queued = [item['id'] for item in items if item['waitlist_count']]
+    if not queued:
+        return
+    positions = waitlist_positions(db, user_id, queued)
+    for item in items:
+        item['waitlist_position'] = positions.get(item['id'])
+
+# sort_by -> ключ keyset-пагінації [(колонка, descending)]; id останнім робить ключ унікальним
+BOOK_SORT_KEYS = {
+    'created': [(Book.created_at, True), (Book.id, True)],
+    'title': [(Book.title, False), (Book.id, False)],
+    'author': [(Book.author, False), (Book.title, False), (Book.id, False)],
+    # Книги без відгуків (rating_avg IS NULL) - в кінці
+    'rating': [(Book.rating_avg, True), (Book.created_at, True), (Book.id, True)],
+    'readers': [(Book.readers_count, True), (Book.created_at, True), (Book.id, True)],
+}
 
 @router.get("/club/{club_id}", response_model=List[BookResponse])
 async def get_books(
     club_id: int,
+    request: Request,
+    response: Response,
     search: Optional[str] = None,
     sort_by: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Розмір сторінки; без limit - усі книги"),
+    cursor: Optional[str] = Query(None, description="Курсор з заголовка X-Next-Cursor попередньої сторінки"),
     db: Session = Depends(get_db),
     user: dict = Depends(get_current_user)
 ):
-    """Отримати список книг в клубі"""
+    """
+    Отримати список книг в клубі.
+    
+    З limit повертає одну сторінку; курсор наступної сторінки - у заголовку X-Next-Cursor
+    (відсутній на останній сторінці). Сортування й пагінація виконуються в БД за індексами.
+    search - префіксний пошук за назвою, автором, власником і останнім читачем;
+    без sort_by результати впорядковані за релевантністю.
+    """
     user_id = str(user['user']['id'])
     
     # Перевіряємо, що клуб існує
@@ -68,115 +210,123 @@ async def get_books(
     # Перевіряємо членство в клубі
     verify_club_membership(db, club_id, user_id)
     
-    # Підзапит для знаходження останнього loan для кожної книги
-    subquery = (
-        db.query(
-            BookLoan.book_id,
-            BookLoan.user_id.label('last_reader_id'),
-            BookLoan.username.label('last_reader_username'),
-            func.row_number().over(
-                partition_by=BookLoan.book_id,
-                order_by=desc(BookLoan.borrowed_at)
-            ).label('row_num')
-        )
-        .subquery()
-    )
-    
-    # Підзапит для отримання тільки останніх loans
-    last_loans = (
-        db.query(subquery)
-        .filter(subquery.c.row_num == 1)
-        .subquery()
-    )
+    # Клуб не змінювався з попереднього запиту - 304 без запитів по книгах
+    cached = not_modified(request, response, club_etag(request, club_id, club.data_version, user_id))
+    if cached:
+        return cached
     
-    # Додаємо ClubMember для отримання імені останнього читача
-    query = (
-        db.query(
-            Book,
-            last_loans.c.last_reader_id,
-            last_loans.c.last_reader_username,
-            ClubMember.user_name.label('last_reader_name')
-        )
-        .outerjoin(last_loans, Book.id == last_loans.c.book_id)
-        .outerjoin(
-            ClubMember,
-            (last_loans.c.last_reader_id == ClubMember.user_id) & (ClubMember.club_id == club_id)
-        )
-        .filter(
-            Book.club_id == club_id,
-            Book.status != BookStatus.DELETED
-        )
-    )
+    query = club_books_query(db, club_id).filter(Book.status != BookStatus.DELETED)
     
+    # Пошук по документу books.search_text (індекс FULLTEXT), а не по колонках приєднаних таблиць
+    relevance = None
     if search:
-        search_pattern = f"%{search}%"
-        query = query.filter(
-            (Book.title.like(search_pattern)) |
-            (Book.author.like(search_pattern)) |
-            (Book.owner_name.like(search_pattern)) |
-            (Book.owner_username.like(search_pattern)) |
-            (last_loans.c.last_reader_username.like(search_pattern)) |
-            (ClubMember.user_name.like(search_pattern))
-        )
-    
-    # Застосовуємо сортування (за замовчуванням - за датою створення)
-    if sort_by == 'author':
-        query = query.order_by(Book.author.asc(), Book.title.asc())
-    elif sort_by == 'title':
-        query = query.order_by(Book.title.asc())
-    else:
-        # За замовчуванням - за датою створення (найновіші першими)
-        query = query.order_by(desc(Book.created_at))
-    
-    books_data = query.all()
-    
-    # Додаємо current_reader_id, average_rating, readers_count та holder для кожної книги
-    result = []
-    for book, last_reader_id, last_reader_username, last_reader_name in books_data:
-        book_dict = BookResponse.model_validate(book).model_dump()
+        search_filter, relevance = search_clause(Book.search_text, search, db.get_bind().dialect.name)
+        if search_filter is not None:
+            query = query.filter(search_filter)
+    
+    if relevance is not None and sort_by in (None, '', 'relevance'):
+        # Найрелевантніші першими; релевантність не зберігається в рядку, тож курсор - зміщення
+        sort_kind = 'relevance'
+        query = query.order_by(relevance.desc(), desc(Book.id))
+        try:
+            offset = decode_offset_cursor(cursor, sort_kind) if cursor else 0
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit + 1)
         
-        # Знаходимо активний loan
-        active_loan = db.query(BookLoan).filter(
-            BookLoan.book_id == book.id,
-            BookLoan.status == 'READING'
-        ).first()
+        books_data = query.all()
         
-        if active_loan:
-            book_dict['current_reader_id'] = active_loan.user_id
+        if limit is not None and len(books_data) > limit:
+            del books_data[limit:]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(sort_kind, [offset + limit])
+    else:
+        # Застосовуємо сортування (за замовчуванням - за датою створення, найновіші першими)
+        sort_kind = sort_by if sort_by in BOOK_SORT_KEYS else 'created'
+        sort_key = BOOK_SORT_KEYS[sort_kind]
+        query = query.order_by(*order_by_columns(sort_key))
         
-        # Визначаємо holder: якщо є історія читання - останній читач, інакше - власник
-        if last_reader_id:
-            book_dict['holder_id'] = last_reader_id
-            book_dict['holder_username'] = last_reader_username
-            book_dict['holder_name'] = last_reader_name
-        else:
-            # Якщо історії немає - holder це owner
-            book_dict['holder_id'] = book.owner_id
-            book_dict['holder_username'] = book.owner_username
-            book_dict['holder_name'] = book.owner_name
+        if cursor:
+            try:
+                query = query.filter(keyset_filter(sort_key, decode_cursor(cursor, sort_kind, sort_key)))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
         
-        # Додаємо статистику
-        book_dict = enrich_book_with_stats(book_dict, book.id, db)
+        if limit is not None:
+            query = query.limit(limit + 1)
         
-        result.append(book_dict)
-    
-    # Сортуємо за рейтингом або кількістю читачів (після enrichment)
-    if sort_by == 'rating':
-        result.sort(key=lambda x: (x.get('average_rating') or 0), reverse=True)
-    elif sort_by == 'readers':
-        result.sort(key=lambda x: (x.get('readers_count') or 0), reverse=True)
-    
-    return result
+        books_data = query.all()
+        
+        page_cursor = next_cursor(books_data, limit, sort_kind, sort_key, entity=lambda row: row[0])
+        if page_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = page_cursor
+    
+    books = [book_list_item(*row) for row in books_data]
+    fill_waitlist_positions(db, user_id, books)
+    if FAST_JSON_RESPONSES:
+        return fast_json_response(books, response, List[BookResponse])
+    return books
 
-@router.get("/book/{book_id}", response_model=BookDetailResponse)
-async def get_book_details(
-    book_id: int,
+@router.get("/club/{club_id}/changes", response_model=BookChangesResponse)
+async def get_book_changes(
+    club_id: int,
+    since: int = Query(0, ge=0, description="version з попередньої відповіді; 0 - повний список"),
     db: Session = Depends(get_db),
     user: dict = Depends(get_current_user)
 ):
-    """Отримати деталі книги з історією"""
+    """
+    Книги клубу, змінені після версії since: створені, оновлені, позичені/повернуті,
+    з новими відгуками (changed) та видалені (deleted).
+    
+    Кожна зміна книги записує в books.row_version нову версію клубу (clubs.data_version),
+    тож відповідь пропорційна кількості змін, а не розміру каталогу.
+    """
     user_id = str(user['user']['id'])
     
+    # Версію читаємо до книг: зміна, що закомітилась між запитами, потрапить у наступну дельту
+    version = get_club_version(db, club_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Club not found")
+    
+    verify_club_membership(db, club_id, user_id)
+    
+    if since > version:
+        # Версія не з цього клубу - клієнт має перезавантажити список повністю
+        raise HTTPException(status_code=409, detail="Unknown version, reload with since=0")
+    if since == version:
+        return {"version": version, "changed": [], "deleted": []}
+    
+    query = club_books_query(db, club_id)
+    if since:
+        # Індекс (club_id, row_version)
+        query = query.filter(Book.row_version > since)
+    else:
+        query = query.filter(Book.status != BookStatus.DELETED)
+    
+    changed, deleted = [], []
+    for row in query.order_by(Book.row_version, Book.id).all():
+        if row[0].status == BookStatus.DELETED:
+            deleted.append(row[0].id)
+        else:
+            changed.append(book_list_item(*row))
+    fill_waitlist_positions(db, user_id, changed)
+    
+    return {"version": version, "changed": changed, "deleted": deleted}
+
+# Розмір перших сторінок історії в деталях книги
+DETAIL_PAGE_SIZE = 20
+
+LOAN_SORT_KEY = [(BookLoan.borrowed_at, True), (BookLoan.id, True)]
+# sort_by відгуків -> ключ keyset-пагінації
+REVIEW_SORT_KEYS = {
+    'newest': [(BookReview.created_at, True), (BookReview.id, True)],
+    'rating': [(BookReview.rating, True), (BookReview.created_at, True), (BookReview.id, True)],
+}
+
+def get_visible_book(db: Session, book_id: int, user_id: str) -> Book:
+    """Книга (не видалена) з перевіркою членства в її клубі"""
     book = db.query(Book).filter(
         Book.id == book_id,
         Book.status != BookStatus.DELETED
@@ -187,45 +337,99 @@ async def get_book_details(
     
     # Перевіряємо членство в клубі
     verify_club_membership(db, book.club_id, user_id)
-    
-    # Завантажуємо історію loans з іменами користувачів з club_members
-    loans_raw = db.query(
+    return book
+
+def book_loans_page(db: Session, book: Book, limit: int, cursor: Optional[str] = None):
+    """Сторінка історії позичань (найновіші першими, без черги очікування) з іменами з club_members: (loans, next_cursor)"""
+    query = db.query(
         BookLoan,
         ClubMember.user_name
     ).outerjoin(
         ClubMember,
         (BookLoan.user_id == ClubMember.user_id) & (ClubMember.club_id == book.club_id)
     ).filter(
-        BookLoan.book_id == book_id
-    ).order_by(desc(BookLoan.borrowed_at)).all()
+        BookLoan.book_id == book.id,
+        BookLoan.status != LoanStatus.WAITING
+    ).order_by(*order_by_columns(LOAN_SORT_KEY))
+    
+    if cursor:
+        try:
+            query = query.filter(keyset_filter(LOAN_SORT_KEY, decode_cursor(cursor, 'loans', LOAN_SORT_KEY)))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    rows = query.limit(limit + 1).all()
+    page_cursor = next_cursor(rows, limit, 'loans', LOAN_SORT_KEY, entity=lambda row: row[0])
     
     # Збагачуємо loans іменами користувачів
     loans = []
-    for loan, user_name in loans_raw:
-        loan_dict = loan.__dict__.copy()
+    for loan, user_name in rows:
+        loan_dict = BookLoanResponse.model_validate(loan).model_dump()
         loan_dict['user_name'] = user_name
-        loans.append(type('obj', (object,), loan_dict)())
+        loans.append(loan_dict)
+    return loans, page_cursor
+
+def book_reviews_page(db: Session, book: Book, limit: Optional[int], cursor: Optional[str] = None,
+                      sort_by: str = 'newest'):
+    """
+    Сторінка відгуків: (reviews, next_cursor); limit=None - усі.
     
-    # Завантажуємо відгуки
-    reviews = db.query(BookReview).filter(
-        BookReview.book_id == book_id
-    ).order_by(desc(BookReview.created_at)).all()
+    sort_by: 'newest' - найновіші першими, 'rating' - найвищі оцінки першими.
+    """
+    if sort_by not in REVIEW_SORT_KEYS:
+        sort_by = 'newest'
+    sort_key = REVIEW_SORT_KEYS[sort_by]
+    # 'reviews' - як і до sort_by, тож reviews_next_cursor з деталей книги лишається дійсним
+    kind = 'reviews' if sort_by == 'newest' else f'reviews_{sort_by}'
     
-    # Знаходимо активний loan
-    active_loan = db.query(BookLoan).filter(
-        BookLoan.book_id == book_id,
-        BookLoan.status == 'READING'
-    ).first()
+    query = db.query(BookReview).filter(
+        BookReview.book_id == book.id
+    ).order_by(*order_by_columns(sort_key))
+    
+    if cursor:
+        try:
+            query = query.filter(keyset_filter(sort_key, decode_cursor(cursor, kind, sort_key)))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    if limit is not None:
+        query = query.limit(limit + 1)
+    
+    reviews = query.all()
+    return reviews, next_cursor(reviews, limit, kind, sort_key)
+
+@router.get("/book/{book_id}", response_model=BookDetailResponse)
+async def get_book_details(
+    book_id: int,
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Отримати деталі книги: книга, статистика з розподілом оцінок, holder та перші
+    сторінки історії позичань і відгуків (решта - /loans і /reviews з курсором).
+    
+    Вартість не залежить від довжини історії книги.
+    """
+    user_id = str(user['user']['id'])
+    
+    book = get_visible_book(db, book_id, user_id)
+    
+    loans, loans_cursor = book_loans_page(db, book, DETAIL_PAGE_SIZE)
+    reviews, reviews_cursor = book_reviews_page(db, book, DETAIL_PAGE_SIZE)
     
     result_dict = book.__dict__.copy()
-    result_dict['current_reader_id'] = active_loan.user_id if active_loan else None
     
-    # Визначаємо holder: якщо є історія читання - останній читач, інакше - власник
-    if loans:
-        last_loan = loans[0]  # Вже відсортовано за borrowed_at DESC
-        result_dict['holder_id'] = last_loan.user_id
-        result_dict['holder_username'] = last_loan.username
-        result_dict['holder_name'] = last_loan.user_name
+    # Перша сторінка історії починається з останнього позичання (Book.last_loan_id):
+    # holder - останній читач, а якщо історії немає - власник.
+    # Позичити можна лише доступну книгу, тож активний loan - завжди останній
+    last_loan = loans[0] if loans else None
+    result_dict['current_reader_id'] = (
+        last_loan['user_id'] if last_loan and last_loan['status'] == LoanStatus.READING else None
+    )
+    if last_loan:
+        result_dict['holder_id'] = last_loan['user_id']
+        result_dict['holder_username'] = last_loan['username']
+        result_dict['holder_name'] = last_loan['user_name']
     else:
         # Якщо історії немає - holder це owner
         result_dict['holder_id'] = book.owner_id
@@ -233,14 +437,38 @@ async def get_book_details(
         result_dict['holder_name'] = book.owner_name
     
     # Додаємо статистику
-    result_dict = enrich_book_with_stats(result_dict, book_id, db)
+    result_dict = enrich_book_with_stats(result_dict, book)
+    if book.waitlist_count:
+        result_dict['waitlist_position'] = waitlist_positions(db, user_id, [book.id]).get(book.id)
     
     return BookDetailResponse(
         **result_dict,
         loans=loans,
-        reviews=reviews
+        reviews=reviews,
+        loans_next_cursor=loans_cursor,
+        reviews_next_cursor=reviews_cursor,
+        rating_histogram=rating_histogram(book)
     )
 
+@router.get("/{book_id}/loans", response_model=List[BookLoanResponse])
+async def get_book_loans(
+    book_id: int,
+    response: Response,
+    limit: int = Query(DETAIL_PAGE_SIZE, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="loans_next_cursor з деталей книги або X-Next-Cursor"),
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_user)
+):
+    """Історія позичань книги, найновіші першими; курсор наступної сторінки - у заголовку X-Next-Cursor"""
+    user_id = str(user['user']['id'])
+    
+    book = get_visible_book(db, book_id, user_id)
+    
+    loans, page_cursor = book_loans_page(db, book, limit, cursor)
+    if page_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page_cursor
+    return loans
+
 @router.post("", response_model=BookResponse, status_code=201)
 async def create_book(
     book_data: BookCreate,
@@ -290,7 +518,7 @@ async def create_book(
         if age is not None and age <= 5:
             logger.warning(f"Duplicate create detected (within {age}s). Returning existing book id={existing.id} client_request_id={client_request_id}")
             book_dict = BookResponse.model_validate(existing).model_dump()
-            book_dict = enrich_book_with_stats(book_dict, existing.id, db)
+            book_dict = enrich_book_with_stats(book_dict, existing)
             return book_dict
 
     new_book = Book(
@@ -305,8 +533,10 @@ async def create_book(
         club_id=book_data.club_id,
         status=BookStatus.AVAILABLE
     )
+    new_book.search_text = build_search_document(new_book)
     
     db.add(new_book)
+    new_book.row_version = bump_club_version(db, book_data.club_id)
     db.commit()
     db.refresh(new_book)
     
@@ -314,7 +544,7 @@ async def create_book(
     
     # Додаємо статистику (для нової книги буде 0)
     book_dict = BookResponse.model_validate(new_book).model_dump()
-    book_dict = enrich_book_with_stats(book_dict, new_book.id, db)
+    book_dict = enrich_book_with_stats(book_dict, new_book)
     
     return book_dict
 
@@ -358,12 +588,17 @@ async def update_book(
             except Exception as e:
                 logger.warning(f"Failed to delete old cover (PATCH) for book {book_id}: {e}")
     
+    if book_data.title is not None or book_data.author is not None:
+        refresh_search_document(db, book)
+    
+    book.row_version = bump_club_version(db, book.club_id)
     db.commit()
     db.refresh(book)
+    invalidate_book(book_id)
     
     # Додаємо статистику
     book_dict = BookResponse.model_validate(book).model_dump()
-    book_dict = enrich_book_with_stats(book_dict, book.id, db)
+    book_dict = enrich_book_with_stats(book_dict, book)
     
     return book_dict
 
@@ -390,6 +625,7 @@ async def delete_book(
     
     # Soft delete
     book.status = BookStatus.DELETED
+    book.row_version = bump_club_version(db, book.club_id)
     db.commit()
     
     return None
@@ -414,10 +650,27 @@ async def borrow_book(
         raise HTTPException(status_code=404, detail="Книга не знайдена")
     
     # Перевіряємо членство в клубі
-    verify_club_membership(db, book.club_id, user_id)
+    member = verify_club_membership(db, book.club_id, user_id)
     
     if book.status != BookStatus.AVAILABLE:
-        raise HTTPException(status_code=400, detail="Книга вже позичена")
+        raise HTTPException(status_code=409, detail="Книга вже позичена")
+    
+    # Атомарно займаємо книгу: UPDATE ... WHERE status = 'AVAILABLE' блокує рядок до commit,
+    # тож з одночасних запитів книгу отримує лише один, решта - 409
+    claimed = db.query(Book).filter(
+        Book.id == book_id,
+        Book.status == BookStatus.AVAILABLE
+    ).update({Book.status: BookStatus.READING}, synchronize_session=False)
+    if not claimed:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Книга вже позичена")
+    
+    # Перше позичання цим користувачем - новий унікальний читач
+    is_new_reader = db.query(BookLoan.id).filter(
+        BookLoan.book_id == book_id,
+        BookLoan.user_id == user_id,
+        BookLoan.status != LoanStatus.WAITING
+    ).first() is None
     
     # Створюємо запис про позичання
     loan = BookLoan(
@@ -428,17 +681,21 @@ async def borrow_book(
         status=LoanStatus.READING
     )
     
-    # Оновлюємо статус книги
-    book.status = BookStatus.READING
-    
     db.add(loan)
+    db.flush()
+    # Вказівник на останнє позичання: holder і поточний читач у списку книг
+    book.last_loan_id = loan.id
+    book.search_text = build_search_document(book, loan.username, member.user_name)
+    if is_new_reader:
+        bump_book_stats(db, book_id, readers_count=1)
+    book.row_version = bump_club_version(db, book.club_id)
     db.commit()
     db.refresh(book)
     
     # Додаємо статистику
     book_dict = BookResponse.model_validate(book).model_dump()
     book_dict['current_reader_id'] = str(telegram_user['id'])
-    book_dict = enrich_book_with_stats(book_dict, book.id, db)
+    book_dict = enrich_book_with_stats(book_dict, book)
     
     # Notification logic
     try:
@@ -470,6 +727,46 @@ async def borrow_book(
         logger.warning(f"[NOTIFY] Не вдалося надіслати сповіщення про взяття книги: {e}")
     return book_dict
 
+def promote_from_waitlist(db: Session, book: Book, entry: BookLoan):
+    """Перший у черзі стає читачем: WAITING -> READING, книга лишається позиченою"""
+    is_new_reader = db.query(BookLoan.id).filter(
+        BookLoan.book_id == book.id,
+        BookLoan.user_id == entry.user_id,
+        BookLoan.status != LoanStatus.WAITING
+    ).first() is None
+    
+    db.query(BookLoan).filter(BookLoan.id == entry.id).update(
+        {BookLoan.status: LoanStatus.READING, BookLoan.borrowed_at: func.now()},
+        synchronize_session=False
+    )
+    db.query(Book).filter(Book.id == book.id).update(
+        {Book.status: BookStatus.READING, Book.last_loan_id: entry.id},
+        synchronize_session=False
+    )
+    bump_book_stats(db, book.id, waitlist_count=-1, readers_count=1 if is_new_reader else 0)
+    
+    reader_name = db.query(ClubMember.user_name).filter(
+        ClubMember.club_id == book.club_id,
+        ClubMember.user_id == entry.user_id
+    ).scalar()
+    book.search_text = build_search_document(book, entry.username, reader_name)
+
+def notify_waitlist_promoted(db: Session, book: Book, entry: BookLoan):
+    """Одне сповіщення учаснику, до якого перейшла книга з черги"""
+    try:
+        from app.notifications.service import notify
+        from datetime import datetime
+        club = db.query(Club).filter(Club.id == book.club_id).first()
+        context = {
+            'book_title': book.title,
+            'club_name': club.name if club else '',
+            'date': datetime.now().strftime('%d.%m.%Y %H:%M')
+        }
+        logger.info(f"[NOTIFY] Waitlist promotion: book_id={book.id} user_id={entry.user_id} context={context}")
+        notify('waitlist_promoted', [entry.user_id], context)
+    except Exception as e:
+        logger.warning(f"[NOTIFY] Не вдалося надіслати сповіщення про книгу з черги: {e}")
+
 @router.post("/{book_id}/return", response_model=BookResponse)
 async def return_book(
     book_id: int,
@@ -498,21 +795,46 @@ async def return_book(
     if not loan:
         raise HTTPException(status_code=404, detail="Активне позичання не знайдено")
     
-    # Оновлюємо loan
-    loan.status = LoanStatus.RETURNED
+    # Умовні UPDATE у порядку borrow_book (books, потім book_loans, потім clubs), щоб
+    # одночасні позичання/повернення не блокували одне одного навхрест.
+    # Книга повертається, лише якщо це позичання досі останнє й активне
+    released = db.query(Book).filter(
+        Book.id == book_id,
+        Book.status == BookStatus.READING,
+        Book.last_loan_id == loan.id
+    ).update({Book.status: BookStatus.AVAILABLE}, synchronize_session=False)
+    
     from datetime import datetime
-    loan.returned_at = datetime.now()
+    closed = db.query(BookLoan).filter(
+        BookLoan.id == loan.id,
+        BookLoan.status == LoanStatus.READING
+    ).update({BookLoan.status: LoanStatus.RETURNED, BookLoan.returned_at: datetime.now()}, synchronize_session=False)
+    
+    if not released or not closed:
+        # Паралельний запит вже повернув книгу
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Книгу вже повернуто")
     
-    # Оновлюємо статус книги
-    book.status = BookStatus.AVAILABLE
+    # Наступний у черзі одразу отримує книгу (рядок книги вже заблокований UPDATE вище,
+    # тож черга не змінюється паралельно)
+    promoted = db.query(BookLoan).filter(
+        BookLoan.book_id == book_id,
+        BookLoan.status == LoanStatus.WAITING
+    ).order_by(BookLoan.id).first()
+    if promoted:
+        promote_from_waitlist(db, book, promoted)
     
+    book.row_version = bump_club_version(db, book.club_id)
     db.commit()
     db.refresh(book)
     
     # Додаємо статистику
     book_dict = BookResponse.model_validate(book).model_dump()
-    book_dict['current_reader_id'] = None
-    book_dict = enrich_book_with_stats(book_dict, book.id, db)
+    book_dict['current_reader_id'] = promoted.user_id if promoted else None
+    book_dict = enrich_book_with_stats(book_dict, book)
+    
+    if promoted:
+        notify_waitlist_promoted(db, book, promoted)
     
     # Notification logic
     try:
@@ -545,6 +867,93 @@ async def return_book(
     return book_dict
 
 
+@router.post("/{book_id}/waitlist", response_model=WaitlistResponse, status_code=201)
+async def join_waitlist(
+    book_id: int,
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_user_with_internal_id)
+):
+    """Стати в чергу на позичену книгу; після повернення книга переходить першому в черзі"""
+    telegram_user = user['user']
+    user_id = str(telegram_user['id'])
+    internal_user_id = user.get('internal_user_id')
+    
+    # Рядок книги блокується до commit: вступ у чергу, вихід і повернення книги йдуть по черзі
+    book = db.query(Book).filter(
+        Book.id == book_id,
+        Book.status != BookStatus.DELETED
+    ).with_for_update().first()
+    
+    if not book:
+        raise HTTPException(status_code=404, detail="Книга не знайдена")
+    
+    # Перевіряємо членство в клубі
+    verify_club_membership(db, book.club_id, user_id)
+    
+    if book.status == BookStatus.AVAILABLE:
+        raise HTTPException(status_code=409, detail="Книга доступна - її можна позичити")
+    
+    current_reader_id = db.query(BookLoan.user_id).filter(BookLoan.id == book.last_loan_id).scalar()
+    if current_reader_id == user_id:
+        raise HTTPException(status_code=409, detail="Ви вже читаєте цю книгу")
+    
+    already_waiting = db.query(BookLoan.id).filter(
+        BookLoan.book_id == book_id,
+        BookLoan.user_id == user_id,
+        BookLoan.status == LoanStatus.WAITING
+    ).first()
+    if already_waiting:
+        raise HTTPException(status_code=409, detail="Ви вже в черзі на цю книгу")
+    
+    db.add(BookLoan(
+        book_id=book_id,
+        user_id=user_id,
+        internal_user_id=internal_user_id,
+        username=telegram_user.get('username') or telegram_user.get('first_name', 'Unknown'),
+        status=LoanStatus.WAITING
+    ))
+    db.flush()
+    bump_book_stats(db, book_id, waitlist_count=1)
+    book.row_version = bump_club_version(db, book.club_id)
+    db.commit()
+    db.refresh(book)
+    
+    return {
+        "book_id": book_id,
+        "waitlist_count": book.waitlist_count,
+        "waitlist_position": waitlist_positions(db, user_id, [book_id]).get(book_id)
+    }
+
+@router.delete("/{book_id}/waitlist", status_code=204)
+async def leave_waitlist(
+    book_id: int,
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_user)
+):
+    """Вийти з черги на книгу"""
+    user_id = str(user['user']['id'])
+    
+    book = db.query(Book).filter(Book.id == book_id).with_for_update().first()
+    if not book:
+        raise HTTPException(status_code=404, detail="Книга не знайдена")
+    
+    # Перевіряємо членство в клубі
+    verify_club_membership(db, book.club_id, user_id)
+    
+    removed = db.query(BookLoan).filter(
+        BookLoan.book_id == book_id,
+        BookLoan.user_id == user_id,
+        BookLoan.status == LoanStatus.WAITING
+    ).delete(synchronize_session=False)
+    if not removed:
+        raise HTTPException(status_code=404, detail="Ви не в черзі на цю книгу")
+    
+    bump_book_stats(db, book_id, waitlist_count=-removed)
+    book.row_version = bump_club_version(db, book.club_id)
+    db.commit()
+    
+    return None
+
 @router.post("/{book_id}/review", response_model=BookReviewResponse)
 async def create_or_update_review(
     book_id: int,
@@ -566,11 +975,13 @@ async def create_or_update_review(
     if not book:
         raise HTTPException(status_code=404, detail="Книга не знайдена")
     
-    # Перевіряємо, чи є вже відгук від цього користувача
+    # Перевіряємо, чи є вже відгук від цього користувача. Рядок блокується до commit:
+    # дельти лічильників рахуються від поточної оцінки, тож паралельне оновлення
+    # того ж відгуку має чекати, а не рахувати від застарілої
     existing_review = db.query(BookReview).filter(
         BookReview.book_id == book_id,
         BookReview.user_id == user_id
-    ).first()
+    ).with_for_update().first()
     
     # Формуємо повне ім'я
     first_name = telegram_user.get('first_name', '')
@@ -578,7 +989,14 @@ async def create_or_update_review(
     user_name = f"{first_name} {last_name}".strip() or "Користувач"
     
     if existing_review:
-        # Оновлюємо існуючий відгук
+        # Оновлюємо існуючий відгук; при зміні оцінки відгук переходить в інший стовпчик гістограми
+        old_bucket = rating_bucket_field(existing_review.rating)
+        new_bucket = rating_bucket_field(review_data.rating)
+        deltas = {'rating_sum': review_data.rating - existing_review.rating}
+        if old_bucket != new_bucket:
+            deltas[old_bucket] = -1
+            deltas[new_bucket] = 1
+        bump_book_stats(db, book_id, **deltas)
         existing_review.rating = review_data.rating
         existing_review.comment = review_data.comment
         existing_review.user_name = user_name
@@ -586,6 +1004,7 @@ async def create_or_update_review(
         from datetime import datetime
         existing_review.updated_at = datetime.now()
         
+        book.row_version = bump_club_version(db, book.club_id)
         db.commit()
         db.refresh(existing_review)
         return existing_review
@@ -602,6 +1021,9 @@ async def create_or_update_review(
         )
         
         db.add(new_review)
+        bump_book_stats(db, book_id, rating_sum=review_data.rating, rating_count=1,
+                        **{rating_bucket_field(review_data.rating): 1})
+        book.row_version = bump_club_version(db, book.club_id)
         db.commit()
         db.refresh(new_review)
         return new_review
@@ -654,15 +1076,19 @@ async def delete_review(
     # Перевіряємо членство в клубі
     verify_club_membership(db, book.club_id, user_id)
     
+    # Блокування: одночасне видалення не віднімає оцінку від лічильників двічі
     review = db.query(BookReview).filter(
         BookReview.book_id == book_id,
         BookReview.user_id == user_id
-    ).first()
+    ).with_for_update().first()
     
     if not review:
         raise HTTPException(status_code=404, detail="Відгук не знайдено")
     
     db.delete(review)
+    bump_book_stats(db, book_id, rating_sum=-review.rating, rating_count=-1,
+                    **{rating_bucket_field(review.rating): -1})
+    book.row_version = bump_club_version(db, book.club_id)
     db.commit()
     
     return None
@@ -671,10 +1097,19 @@ async def delete_review(
 @router.get("/{book_id}/reviews", response_model=List[BookReviewResponse])
 async def get_book_reviews(
     book_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=100, description="Розмір сторінки; без limit - усі відгуки"),
+    cursor: Optional[str] = Query(None, description="reviews_next_cursor з деталей книги або X-Next-Cursor"),
+    sort_by: str = Query('newest', description="newest - найновіші першими, rating - найвищі оцінки першими"),
     db: Session = Depends(get_db),
     user: dict = Depends(get_current_user)
 ):
-    """Отримати всі відгуки про книгу"""
+    """
+    Отримати відгуки про книгу; з limit - посторінково (X-Next-Cursor).
+    
+    Курсор прив'язаний до sort_by: наступні сторінки запитуються з тим самим sort_by.
+    Розподіл оцінок - rating_histogram у деталях книги, без завантаження всіх відгуків.
+    """
     user_id = str(user['user']['id'])
     
     # Перевіряємо що книга існує та отримуємо club_id
@@ -685,7 +1120,9 @@ async def get_book_reviews(
     # Перевіряємо членство в клубі
     verify_club_membership(db, book.club_id, user_id)
     
-    reviews = db.query(BookReview).filter(BookReview.book_id == book_id).all()
+    reviews, page_cursor = book_reviews_page(db, book, limit, cursor, sort_by)
+    if page_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page_cursor
     return reviews
 
 @router.post("/{book_id}/cover")
@@ -743,8 +1180,10 @@ def upload_book_cover(
         if hasattr(book, "updated_at"):
             book.updated_at = datetime.datetime.utcnow()
 
+        book.row_version = bump_club_version(db, book.club_id)
         db.commit()
         db.refresh(book)
+        invalidate_book(book_id)
 
         logger.info(f"Book {book_id} cover updated: {cover_url}")
 
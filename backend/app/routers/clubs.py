@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, File, UploadFile, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, func
 from typing import List
@@ -12,15 +12,17 @@ from app.auth import get_current_user, get_current_user_with_internal_id
 from app.models.db_models import (
     Club, ClubMember, ClubJoinRequest, ClubStatus, 
     MemberRole, JoinRequestStatus, Book, BookStatus,
-    BookLoan, BookReview
+    BookLoan, BookReview, LoanStatus
 )
 from app.models.schemas import (
     ClubCreate, ClubUpdate, ClubResponse, ClubDetailResponse,
     ClubMemberResponse, JoinRequestCreate, JoinRequestResponse,
-    JoinRequestAction, MemberRoleUpdate, ActivityFeedResponse,
-    ActivityEvent, ActivityEventType, ActivityActor, ActivityBook
+    JoinRequestAction, MemberRoleUpdate, ActivityFeedResponse
 )
 from app.utils import file_storage
+from app.services.entity_cache import invalidate_club
+from app.utils.etag import bump_club_version, bump_member_books_version, club_etag, get_club_version, not_modified
+from app.utils.fast_json import FAST_JSON_RESPONSES, fast_json_response
 
 router = APIRouter(prefix="/api/clubs", tags=["Clubs"])
 
@@ -114,12 +116,12 @@ async def get_my_clubs(
     user: dict = Depends(get_current_user)
 ):
     """Отримати список клубів користувача (включно з pending заявками)"""
-    from app.analytics import track_activity
+    from app.analytics import enqueue_activity
     
     user_id = str(user['user']['id'])
     
     # Відстежуємо відкриття додатку
-    track_activity(
+    enqueue_activity(
         activity_type="app_opened",
         user_id=user_id
     )
@@ -201,12 +203,16 @@ async def get_my_clubs(
         }
         result.append(club_dict)
     
+    if FAST_JSON_RESPONSES:
+        return fast_json_response(result, model=List[ClubResponse])
     return result
 
 
 @router.get("/{club_id}", response_model=ClubDetailResponse)
 async def get_club_details(
     club_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     user: dict = Depends(get_current_user)
 ):
@@ -226,6 +232,10 @@ async def get_club_details(
     if not role:
         raise HTTPException(status_code=403, detail="Ви не є членом цього клубу")
     
+    cached = not_modified(request, response, club_etag(request, club_id, club.data_version, user_id))
+    if cached:
+        return cached
+    
     # Завантажуємо членів
     members = db.query(ClubMember).filter(ClubMember.club_id == club_id).all()
     
@@ -276,8 +286,10 @@ async def update_club(
     if club_data.requires_approval is not None:
         club.requires_approval = club_data.requires_approval
     
+    bump_club_version(db, club_id)
     db.commit()
     db.refresh(club)
+    invalidate_club(club_id)
     
     # Додаємо статистику та роль
     members_count = db.query(ClubMember).filter(ClubMember.club_id == club.id).count()
@@ -366,6 +378,7 @@ async def request_to_join_club(
             reviewed_by="system_auto_approved"
         )
         db.add(join_request)
+        bump_member_books_version(db, club.id, user_id)
         db.commit()
         db.refresh(join_request)
         
@@ -384,6 +397,7 @@ async def request_to_join_club(
         status=JoinRequestStatus.PENDING
     )
     db.add(join_request)
+    bump_club_version(db, club.id)
     db.commit()
     db.refresh(join_request)
 
@@ -483,6 +497,10 @@ async def review_join_request(
     join_request.reviewed_at = datetime.now()
     join_request.reviewed_by = user_id
 
+    if join_request.status == JoinRequestStatus.APPROVED:
+        bump_member_books_version(db, club_id, join_request.user_id)
+    else:
+        bump_club_version(db, club_id)
     db.commit()
     db.refresh(join_request)
 
@@ -515,6 +533,8 @@ async def review_join_request(
 @router.get("/{club_id}/members", response_model=List[ClubMemberResponse])
 async def get_club_members(
     club_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     user: dict = Depends(get_current_user)
 ):
@@ -526,6 +546,11 @@ async def get_club_members(
     if not role:
         raise HTTPException(status_code=403, detail="Ви не є членом цього клубу")
     
+    # Версію читаємо до даних (див. club_etag)
+    cached = not_modified(request, response, club_etag(request, club_id, get_club_version(db, club_id), user_id))
+    if cached:
+        return cached
+    
     members = db.query(ClubMember).filter(
         ClubMember.club_id == club_id
     ).order_by(ClubMember.joined_at).all()
@@ -544,7 +569,8 @@ async def get_club_members(
         from app.models.db_models import BookLoan
         books_borrowed = db.query(BookLoan).join(Book).filter(
             Book.club_id == club_id,
-            BookLoan.user_id == member.user_id
+            BookLoan.user_id == member.user_id,
+            BookLoan.status != LoanStatus.WAITING
         ).count()
         
         # Підраховуємо відгуки
@@ -557,6 +583,7 @@ async def get_club_members(
         member_dict = {
             "id": member.id,
             "user_id": member.user_id,
+            "internal_user_id": member.internal_user_id,
             "user_name": member.user_name,
             "username": member.username,
             "role": member.role.value if hasattr(member.role, 'value') else member.role,
@@ -567,6 +594,8 @@ async def get_club_members(
         }
         result.append(member_dict)
     
+    if FAST_JSON_RESPONSES:
+        return fast_json_response(result, response, List[ClubMemberResponse])
     return result
 
 
@@ -603,6 +632,7 @@ async def remove_member(
         raise HTTPException(status_code=403, detail="Адміністратор не може видалити іншого адміністратора")
     
     db.delete(member)
+    bump_member_books_version(db, club_id, member_user_id)
     db.commit()
     
     logger.info(f"✅ Member {member_user_id} removed from club {club_id} by user {user_id}")
@@ -650,6 +680,7 @@ async def update_member_role(
     old_role = member.role
     member.role = MemberRole[role_data.role]  # Конвертуємо string в enum
     
+    bump_club_version(db, club_id)
     db.commit()
     db.refresh(member)
     
@@ -690,7 +721,9 @@ async def upload_club_avatar(
         
         # Update club
         club.cover_url = avatar_url
+        bump_club_version(db, club_id)
         db.commit()
+        invalidate_club(club_id)
         
         logger.success(f"✅ Club {club_id} avatar updated: {avatar_url}")
         
@@ -737,6 +770,7 @@ async def delete_club(
     # Soft delete - змінюємо статус
     club.status = ClubStatus.DELETED
     
+    bump_club_version(db, club_id)
     db.commit()
     
     logger.success(f"✅ Club {club_id} marked as deleted by owner {user_id}")
@@ -747,6 +781,8 @@ async def delete_club(
 @router.get("/{club_id}/activity", response_model=ActivityFeedResponse)
 async def get_club_activity(
     club_id: int,
+    request: Request,
+    response: Response,
     event_type: str = Query(None, description="Фільтр по типу події: ADD_BOOK, BORROW_BOOK, RETURN_BOOK, REVIEW_BOOK, MEMBER_JOINED, MEMBER_LEFT"),
     limit: int = Query(50, ge=1, le=100, description="Кількість подій на сторінку"),
     offset: int = Query(0, ge=0, description="Зсув для пагінації"),
@@ -765,6 +801,10 @@ async def get_club_activity(
     if not member:
         raise HTTPException(status_code=403, detail="Ви не є членом цього клубу")
     
+    cached = not_modified(request, response, club_etag(request, club_id, get_club_version(db, club_id), user_id))
+    if cached:
+        return cached
+    
     # SQL-запит з UNION ALL для агрегації всіх типів подій
     from sqlalchemy import text
     
@@ -804,7 +844,7 @@ async def get_club_activity(
         FROM book_loans bl
         JOIN books b ON bl.book_id = b.id
         LEFT JOIN club_members cm ON (bl.user_id = cm.user_id AND cm.club_id = :club_id)
-        WHERE b.club_id = :club_id AND b.status != 'DELETED'
+        WHERE b.club_id = :club_id AND b.status != 'DELETED' AND bl.status != 'WAITING'
     """
     
     return_query = """
@@ -901,42 +941,43 @@ async def get_club_activity(
     has_more = len(result) > limit
     events_data = result[:limit] if has_more else result
     
-    # Конвертуємо результат в Pydantic моделі
+    # Рядки UNION у формі ActivityEvent (валідує response_model або fast_json_response)
     events = []
     for row in events_data:
-        actor = ActivityActor(
-            user_id=row.actor_id,
-            display_name=row.actor_name or row.actor_username or "Невідомо",
-            username=row.actor_username
-        )
-        
         # Book is optional for member events
         book = None
         if row.book_id is not None:
-            book = ActivityBook(
-                book_id=row.book_id,
-                title=row.book_title,
-                author=row.book_author,
-                cover_url=row.book_cover_url
-            )
+            book = {
+                "book_id": row.book_id,
+                "title": row.book_title,
+                "author": row.book_author,
+                "cover_url": row.book_cover_url
+            }
         
-        event = ActivityEvent(
-            event_id=row.event_id,
-            event_type=row.event_type,
-            event_time=row.event_time,
-            actor=actor,
-            book=book,
-            rating=row.rating,
-            review_text=row.review_text
-        )
-        events.append(event)
+        events.append({
+            "event_id": row.event_id,
+            "event_type": row.event_type,
+            "event_time": row.event_time,
+            "actor": {
+                "user_id": row.actor_id,
+                "internal_user_id": None,
+                "display_name": row.actor_name or row.actor_username or "Невідомо",
+                "username": row.actor_username
+            },
+            "book": book,
+            "rating": row.rating,
+            "review_text": row.review_text
+        })
     
     # Підрахунок загальної кількості (без фільтра limit/offset)
     count_query = f"SELECT COUNT(*) as total FROM ({combined_query}) as all_events"
     total_count = db.execute(text(count_query), {"club_id": club_id}).scalar()
     
-    return ActivityFeedResponse(
-        events=events,
-        total_count=total_count,
-        has_more=has_more
-    )
+    feed = {
+        "events": events,
+        "total_count": total_count,
+        "has_more": has_more
+    }
+    if FAST_JSON_RESPONSES:
+        return fast_json_response(feed, response, ActivityFeedResponse)
+    return feed
@@ -0,0 +1,125 @@
+"""
+Entity Cache - кеш метаданих клубів і книг для аналітики
+TTL + LRU у пам'яті процесу; записи скидаються ендпоїнтами, що їх змінюють
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+from sqlalchemy.orm import Session
+
+from app.models.db_models import Club, ClubMember, Book
+
+
+CACHE_TTL_SECONDS = float(os.getenv("ENTITY_CACHE_TTL", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("ENTITY_CACHE_SIZE", "4096"))
+
+
+class TTLCache:
+    """Потокобезпечний LRU-кеш з обмеженням часу життя запису"""
+
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value: Dict[str, Any]):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+_clubs = TTLCache()
+_books = TTLCache()
+
+
+def get_club_meta(db: Session, club_id: int, with_counts: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Назва, обкладинка та (опційно) кількість учасників/книг клубу.
+
+    Returns:
+        dict {name, cover_url, members_count, books_count} або None, якщо клубу немає
+    """
+    meta = _clubs.get(club_id)
+    if meta is not None and (not with_counts or meta["members_count"] is not None):
+        return meta
+
+    club = db.query(Club.name, Club.cover_url).filter(Club.id == club_id).first()
+    if not club:
+        return None
+
+    meta = {
+        "name": club.name,
+        "cover_url": club.cover_url,
+        "members_count": None,
+        "books_count": None
+    }
+    if with_counts:
+        meta["members_count"] = db.query(ClubMember).filter(ClubMember.club_id == club_id).count()
+        meta["books_count"] = db.query(Book).filter(Book.club_id == club_id).count()
+
+    _clubs.set(club_id, meta)
+    return meta
+
+
+def get_book_meta(db: Session, book_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Назва, обкладинка та club_id книги.
+
+    Returns:
+        dict {title, cover_url, club_id} або None, якщо книги немає
+    """
+    meta = _books.get(book_id)
+    if meta is not None:
+        return meta
+
+    book = db.query(Book.title, Book.cover_url, Book.club_id).filter(Book.id == book_id).first()
+    if not book:
+        return None
+
+    meta = {
+        "title": book.title,
+        "cover_url": book.cover_url,
+        "club_id": book.club_id
+    }
+    _books.set(book_id, meta)
+    return meta
+
+
+def invalidate_club(club_id: int):
+    _clubs.invalidate(club_id)
+
+
+def invalidate_book(book_id: int):
+    _books.invalidate(book_id)
+
+
+def get_cache_stats() -> Dict[str, Dict[str, int]]:
+    return {"clubs": _clubs.stats(), "books": _books.stats()}
@@ -0,0 +1,129 @@
+"""
+Slow Query Log - повільні SQL-запити з параметрами, маршрутом і планом EXPLAIN
+
+Запити, довші за SLOW_QUERY_MS, пишуться в окремий ротований файл
+logs/slow_queries.log та зберігаються в кільцевому буфері для
+/api/internal/slow-queries. EXPLAIN виконується у фоновому потоці один раз
+на кожну форму запиту (текст з плейсхолдерами параметрів).
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from app.database import SLOW_QUERY_MS
+
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "True") == "True"
+RECENT_LIMIT = int(os.getenv("SLOW_QUERY_RECENT", "100"))
+MAX_PLANS = 500
+MAX_PARAM_LENGTH = 200
+
+# EXPLAIN лише для читання: план INSERT/UPDATE не вартий ризику
+EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+_lock = threading.Lock()
+_recent: deque = deque(maxlen=RECENT_LIMIT)
+_plans: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # {shape_id: {statement, plan, full_scan, count}}
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+
+
+def statement_shape(statement: str) -> str:
+    return re.sub(r"\s+", " ", statement).strip()
+
+
+def shape_id(shape: str) -> str:
+    return hashlib.sha1(shape.encode("utf-8")).hexdigest()[:12]
+
+
+def _truncate_params(parameters: Any) -> Any:
+    """Параметри для логу: довгі значення (init data, описи) обрізаються"""
+    def short(value):
+        text = repr(value)
+        return text if len(text) <= MAX_PARAM_LENGTH else text[:MAX_PARAM_LENGTH] + "..."
+
+    if isinstance(parameters, dict):
+        return {key: short(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [short(value) for value in parameters]
+    return short(parameters)
+
+
+def record_slow_query(statement: str, parameters: Any, elapsed: float,
+                      route: Optional[str], executemany: bool = False):
+    """Викликається з хука after_cursor_execute (app.database)"""
+    shape = statement_shape(statement)
+    sid = shape_id(shape)
+    entry = {
+        "timestamp": datetime.now().isoformat(),
+        "duration_ms": round(elapsed * 1000, 2),
+        "route": route,
+        "shape_id": sid,
+        "statement": shape,
+        "parameters": None if executemany else _truncate_params(parameters),
+    }
+
+    run_explain = False
+    with _lock:
+        _recent.appendleft(entry)
+        plan = _plans.get(sid)
+        if plan is None:
+            plan = _plans[sid] = {"statement": shape, "plan": None, "full_scan": None, "count": 0}
+            while len(_plans) > MAX_PLANS:
+                _plans.popitem(last=False)
+            run_explain = SLOW_QUERY_EXPLAIN and not executemany and bool(EXPLAINABLE.match(shape))
+        plan["count"] += 1
+        plan["last_duration_ms"] = entry["duration_ms"]
+        plan["last_route"] = route
+
+    logger.bind(slow_query=True).warning(
+        f"🐌 Slow query {entry['duration_ms']}ms [{sid}] route={route}: {shape[:500]} | params={entry['parameters']}"
+    )
+
+    if run_explain:
+        _executor.submit(_explain, sid, statement, parameters)
+
+
+def _explain(sid: str, statement: str, parameters: Any):
+    """EXPLAIN з тими ж параметрами; сам не потрапляє в slow query log"""
+    from app.database import engine
+
+    try:
+        with engine.connect() as conn:
+            conn = conn.execution_options(skip_slow_query_log=True)
+            result = conn.exec_driver_sql("EXPLAIN " + statement, parameters)
+            rows = [dict(row._mapping) for row in result]
+    except Exception as e:
+        logger.bind(slow_query=True).warning(f"EXPLAIN failed for [{sid}]: {e}")
+        with _lock:
+            if sid in _plans:
+                _plans[sid]["plan"] = {"error": str(e)}
+        return
+
+    # MySQL: type=ALL - повне сканування таблиці
+    full_scan = [row.get("table") for row in rows if str(row.get("type", "")).upper() == "ALL"]
+    with _lock:
+        if sid in _plans:
+            _plans[sid]["plan"] = rows
+            _plans[sid]["full_scan"] = full_scan
+    logger.bind(slow_query=True).warning(
+        f"EXPLAIN [{sid}]: {rows}" + (f" ⚠️ full scan: {', '.join(map(str, full_scan))}" if full_scan else "")
+    )
+
+
+def get_slow_queries() -> Dict[str, List[Dict[str, Any]]]:
+    """Останні повільні запити та плани цього воркера"""
+    with _lock:
+        plans = [{"shape_id": sid, **plan} for sid, plan in _plans.items()]
+        plans.sort(key=lambda plan: plan["count"], reverse=True)
+        return {
+            "threshold_ms": SLOW_QUERY_MS,
+            "recent": list(_recent),
+            "plans": plans,
+        }
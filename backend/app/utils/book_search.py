@@ -0,0 +1,68 @@
+"""
+Повнотекстовий пошук книг клубу
+
+Кожна книга має документ пошуку books.search_text: назва, автор, власник і
+останній читач, нормалізовані normalize_search_text. Документ оновлюється в
+create_book / update_book / borrow_book, а на MySQL обслуговується індексом
+FULLTEXT (міграція 013): префіксний пошук у BOOLEAN MODE з релевантністю.
+"""
+
+import os
+import re
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_
+
+# Мінімальна довжина токена FULLTEXT (innodb_ft_min_token_size, за замовчуванням 3);
+# коротші слова шукаються через LIKE по тому ж документу
+FULLTEXT_MIN_TOKEN = int(os.getenv("FULLTEXT_MIN_TOKEN", "3"))
+MAX_SEARCH_TOKENS = 8
+
+# Апостроф в українських словах (м'ята, п’ять, зʼїсти) пишуть різними символами
+_APOSTROPHES = re.compile(r"['’ʼ`´]")
+_TOKEN = re.compile(r"\w+")
+
+
+def normalize_search_text(text: Optional[str]) -> str:
+    """Регістр і апострофи не впливають на пошук: 'П’ЯТЬ' і "п'ять" -> 'пять'"""
+    if not text:
+        return ""
+    return _APOSTROPHES.sub("", text).casefold()
+
+
+def build_search_document(book, reader_username: Optional[str] = None,
+                          reader_name: Optional[str] = None) -> str:
+    """Документ пошуку книги - ті ж поля, що шукав старий LIKE по шести колонках"""
+    parts = [book.title, book.author, book.owner_name, book.owner_username, reader_username, reader_name]
+    return " ".join(normalize_search_text(part) for part in parts if part)
+
+
+def search_tokens(search: str) -> List[str]:
+    return _TOKEN.findall(normalize_search_text(search))[:MAX_SEARCH_TOKENS]
+
+
+def search_clause(column, search: str, dialect_name: str) -> Tuple[Optional[Any], Optional[Any]]:
+    """
+    (умова WHERE, вираз релевантності) для пошукового рядка.
+
+    Кожне слово має зустрітися в документі як префікс слова ("гар пот" знаходить
+    "Гаррі Поттер"). Релевантність є лише на MySQL для слів, що потрапляють в індекс;
+    (None, None) - у запиті немає слів.
+    """
+    tokens = search_tokens(search)
+    if not tokens:
+        return None, None
+
+    if dialect_name != "mysql":
+        return and_(*[column.like(f"%{token}%") for token in tokens]), None
+
+    from sqlalchemy.dialects.mysql import match
+
+    long_tokens = [token for token in tokens if len(token) >= FULLTEXT_MIN_TOKEN]
+    short_tokens = [token for token in tokens if len(token) < FULLTEXT_MIN_TOKEN]
+    clauses = [column.like(f"%{token}%") for token in short_tokens]
+    relevance = None
+    if long_tokens:
+        relevance = match(column, against=" ".join(f"+{token}*" for token in long_tokens)).in_boolean_mode()
+        clauses.insert(0, relevance)
+    return and_(*clauses), relevance
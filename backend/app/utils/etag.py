@@ -0,0 +1,96 @@
+"""
+Умовні GET-запити для даних клубу (ETag / If-None-Match)
+
+clubs.data_version збільшується кожним ендпоїнтом, що змінює книги, учасників,
+відгуки чи сам клуб (bump_club_version - у транзакції запиту). ETag відповіді -
+версія клубу плюс хеш користувача, шляху і query string, тож повторне відкриття
+екрану без змін отримує 304 до виконання важких запитів.
+"""
+
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.db_models import Book, BookLoan, Club
+
+# no-cache: клієнт може зберігати відповідь, але перевіряє її через If-None-Match
+CACHE_CONTROL = "private, no-cache"
+
+
+def bump_club_version(db: Session, club_id: int) -> int:
+    """
+    Атомарно збільшує clubs.data_version: UPDATE ... SET data_version = data_version + 1.
+    
+    Повертає нову версію (для books.row_version). Рядок клубу заблокований до commit,
+    тож версії одного клубу комітяться по порядку.
+    """
+    db.query(Club).filter(Club.id == club_id).update(
+        {Club.data_version: Club.data_version + 1},
+        synchronize_session=False
+    )
+    return get_club_version(db, club_id)
+
+
+def bump_member_books_version(db: Session, club_id: int, user_id: str) -> int:
+    """
+    bump_club_version для зміни складу учасників (вступ, видалення).
+
+    holder_name у списку книг береться з club_members за останнім позичанням, тож книги,
+    останній читач яких - user_id, теж отримують нову row_version і потрапляють у /changes.
+    """
+    version = bump_club_version(db, club_id)
+    db.query(Book).filter(
+        Book.club_id == club_id,
+        Book.last_loan_id.in_(select(BookLoan.id).where(BookLoan.user_id == user_id))
+    ).update({Book.row_version: version}, synchronize_session=False)
+    return version
+
+
+def get_club_version(db: Session, club_id: int) -> Optional[int]:
+    row = db.query(Club.data_version).filter(Club.id == club_id).first()
+    return row.data_version if row else None
+
+
+def club_etag(request: Request, club_id: int, version: int, user_id: str) -> str:
+    """
+    Слабкий ETag; відповідь залежить від користувача (user_role), тож він входить у ключ.
+
+    Версію треба прочитати ДО даних відповіді: інакше нові дані можуть отримати стару версію.
+    """
+    variant = f"{user_id}|{request.url.path}|{request.url.query}"
+    digest = hashlib.sha1(variant.encode("utf-8")).hexdigest()[:12]
+    return f'W/"c{club_id}-{version or 0}-{digest}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # Слабке порівняння (RFC 9110): префікс W/ не враховується
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Додає ETag до відповіді; повертає 304, якщо If-None-Match збігається.
+
+    Використання в ендпоїнті:
+        cached = not_modified(request, response, club_etag(...))
+        if cached:
+            return cached
+    """
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
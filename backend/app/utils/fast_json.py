@@ -0,0 +1,72 @@
+"""
+Швидка серіалізація гарячих списків (книги, клуби, учасники, стрічка активності)
+
+Звичайний шлях FastAPI: ендпоїнт повертає dict-и, response_model валідує їх ще раз,
+jsonable_encoder обходить результат, а stdlib json кодує. З FAST_JSON_RESPONSES=True
+ендпоїнт повертає готовий FastJSONResponse: рядки вже зібрані у форму схеми, тож
+повторна валідація пропускається, а кодує orjson (якщо встановлений).
+Поза production рядки все одно валідуються схемою один раз - щоб розбіжність
+зі схемою було видно до релізу.
+"""
+
+import datetime
+import enum
+import json
+import os
+from decimal import Decimal
+from typing import Any, Optional
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson опційний
+    orjson = None
+
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "False") == "True"
+FAST_JSON_VALIDATE = os.getenv("ENV", "development") != "production"
+
+_adapters: dict = {}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse на orjson; без orjson - компактний stdlib json"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_default)
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_json_response(content: Any, response: Optional[Response] = None, model: Any = None) -> FastJSONResponse:
+    """
+    Відповідь в обхід response_model ендпоїнта.
+
+    response - Response з параметрів ендпоїнта: його заголовки (X-Next-Cursor, ETag)
+    переносяться, бо FastAPI не об'єднує їх з повернутим Response.
+    model - схема відповіді для валідації поза production (List[BookResponse] тощо).
+    """
+    if model is not None and FAST_JSON_VALIDATE:
+        adapter = _adapters.get(model)
+        if adapter is None:
+            adapter = _adapters[model] = TypeAdapter(model)
+        adapter.validate_python(content)
+
+    result = FastJSONResponse(content)
+    if response is not None:
+        for key, value in response.headers.items():
+            if key not in ("content-length", "content-type"):
+                result.headers.append(key, value)
+    return result
@@ -0,0 +1,114 @@
+"""
+Keyset pagination - курсорна пагінація за ключем сортування
+Наступна сторінка - WHERE (ключ) > (ключ останнього рядка), тож вартість не залежить від номера сторінки
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, false
+
+# Заголовок відповіді з курсором наступної сторінки
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(kind: str, values: Sequence[Any]) -> str:
+    """Непрозорий курсор: base64url(JSON) з типом сортування і значеннями ключа"""
+    payload = {
+        "s": kind,
+        "k": [value.isoformat() if isinstance(value, datetime) else value for value in values],
+    }
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _load_cursor(cursor: str) -> Tuple[dict, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        return payload, payload["k"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def decode_cursor(cursor: str, kind: str, columns: Sequence[Tuple[Any, bool]]) -> List[Any]:
+    """
+    Розбирає курсор, виданий encode_cursor для того ж сортування.
+
+    Кидає ValueError, якщо курсор пошкоджений або виданий для іншого sort_by.
+    """
+    payload, values = _load_cursor(cursor)
+    if payload.get("s") != kind or not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("Cursor does not match the requested sort order")
+
+    parsed = []
+    for value, (column, _) in zip(values, columns):
+        if value is not None and _is_datetime(column):
+            value = datetime.fromisoformat(value)
+        parsed.append(value)
+    return parsed
+
+
+def decode_offset_cursor(cursor: str, kind: str) -> int:
+    """
+    Курсор зі зміщенням - для порядку, що не має стабільного ключа в рядку
+    (релевантність повнотекстового пошуку). Кидає ValueError, як decode_cursor.
+    """
+    payload, values = _load_cursor(cursor)
+    if payload.get("s") != kind or not isinstance(values, list) or len(values) != 1 \
+            or not isinstance(values[0], int) or values[0] < 0:
+        raise ValueError("Cursor does not match the requested sort order")
+    return values[0]
+
+
+def _is_datetime(column) -> bool:
+    try:
+        return column.type.python_type is datetime
+    except (AttributeError, NotImplementedError):
+        return False
+
+
+def keyset_filter(columns: Sequence[Tuple[Any, bool]], values: Sequence[Any]):
+    """
+    Умова "рядок після курсора" для ORDER BY columns.
+
+    columns - [(колонка, descending)], останньою має йти унікальна колонка (id).
+    NULL вважається найменшим значенням (як у MySQL/SQLite): при ASC - на
+    початку, при DESC - в кінці.
+    """
+    clauses = []
+    equal_prefix = []
+    for (column, descending), value in zip(columns, values):
+        if value is None:
+            after = false() if descending else column.isnot(None)
+            equal = column.is_(None)
+        else:
+            after = or_(column < value, column.is_(None)) if descending else column > value
+            equal = column == value
+        clauses.append(and_(*equal_prefix, after))
+        equal_prefix.append(equal)
+    return or_(*clauses)
+
+
+def order_by_columns(columns: Sequence[Tuple[Any, bool]]) -> List[Any]:
+    return [column.desc() if descending else column.asc() for column, descending in columns]
+
+
+def row_key(row: Any, columns: Sequence[Tuple[Any, bool]]) -> List[Any]:
+    """Значення ключа сортування з ORM-об'єкта (за іменами атрибутів колонок)"""
+    return [getattr(row, column.key) for column, _ in columns]
+
+
+def next_cursor(rows: list, limit: Optional[int], kind: str, columns: Sequence[Tuple[Any, bool]],
+                entity: Callable[[Any], Any] = lambda row: row) -> Optional[str]:
+    """
+    Курсор наступної сторінки, якщо запит повернув limit + 1 рядок (зайвий рядок відкидається).
+
+    entity дістає ORM-об'єкт з рядка, якщо запит повертає кортежі.
+    """
+    if limit is None or len(rows) <= limit:
+        return None
+    del rows[limit:]
+    return encode_cursor(kind, row_key(entity(rows[-1]), columns))
@@ -0,0 +1,25 @@
+"""
+Гістограма оцінок книги
+
+Оцінки ставляться з кроком 0.5 (0.5 .. 5.0); кількість відгуків з кожною оцінкою
+зберігається в лічильниках books.rating_05 .. rating_50 (міграція 018) і змінюється
+тим самим bump_book_stats, що й rating_sum/rating_count.
+"""
+
+from typing import Dict, List
+
+RATING_BUCKETS = [step / 2 for step in range(1, 11)]
+
+
+def rating_bucket_field(rating: float) -> str:
+    """Лічильник для оцінки: 0.5 -> 'rating_05', 4.5 -> 'rating_45', 5.0 -> 'rating_50'"""
+    step = min(10, max(1, round(rating * 2)))
+    return f"rating_{step * 5:02d}"
+
+
+def rating_histogram(book) -> List[Dict]:
+    """[{'rating': 0.5, 'count': ...}, ..., {'rating': 5.0, 'count': ...}] з лічильників книги"""
+    return [
+        {"rating": rating, "count": getattr(book, rating_bucket_field(rating)) or 0}
+        for rating in RATING_BUCKETS
+    ]
@@ -0,0 +1,86 @@
+"""
+Top-K - потоковий рейтинг найпопулярніших елементів (алгоритм Space-Saving)
+Фіксована пам'ять на рейтинг; лічильники елементів поза топом не зберігаються
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+# Скільки кандидатів відстежується; топ-K точний, поки різних елементів не більше
+TOP_K_CAPACITY = 100
+
+
+class SpaceSaving:
+    """
+    Space-Saving (Metwally et al.): зберігає не більше capacity лічильників.
+
+    Новий елемент при заповненій структурі витісняє елемент з найменшим
+    лічильником і успадковує його значення як похибку, тому оцінка ніколи
+    не занижена, а похибка кожного елемента відома (error).
+    """
+
+    def __init__(self, capacity: int = TOP_K_CAPACITY, counters: Optional[Dict[str, List[int]]] = None):
+        self.capacity = capacity
+        self.counters: Dict[str, List[int]] = counters if counters is not None else {}  # {key: [count, error]}
+
+    def add(self, key: str, weight: int = 1):
+        key = str(key)
+        entry = self.counters.get(key)
+        if entry is not None:
+            entry[0] += weight
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[key] = [weight, 0]
+            return
+        victim = min(self.counters, key=lambda k: self.counters[k][0])
+        floor = self.counters.pop(victim)[0]
+        self.counters[key] = [floor + weight, floor]
+
+    def floor(self) -> int:
+        """Скільки міг набрати невідстежуваний елемент: 0, поки структура не заповнена, далі - мінімум"""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(count for count, _ in self.counters.values())
+
+    def merge(self, other: "SpaceSaving"):
+        """
+        Об'єднання підсумків (mergeable Space-Saving, Agarwal et al.).
+
+        Елемент, якого немає в одному з підсумків, міг мати там до floor() подій -
+        цей мінімум додається і до count, і до error, тож оцінка лишається не заниженою.
+        Після цього залишаються capacity найбільших.
+        """
+        own_floor, other_floor = self.floor(), other.floor()
+        merged = {}
+        for key, (count, error) in self.counters.items():
+            other_count, other_error = other.counters.get(key, (other_floor, other_floor))
+            merged[key] = [count + other_count, error + other_error]
+        for key, (count, error) in other.counters.items():
+            if key not in merged:
+                merged[key] = [count + own_floor, error + own_floor]
+        if len(merged) > self.capacity:
+            ranked = sorted(merged.items(), key=lambda item: item[1][0], reverse=True)
+            merged = dict(ranked[:self.capacity])
+        self.counters = merged
+
+    def discard(self, key: str):
+        self.counters.pop(str(key), None)
+
+    def top(self, limit: int) -> List[Tuple[str, int, int]]:
+        """[(key, count, error)] за спаданням count"""
+        ranked = sorted(self.counters.items(), key=lambda item: item[1][0], reverse=True)
+        return [(key, count, error) for key, (count, error) in ranked[:limit]]
+
+    def copy(self) -> "SpaceSaving":
+        return SpaceSaving(self.capacity, {key: list(entry) for key, entry in self.counters.items()})
+
+    def __deepcopy__(self, memo) -> "SpaceSaving":
+        return self.copy()
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"k": self.capacity, "c": self.counters}
+
+    @classmethod
+    def from_json(cls, data: Any) -> "SpaceSaving":
+        if isinstance(data, cls):
+            return data
+        return cls(data.get("k", TOP_K_CAPACITY), {key: list(entry) for key, entry in data.get("c", {}).items()})
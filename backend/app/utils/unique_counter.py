@@ -0,0 +1,156 @@
+"""
+Unique Counter - підрахунок унікальних значень з обмеженою пам'яттю
+Точна множина для малих обсягів, HyperLogLog-скетч після порогу
+"""
+
+import base64
+import hashlib
+import math
+from typing import Any, Dict, Iterable, Optional
+
+# Поріг переходу з точної множини на скетч
+EXACT_LIMIT = 1000
+# 2^12 регістрів = 4 KB на скетч, стандартна похибка ~1.6%
+HLL_PRECISION = 12
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """HyperLogLog з корекцією малих значень (linear counting)"""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[bytearray] = None):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.m)
+
+    def add(self, value: str) -> bool:
+        """Додає значення; повертає True, якщо скетч змінився (ймовірно нове значення)"""
+        x = _hash64(value)
+        index = x >> (64 - self.p)
+        rest = (x << self.p) & ((1 << 64) - 1)
+        rank = min(64 - rest.bit_length(), 64 - self.p) + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other: "HyperLogLog"):
+        for i, rank in enumerate(other.registers):
+            if rank > self.registers[i]:
+                self.registers[i] = rank
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def copy(self) -> "HyperLogLog":
+        return HyperLogLog(self.p, bytearray(self.registers))
+
+
+class UniqueCounter:
+    """
+    Кількість унікальних значень.
+
+    До EXACT_LIMIT значень зберігається точна множина (перевірка O(1)),
+    після цього - HyperLogLog фіксованого розміру. Лічильники різних
+    воркерів/днів зливаються через merge() без втрати точності скетчу.
+    """
+
+    def __init__(self, values: Iterable[str] = (), exact_limit: int = EXACT_LIMIT):
+        self.exact_limit = exact_limit
+        self.exact: Optional[set] = set()
+        self.sketch: Optional[HyperLogLog] = None
+        for value in values:
+            self.add(value)
+
+    @property
+    def is_exact(self) -> bool:
+        return self.sketch is None
+
+    def _to_sketch(self):
+        self.sketch = HyperLogLog()
+        for value in self.exact:
+            self.sketch.add(value)
+        self.exact = None
+
+    def add(self, value: str) -> bool:
+        """Повертає True, якщо значення нове (для скетчу - наближено)"""
+        value = str(value)
+        if self.sketch is not None:
+            return self.sketch.add(value)
+        if value in self.exact:
+            return False
+        self.exact.add(value)
+        if len(self.exact) > self.exact_limit:
+            self._to_sketch()
+        return True
+
+    def __contains__(self, value: str) -> bool:
+        if self.sketch is not None:
+            raise TypeError("Membership is not available once the counter switched to a sketch")
+        return str(value) in self.exact
+
+    def merge(self, other: "UniqueCounter"):
+        if other.sketch is None and self.sketch is None:
+            self.exact |= other.exact
+            if len(self.exact) > self.exact_limit:
+                self._to_sketch()
+            return
+        if self.sketch is None:
+            self._to_sketch()
+        if other.sketch is None:
+            for value in other.exact:
+                self.sketch.add(value)
+        else:
+            self.sketch.merge(other.sketch)
+
+    def count(self) -> int:
+        if self.sketch is None:
+            return len(self.exact)
+        return self.sketch.count()
+
+    def copy(self) -> "UniqueCounter":
+        counter = UniqueCounter(exact_limit=self.exact_limit)
+        if self.sketch is None:
+            counter.exact = set(self.exact)
+        else:
+            counter.exact = None
+            counter.sketch = self.sketch.copy()
+        return counter
+
+    def __deepcopy__(self, memo) -> "UniqueCounter":
+        return self.copy()
+
+    def to_json(self) -> Dict[str, Any]:
+        if self.sketch is None:
+            return {"exact": sorted(self.exact)}
+        return {
+            "p": self.sketch.p,
+            "hll": base64.b64encode(bytes(self.sketch.registers)).decode("ascii")
+        }
+
+    @classmethod
+    def from_json(cls, data: Any) -> "UniqueCounter":
+        if isinstance(data, cls):
+            return data
+        # Старий формат: простий список id
+        if isinstance(data, list):
+            return cls(data)
+        counter = cls()
+        if "hll" in data:
+            counter.exact = None
+            counter.sketch = HyperLogLog(
+                data.get("p", HLL_PRECISION),
+                bytearray(base64.b64decode(data["hll"]))
+            )
+        else:
+            for value in data.get("exact", []):
+                counter.add(value)
+        return counter
@@ -0,0 +1,145 @@
+"""
+Бенчмарк списку книг клубу (GET /api/books/club/{club_id}) на синтетичному клубі.
+
+Порівнює поточний ендпоїнт з відтворенням попередньої реалізації get_books
+(три запити на кожну книгу: активне позичання, усі відгуки, DISTINCT читачі).
+Показує кількість SQL-запитів і медіану часу.
+
+Запуск з каталогу backend:
+    python -m benchmarks.bench_club_books [--books 5000] [--repeat 3]
+"""
+
+import argparse
+import datetime
+import random
+
+from sqlalchemy import desc, func
+
+from benchmarks.common import auth_headers, measure, setup_app
+
+
+def seed_club(client, db, books_count: int) -> int:
+    """Клуб з books_count книгами, ~1.5 позичання й ~1 відгуком на книгу; повертає club_id"""
+    from app.models.db_models import Book, BookLoan, BookReview, BookStatus, LoanStatus
+    from app.utils.rating_histogram import rating_bucket_field
+
+    club_id = client.post("/api/clubs", json={"name": "Bench"}, headers=auth_headers(1)).json()["id"]
+    rng = random.Random(0)
+    base = datetime.datetime(2025, 1, 1)
+    books = [
+        Book(title=f"Book {i}", author=f"Author {i % 300}", owner_id="1", owner_name="Bench",
+             owner_username="bench", club_id=club_id, status=BookStatus.AVAILABLE,
+             created_at=base + datetime.timedelta(minutes=i))
+        for i in range(books_count)
+    ]
+    db.add_all(books)
+    db.flush()
+
+    for book in books:
+        loans = [
+            BookLoan(book_id=book.id, user_id=str(reader + 2), username=f"reader{reader}",
+                     status=LoanStatus.RETURNED, borrowed_at=base + datetime.timedelta(days=reader))
+            for reader in range(rng.randint(0, 2))
+        ]
+        if rng.random() < 0.2:
+            loans.append(BookLoan(book_id=book.id, user_id="1", username="bench", status=LoanStatus.READING,
+                                  borrowed_at=base + datetime.timedelta(days=10)))
+            book.status = BookStatus.READING
+        db.add_all(loans)
+        db.flush()
+        if loans:
+            book.last_loan_id = loans[-1].id
+        reviews = [
+            BookReview(book_id=book.id, user_id=str(reviewer + 2), rating=rng.choice([3.0, 4.5, 5.0]))
+            for reviewer in range(rng.randint(0, 2))
+        ]
+        db.add_all(reviews)
+
+        # Денормалізовані лічильники, які підтримують мутації книг
+        book.readers_count = len({loan.user_id for loan in loans})
+        book.rating_sum = sum(review.rating for review in reviews)
+        book.rating_count = len(reviews)
+        for review in reviews:
+            field = rating_bucket_field(review.rating)
+            setattr(book, field, (getattr(book, field) or 0) + 1)
+    db.commit()
+    return club_id
+
+
+def legacy_get_books(db, club_id: int):
+    """Попередня реалізація get_books (без перевірок доступу): 1 + 3N запитів"""
+    from app.models.db_models import Book, BookLoan, BookReview, BookStatus, ClubMember
+    from app.models.schemas import BookResponse
+
+    ranked = db.query(
+        BookLoan.book_id,
+        BookLoan.user_id.label("last_reader_id"),
+        BookLoan.username.label("last_reader_username"),
+        func.row_number().over(partition_by=BookLoan.book_id, order_by=desc(BookLoan.borrowed_at)).label("row_num")
+    ).subquery()
+    last_loans = db.query(ranked).filter(ranked.c.row_num == 1).subquery()
+    rows = db.query(
+        Book, last_loans.c.last_reader_id, last_loans.c.last_reader_username,
+        ClubMember.user_name.label("last_reader_name")
+    ).outerjoin(last_loans, Book.id == last_loans.c.book_id).outerjoin(
+        ClubMember, (last_loans.c.last_reader_id == ClubMember.user_id) & (ClubMember.club_id == club_id)
+    ).filter(Book.club_id == club_id, Book.status != BookStatus.DELETED).order_by(desc(Book.created_at)).all()
+
+    result = []
+    for book, last_reader_id, last_reader_username, last_reader_name in rows:
+        book_dict = BookResponse.model_validate(book).model_dump()
+        active_loan = db.query(BookLoan).filter(BookLoan.book_id == book.id, BookLoan.status == "READING").first()
+        if active_loan:
+            book_dict["current_reader_id"] = active_loan.user_id
+        book_dict["holder_id"] = last_reader_id or book.owner_id
+        book_dict["holder_username"] = last_reader_username if last_reader_id else book.owner_username
+        book_dict["holder_name"] = last_reader_name if last_reader_id else book.owner_name
+        reviews = db.query(BookReview).filter(BookReview.book_id == book.id).all()
+        book_dict["average_rating"] = round(sum(r.rating for r in reviews) / len(reviews), 2) if reviews else None
+        book_dict["readers_count"] = db.query(BookLoan.user_id).filter(BookLoan.book_id == book.id).distinct().count()
+        result.append(book_dict)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    app, _ = setup_app()
+    from fastapi.testclient import TestClient
+    import app.database as database
+
+    with TestClient(app) as client:
+        db = database.SessionLocal()
+        club_id = seed_club(client, db, args.books)
+        headers = auth_headers(1)
+
+        print(f"Club with {args.books} books, median of {args.repeat}:")
+        current = None
+        for label, url in (
+            ("current, all books", f"/api/books/club/{club_id}"),
+            ("current, sort_by=rating", f"/api/books/club/{club_id}?sort_by=rating"),
+            ("current, first page (limit=50)", f"/api/books/club/{club_id}?limit=50"),
+        ):
+            elapsed, response = measure(lambda: client.get(url, headers=headers), args.repeat)
+            assert response.status_code == 200, response.text
+            current = current or response.json()
+            print(f"  {label:32s} {len(response.json()):5d} books  "
+                  f"{response.headers['x-db-queries']:>6s} queries  {elapsed:8.1f} ms")
+
+        stats = database.begin_query_tracking()
+        elapsed, books = measure(lambda: legacy_get_books(db, club_id), args.repeat)
+        print(f"  {'previous (per-book queries)':32s} {len(books):5d} books  "
+              f"{stats.count // (args.repeat + 1):6d} queries  {elapsed:8.1f} ms")
+
+        # Обидві реалізації мають віддавати однакові дані
+        fields = ("id", "average_rating", "readers_count", "holder_id", "current_reader_id")
+        assert sorted(tuple(book[f] for f in fields) for book in current) == \
+            sorted(tuple(book[f] for f in fields) for book in books)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Бенчмарк серіалізації списку книг клубу: звичайний шлях FastAPI проти FAST_JSON_RESPONSES.
+
+Лише серіалізація (рядки вже вибрані з БД):
+  previous   - BookResponse.model_validate().model_dump() на рядок, потім response_model і json
+  default    - dict-и book_list_item, одна валідація response_model, jsonable_encoder і json
+  fast, dev  - валідація TypeAdapter один раз і FastJSONResponse (orjson)
+  fast, prod - FastJSONResponse без валідації (ENV=production)
+Далі той самий ендпоїнт наскрізь через TestClient з вимкненим і ввімкненим FAST_JSON_RESPONSES.
+JSON усіх шляхів порівнюється.
+
+Запуск з каталогу backend:
+    python -m benchmarks.bench_fast_json [--books 2000] [--repeat 15]
+"""
+
+import argparse
+import asyncio
+import json
+from typing import List
+
+from benchmarks.bench_club_books import seed_club
+from benchmarks.common import auth_headers, measure, setup_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=15)
+    args = parser.parse_args()
+
+    app, _ = setup_app()
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.testclient import TestClient
+    from pydantic import TypeAdapter
+
+    import app.database as database
+    from app.models.db_models import Book, BookStatus
+    from app.models.schemas import BookResponse
+    from app.routers import books as books_router
+    from app.utils import fast_json
+    from app.utils.fast_json import FastJSONResponse
+
+    route = next(r for r in app.routes if getattr(r, "path", "") == "/api/books/club/{club_id}")
+    adapter = TypeAdapter(List[BookResponse])
+
+    def default_body(items) -> bytes:
+        content = asyncio.run(serialize_response(field=route.response_field, response_content=items, is_coroutine=True))
+        return JSONResponse(content).body
+
+    with TestClient(app) as client:
+        db = database.SessionLocal()
+        club_id = seed_club(client, db, args.books)
+        rows = books_router.club_books_query(db, club_id).filter(Book.status != BookStatus.DELETED).all()
+
+        def previous():
+            items = []
+            for row in rows:
+                item = BookResponse.model_validate(row[0]).model_dump()
+                item.update(books_router.book_list_item(*row))
+                items.append(item)
+            return default_body(items)
+
+        def default():
+            return default_body([books_router.book_list_item(*row) for row in rows])
+
+        def fast_dev():
+            items = [books_router.book_list_item(*row) for row in rows]
+            adapter.validate_python(items)
+            return FastJSONResponse(items).body
+
+        def fast_prod():
+            return FastJSONResponse([books_router.book_list_item(*row) for row in rows]).body
+
+        print(f"Serialization of {len(rows)} books (orjson: {fast_json.orjson is not None}), median of {args.repeat}:")
+        bodies = []
+        for label, func in (
+            ("previous (validate + dump + response_model)", previous),
+            ("default (response_model once)", default),
+            ("fast, development (validate once)", fast_dev),
+            ("fast, production (no validation)", fast_prod),
+        ):
+            elapsed, body = measure(func, args.repeat)
+            bodies.append(json.loads(body))
+            print(f"  {label:44s} {elapsed:8.1f} ms  {len(rows) / elapsed * 1000:9.0f} rows/s")
+        assert all(body == bodies[0] for body in bodies), "JSON differs between serialization paths"
+
+        url = f"/api/books/club/{club_id}"
+        headers = auth_headers(1)
+        print(f"GET {url}, median of {args.repeat}:")
+        responses = []
+        for label, fast, validate in (
+            ("FAST_JSON_RESPONSES=False", False, True),
+            ("FAST_JSON_RESPONSES=True, development", True, True),
+            ("FAST_JSON_RESPONSES=True, production", True, False),
+        ):
+            # Прапорці читаються під час імпорту модулів, тож перемикаються напряму
+            books_router.FAST_JSON_RESPONSES = fast
+            fast_json.FAST_JSON_VALIDATE = validate
+            elapsed, response = measure(lambda: client.get(url, headers=headers), args.repeat)
+            assert response.status_code == 200, response.text
+            responses.append(response.json())
+            print(f"  {label:44s} {elapsed:8.1f} ms  {response.headers['x-db-time']:>8s} in DB")
+        assert all(body == responses[0] for body in responses), "JSON differs between response modes"
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Бенчмарк класифікації запитів для аналітики в log_requests.
+
+Порівнює попередній ланцюжок re.search по request.url.path (з розбором
+X-Telegram-Init-Data на кожен запит) з classify_request за маршрутом, який
+FastAPI вже зіставив (scope["route"]), і extract_user_id лише для відстежуваних маршрутів.
+Scope кожного запиту проходить справжнє зіставлення маршрутів застосунку;
+результати обох шляхів порівнюються.
+
+Запуск з каталогу backend:
+    python -m benchmarks.bench_route_classifier [--number 200000]
+"""
+
+import argparse
+import timeit
+
+from benchmarks.common import auth_headers, setup_app
+
+# (метод, шлях, query string)
+SAMPLE_REQUESTS = [
+    ("GET", "/api/books/book/42", ""),
+    ("GET", "/api/clubs/7", ""),
+    ("POST", "/api/books/42/borrow", ""),
+    ("GET", "/api/books/club/7", "search=kobzar"),
+    ("GET", "/api/books/club/7", ""),
+    ("GET", "/api/clubs/my", ""),
+    ("GET", "/api/health", ""),
+]
+
+
+def legacy_classify(request):
+    """
+    Попередня класифікація з log_requests: (activity_type, user_id, club_id, book_id).
+
+    Імпорти всередині функції - як і в тодішньому middleware, вони теж частина вартості.
+    """
+    import re
+
+    user_id = None
+    init_data = request.headers.get("X-Telegram-Init-Data", "")
+    if init_data:
+        try:
+            from urllib.parse import parse_qs
+            parsed = parse_qs(init_data)
+            if "user" in parsed:
+                import json
+                user_data = json.loads(parsed["user"][0])
+                user_id = str(user_data.get("id"))
+        except Exception:
+            pass
+
+    activity_type = None
+    club_id = None
+    book_id = None
+
+    club_match = re.search(r'/clubs/(\d+)$', request.url.path)
+    if club_match and request.method == "GET":
+        activity_type = "club_view"
+        club_id = int(club_match.group(1))
+
+    activity_feed_match = re.search(r'/clubs/(\d+)/activity$', request.url.path)
+    if activity_feed_match and request.method == "GET":
+        activity_type = "activity_feed_view"
+        club_id = int(activity_feed_match.group(1))
+
+    book_match = re.search(r'/books/book/(\d+)$', request.url.path)
+    if book_match and request.method == "GET":
+        activity_type = "book_view"
+        book_id = int(book_match.group(1))
+
+    review_match = re.search(r'/books/(\d+)/review$', request.url.path)
+    if review_match and request.method == "POST":
+        activity_type = "review_created"
+        book_id = int(review_match.group(1))
+
+    borrow_match = re.search(r'/books/(\d+)/borrow$', request.url.path)
+    if borrow_match and request.method == "POST":
+        activity_type = "book_borrowed"
+        book_id = int(borrow_match.group(1))
+
+    return_match = re.search(r'/books/(\d+)/return$', request.url.path)
+    if return_match and request.method == "POST":
+        activity_type = "book_returned"
+        book_id = int(return_match.group(1))
+
+    if re.search(r'/clubs/\d+/requests/\d+$', request.url.path) and request.method == "POST":
+        pass
+
+    books_list_match = re.search(r'/books/club/(\d+)$', request.url.path)
+    if books_list_match and request.method == "GET":
+        if request.query_params.get("search", ""):
+            activity_type = "search_used"
+            club_id = int(books_list_match.group(1))
+
+    if activity_type is None:
+        return None
+    return activity_type, user_id, club_id, book_id
+
+
+def routed_request(app, method: str, path: str, query: str, headers: dict):
+    """Request зі scope після зіставлення маршруту - як його бачить log_requests після call_next"""
+    from starlette.requests import Request
+    from starlette.routing import Match
+
+    scope = {
+        "type": "http", "method": method, "path": path, "root_path": "", "scheme": "http",
+        "query_string": query.encode(), "server": ("testserver", 80),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    }
+    for route in app.router.routes:
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            scope.update(child_scope)
+            break
+    return Request(scope)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=200000)
+    args = parser.parse_args()
+
+    app, _ = setup_app()
+    from app.analytics import classify_request
+    from app.main import extract_user_id
+
+    def current(request):
+        activity = classify_request(request)
+        if activity is None:
+            return None
+        activity_type, params = activity
+        return activity_type, extract_user_id(request), params.get("club_id"), params.get("book_id")
+
+    # Без init data - лише класифікація; з ним - ще й розбір user id
+    print(f"Per-request overhead in us, {args.number} runs each:")
+    print(f"  {'':36s} {'regex chain':>24s}   {'route table':>24s}")
+    print(f"  {'':36s} {'no init data':>12s}{'init data':>12s}   {'no init data':>12s}{'init data':>12s}")
+    for method, path, query in SAMPLE_REQUESTS:
+        timings = {}
+        for name, func in (("legacy", legacy_classify), ("current", current)):
+            for headers in ({}, auth_headers(1)):
+                request = routed_request(app, method, path, query, headers)
+                if name == "current":
+                    assert legacy_classify(request) == current(request), (method, path, query)
+                elapsed = timeit.timeit(lambda: func(request), number=args.number)
+                timings[name, bool(headers)] = elapsed / args.number * 1e6
+        label = f"{method} {path}" + (f"?{query}" if query else "")
+        print(f"  {label:36s} {timings['legacy', False]:12.2f}{timings['legacy', True]:12.2f}"
+              f"   {timings['current', False]:12.2f}{timings['current', True]:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Спільне оточення бенчмарків: застосунок на окремій БД у тимчасовому робочому каталозі.
+
+BENCH_DATABASE_URL - БД бенчмарку (за замовчуванням тимчасовий SQLite-файл).
+Таблиці створюються з моделей і видаляються на початку запуску - не вказуйте робочу БД.
+Аналітика, метрики й логи пишуться відносно cwd, тому бенчмарк переходить у тимчасовий каталог.
+"""
+
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Tuple
+from urllib.parse import quote
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def setup_app():
+    """(app, engine): FastAPI-застосунок, прив'язаний до порожньої БД бенчмарку"""
+    workdir = tempfile.mkdtemp(prefix="bookclub-bench-")
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(workdir)
+
+    # Dev-автентифікація (hash=dev_mock_hash) працює лише поза production
+    os.environ["ENV"] = "development"
+    for name, value in {"DB_USER": "bench", "DB_PASSWORD": "bench", "DB_HOST": "localhost",
+                        "DB_PORT": "3306", "DB_NAME": "bench"}.items():
+        os.environ.setdefault(name, value)
+
+    from sqlalchemy import create_engine, event
+    import app.database as database
+
+    url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{workdir}/bench.db"
+    engine = create_engine(url)
+    if engine.dialect.name == "sqlite":
+        # Стрічка активності клубу використовує MySQL CONCAT у сирому SQL
+        @event.listens_for(engine, "connect")
+        def _sqlite_functions(dbapi_conn, record):
+            dbapi_conn.create_function(
+                "CONCAT", -1, lambda *parts: "".join("" if part is None else str(part) for part in parts)
+            )
+
+    database.engine = engine
+    database.instrument_engine(engine)
+    database.SessionLocal.configure(bind=engine)
+
+    from app.models import db_models  # noqa: F401 - реєструє таблиці в Base.metadata
+    database.Base.metadata.drop_all(engine)
+    database.Base.metadata.create_all(engine)
+
+    from app.main import app
+    from loguru import logger
+    # Лог кожного запиту спотворює вимірювання
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+    print(f"DB: {engine.dialect.name}, workdir: {workdir}")
+    return app, engine
+
+
+def auth_headers(user_id: int, name: str = "Bench") -> dict:
+    """Заголовок dev-автентифікації Telegram WebApp"""
+    user = json.dumps({"id": user_id, "first_name": name, "username": name.lower()})
+    return {"X-Telegram-Init-Data": f"user={quote(user)}&auth_date=0&hash=dev_mock_hash"}
+
+
+def measure(func: Callable, repeat: int) -> Tuple[float, object]:
+    """(медіана в мс, результат останнього виклику); перший виклик - прогрів"""
+    result = func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
@@ -0,0 +1,29 @@
+-- Migration 010: Book last loan pointer
+-- Problem: get_books знаходив останнього читача через row_number() OVER (PARTITION BY book_id)
+-- по всій таблиці book_loans, тож кожне завантаження списку клубу залежало від глобальної історії.
+--
+-- Solution: books.last_loan_id вказує на останнє позичання книги (оновлюється в borrow_book),
+-- holder і поточний читач визначаються пошуком за первинним ключем book_loans.
+
+ALTER TABLE books
+ADD COLUMN last_loan_id INT NULL;
+
+-- Backfill: останнє позичання за borrowed_at (при однаковому часі - з більшим id)
+UPDATE books b
+JOIN (
+    SELECT l.book_id, MAX(l.id) AS last_loan_id
+    FROM book_loans l
+    JOIN (
+        SELECT book_id, MAX(borrowed_at) AS borrowed_at
+        FROM book_loans
+        GROUP BY book_id
+    ) latest ON latest.book_id = l.book_id AND latest.borrowed_at = l.borrowed_at
+    GROUP BY l.book_id
+) last_loans ON last_loans.book_id = b.id
+SET b.last_loan_id = last_loans.last_loan_id;
+
+-- Перевірка: книги з історією позичань без вказівника
+SELECT COUNT(*) AS books_without_pointer
+FROM books b
+WHERE b.last_loan_id IS NULL
+  AND EXISTS (SELECT 1 FROM book_loans l WHERE l.book_id = b.id);
@@ -0,0 +1,36 @@
+-- Migration 011: Denormalized book rating/reader counters
+-- Problem: enrich_book_with_stats завантажував усі відгуки книги для середнього рейтингу
+-- і рахував DISTINCT читачів на кожну відповідь (список, деталі, позичання, повернення).
+--
+-- Solution: лічильники на books, що оновлюються атомарно в create_or_update_review,
+-- delete_review та borrow_book. rating_avg - збережена обчислювана колонка для сортування
+-- за індексом. Відновлення з вихідних таблиць: python -m app.repair_book_stats
+
+ALTER TABLE books
+ADD COLUMN rating_sum DECIMAL(10,1) NOT NULL DEFAULT 0,
+ADD COLUMN rating_count INT NOT NULL DEFAULT 0,
+ADD COLUMN readers_count INT NOT NULL DEFAULT 0,
+ADD COLUMN rating_avg DECIMAL(4,2) AS (rating_sum / NULLIF(rating_count, 0)) STORED;
+
+-- Backfill з book_reviews
+UPDATE books b
+JOIN (
+    SELECT book_id, SUM(rating) AS rating_sum, COUNT(*) AS rating_count
+    FROM book_reviews
+    GROUP BY book_id
+) r ON r.book_id = b.id
+SET b.rating_sum = r.rating_sum,
+    b.rating_count = r.rating_count;
+
+-- Backfill з book_loans (унікальні читачі)
+UPDATE books b
+JOIN (
+    SELECT book_id, COUNT(DISTINCT user_id) AS readers_count
+    FROM book_loans
+    GROUP BY book_id
+) l ON l.book_id = b.id
+SET b.readers_count = l.readers_count;
+
+-- Сортування списку клубу за рейтингом / кількістю читачів
+CREATE INDEX idx_books_club_rating ON books(club_id, rating_avg);
+CREATE INDEX idx_books_club_readers ON books(club_id, readers_count);
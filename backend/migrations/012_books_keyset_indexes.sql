@@ -0,0 +1,8 @@
+-- Migration 012: Indexes for keyset pagination of club books
+-- get_books сортує й пагінує в БД: WHERE club_id = ? AND (ключ) > (курсор) ORDER BY ключ LIMIT n.
+-- Кожен режим сортування має індекс, що починається з club_id.
+-- Рейтинг і читачі використовують idx_books_club_rating / idx_books_club_readers (міграція 011).
+
+CREATE INDEX idx_books_club_created ON books(club_id, created_at, id);
+CREATE INDEX idx_books_club_title ON books(club_id, title, id);
+CREATE INDEX idx_books_club_author ON books(club_id, author, title);
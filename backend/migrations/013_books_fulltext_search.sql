@@ -0,0 +1,24 @@
+-- Migration 013: Full-text book search
+-- Problem: пошук у get_books - LIKE '%x%' по шести колонках (title, author, owner_name,
+-- owner_username, username та ім'я останнього читача через JOIN), об'єднаних OR.
+-- Жоден індекс не допомагає, а JOIN останнього читача обчислюється до фільтрації.
+--
+-- Solution: документ пошуку books.search_text (app.utils.book_search.build_search_document),
+-- що оновлюється в create_book / update_book / borrow_book, та індекс FULLTEXT над ним.
+-- Запит: MATCH(search_text) AGAINST('+слово*' IN BOOLEAN MODE) - префіксний пошук з релевантністю.
+-- Слова, коротші за innodb_ft_min_token_size (3), шукаються через LIKE по тому ж документу
+-- (FULLTEXT_MIN_TOKEN у .env має збігатися з налаштуванням сервера).
+
+ALTER TABLE books ADD COLUMN search_text TEXT NULL;
+
+-- Backfill: нижній регістр і без апострофів, як normalize_search_text
+UPDATE books b
+LEFT JOIN book_loans l ON l.id = b.last_loan_id
+LEFT JOIN club_members m ON m.user_id = l.user_id AND m.club_id = b.club_id
+SET b.search_text = LOWER(
+    REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(
+        CONCAT_WS(' ', b.title, b.author, b.owner_name, b.owner_username, l.username, m.user_name),
+    '''', ''), '’', ''), 'ʼ', ''), '`', ''), '´', '')
+);
+
+CREATE FULLTEXT INDEX ft_books_search ON books(search_text);
@@ -0,0 +1,10 @@
+-- Migration 014: Club data version for conditional GET
+-- Problem: Mini App заново завантажує список книг, клуб, учасників і стрічку активності
+-- при кожному відкритті екрану, навіть якщо нічого не змінилося.
+--
+-- Solution: clubs.data_version збільшується (UPDATE ... SET data_version = data_version + 1)
+-- кожним ендпоїнтом, що змінює книги, учасників, відгуки чи клуб. GET /api/books/club/{id},
+-- /api/clubs/{id}, /members та /activity віддають ETag на її основі й відповідають 304
+-- на If-None-Match до виконання важких запитів (app.utils.etag).
+
+ALTER TABLE clubs ADD COLUMN data_version INT NOT NULL DEFAULT 0;
@@ -0,0 +1,12 @@
+-- Migration 015: Per-book change tracking for delta sync
+-- Problem: клієнт не може спитати "що змінилося з минулого разу" і щоразу
+-- завантажує весь список книг клубу.
+--
+-- Solution: books.row_version - версія клубу (clubs.data_version, міграція 014) на момент
+-- останньої зміни книги; записується кожним ендпоїнтом books.py, що змінює книгу.
+-- GET /api/books/club/{id}/changes?since=<version> повертає книги з row_version > since.
+-- Наявні книги отримують 0: клієнт починає з since=0 (повний список) і далі бере дельти.
+
+ALTER TABLE books ADD COLUMN row_version INT NOT NULL DEFAULT 0;
+
+CREATE INDEX idx_books_club_row_version ON books(club_id, row_version);
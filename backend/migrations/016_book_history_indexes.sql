@@ -0,0 +1,9 @@
+-- Migration 016: Indexes for paginated book history
+-- Problem: get_book_details віддавав усю історію позичань (з іменами учасників) і всі відгуки
+-- книги, тож популярні книги ставали важчими з кожним позиченням.
+--
+-- Solution: деталі книги містять лише перші сторінки історії, решта - keyset-пагінація
+-- GET /api/books/{id}/loans та /reviews (ORDER BY дата DESC, id DESC).
+
+CREATE INDEX idx_book_loans_book_borrowed ON book_loans(book_id, borrowed_at, id);
+CREATE INDEX idx_book_reviews_book_created ON book_reviews(book_id, created_at, id);
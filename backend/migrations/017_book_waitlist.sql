@@ -0,0 +1,15 @@
+-- Migration 017: Waitlist for borrowed books
+-- Problem: LoanStatus.WAITING існував, але нічого його не створював: на позичену книгу
+-- можна було лише отримати "Книга вже позичена" і перевіряти знову.
+--
+-- Solution: черга - записи book_loans зі статусом WAITING, FIFO за id.
+-- POST/DELETE /api/books/{id}/waitlist - стати в чергу / вийти; return_book одразу
+-- передає книгу першому в черзі (WAITING -> READING) і надсилає йому одне сповіщення.
+-- books.waitlist_count - денормалізована довжина черги для списку книг.
+
+ALTER TABLE books ADD COLUMN waitlist_count INT NOT NULL DEFAULT 0;
+
+-- Наступний у черзі та позиція: WHERE book_id = ? AND status = 'WAITING' [AND id <= ?] ORDER BY id
+CREATE INDEX idx_book_loans_book_status ON book_loans(book_id, status, id);
+-- Записи черги поточного користувача (позиції для сторінки списку одним запитом)
+CREATE INDEX idx_book_loans_user_status ON book_loans(user_id, status);
@@ -0,0 +1,42 @@
+-- Migration 018: Rating distribution and review sorting
+-- Problem: розподіл оцінок книги клієнт рахував сам, завантажуючи всі відгуки
+-- (GET /api/books/{id}/reviews без limit), тож великі обговорення йшли однією відповіддю.
+--
+-- Solution: гістограма оцінок - лічильники books.rating_05 .. rating_50 (кількість відгуків
+-- з оцінкою 0.5 .. 5.0), що оновлюються атомарно разом з rating_sum/rating_count у
+-- create_or_update_review та delete_review і віддаються в деталях книги.
+-- Відгуки - keyset-пагінація за датою або за оцінкою (sort_by=rating).
+-- Відновлення з book_reviews: python -m app.repair_book_stats
+
+ALTER TABLE books
+ADD COLUMN rating_05 INT NOT NULL DEFAULT 0,
+ADD COLUMN rating_10 INT NOT NULL DEFAULT 0,
+ADD COLUMN rating_15 INT NOT NULL DEFAULT 0,
+ADD COLUMN rating_20 INT NOT NULL DEFAULT 0,
+ADD COLUMN rating_25 INT NOT NULL DEFAULT 0,
+ADD COLUMN rating_30 INT NOT NULL DEFAULT 0,
+ADD COLUMN rating_35 INT NOT NULL DEFAULT 0,
+ADD COLUMN rating_40 INT NOT NULL DEFAULT 0,
+ADD COLUMN rating_45 INT NOT NULL DEFAULT 0,
+ADD COLUMN rating_50 INT NOT NULL DEFAULT 0;
+
+-- Backfill з book_reviews (оцінка округлюється до кроку 0.5, як у rating_bucket_field)
+UPDATE books b
+JOIN (
+    SELECT book_id,
+        SUM(bucket = 1) AS r05, SUM(bucket = 2) AS r10, SUM(bucket = 3) AS r15,
+        SUM(bucket = 4) AS r20, SUM(bucket = 5) AS r25, SUM(bucket = 6) AS r30,
+        SUM(bucket = 7) AS r35, SUM(bucket = 8) AS r40, SUM(bucket = 9) AS r45,
+        SUM(bucket = 10) AS r50
+    FROM (
+        SELECT book_id, LEAST(10, GREATEST(1, ROUND(rating * 2))) AS bucket
+        FROM book_reviews
+    ) br
+    GROUP BY book_id
+) h ON h.book_id = b.id
+SET b.rating_05 = h.r05, b.rating_10 = h.r10, b.rating_15 = h.r15, b.rating_20 = h.r20,
+    b.rating_25 = h.r25, b.rating_30 = h.r30, b.rating_35 = h.r35, b.rating_40 = h.r40,
+    b.rating_45 = h.r45, b.rating_50 = h.r50;
+
+-- Відгуки за оцінкою: WHERE book_id = ? ORDER BY rating DESC, created_at DESC, id DESC
+CREATE INDEX idx_book_reviews_book_rating ON book_reviews(book_id, rating, created_at, id);
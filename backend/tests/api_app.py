@@ -0,0 +1,36 @@
+"""
+app.main на тестовій БД.
+
+Імпортується тестами (фікстура api_app у conftest) і воркерами uvicorn
+(uvicorn api_app:app) - ті прив'язуються до БД з TEST_DATABASE_URL.
+"""
+
+import os
+
+# Dev-автентифікація (hash=dev_mock_hash) працює лише поза production
+os.environ["ENV"] = "development"
+for name, value in {"DB_USER": "test", "DB_PASSWORD": "test", "DB_HOST": "localhost",
+                    "DB_PORT": "3306", "DB_NAME": "test"}.items():
+    os.environ.setdefault(name, value)
+
+from sqlalchemy import create_engine  # noqa: E402
+
+import app.database as database  # noqa: E402
+
+
+def bind_database(url: str):
+    """Перемикає SessionLocal застосунку на БД url і повертає її engine"""
+    if url.startswith("sqlite"):
+        # Записи в SQLite серіалізуються: запити чекають на блокування файлу, а не падають
+        engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 60})
+    else:
+        engine = create_engine(url, pool_pre_ping=True)
+    database.engine = engine
+    database.instrument_engine(engine)
+    database.SessionLocal.configure(bind=engine)
+    return engine
+
+
+engine = bind_database(os.environ["TEST_DATABASE_URL"])
+
+from app.main import app  # noqa: E402,F401
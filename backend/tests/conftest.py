@@ -0,0 +1,47 @@
+"""
+Спільні налаштування тестів бекенду.
+
+Запуск з каталогу backend: python -m pytest tests
+Тести з API працюють на TEST_DATABASE_URL (за замовчуванням SQLite у tmp_path).
+Для MySQL вказуйте окрему тестову БД - таблиці видаляються і створюються заново.
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+from urllib.parse import quote
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture
+def api_app(tmp_path, monkeypatch):
+    """(app, engine): застосунок на порожній тестовій БД; cwd - tmp_path"""
+    # Аналітика і логи пишуться відносно cwd
+    monkeypatch.chdir(tmp_path)
+    url = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{tmp_path / 'test.db'}"
+    monkeypatch.setenv("TEST_DATABASE_URL", url)
+    import api_app as module
+    import app.database as database
+    from app import metrics
+    from app.models import db_models  # noqa: F401
+
+    # Реєстр метрик зберігається ще й при виході з процесу, коли cwd вже відновлено
+    monkeypatch.setattr(metrics._registry, "directory", tmp_path / metrics.METRICS_DIR)
+    engine = module.bind_database(url)
+    database.Base.metadata.drop_all(engine)
+    database.Base.metadata.create_all(engine)
+    yield module.app, engine
+    engine.dispose()
+
+
+@pytest.fixture
+def auth_headers():
+    """Функція user_id -> заголовок dev-автентифікації Telegram WebApp"""
+    def headers(user_id: int) -> dict:
+        user = json.dumps({"id": user_id, "first_name": f"User {user_id}", "username": f"user{user_id}"})
+        return {"X-Telegram-Init-Data": f"user={quote(user)}&auth_date=0&hash=dev_mock_hash"}
+    return headers
@@ -0,0 +1,87 @@
+from app import analytics
+from app.analytics import AnalyticsEngine, build_event
+
+
+def restart(engine: AnalyticsEngine, shards_dir):
+    """Імітує рестарт процесу: відпускає шард і читає його заново"""
+    engine._segment.close()
+    engine._shard_lock.close()
+    return AnalyticsEngine(shards_dir=shards_dir)
+
+
+def test_failed_snapshot_keeps_journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, "STATS_FILE", tmp_path / "analytics.json")
+    shards_dir = tmp_path / "shards"
+    engine = AnalyticsEngine(shards_dir=shards_dir)
+    engine.track_many([build_event("book_view", book_id=1, book_title="Кобзар", user_id=str(i)) for i in range(10)])
+
+    def no_space(*args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    with monkeypatch.context() as m:
+        m.setattr(analytics.os, "replace", no_space)
+        engine.flush()
+    engine.track_many([build_event("book_view", book_id=1, book_title="Кобзар", user_id="late")])
+
+    restarted = restart(engine, shards_dir)
+    assert restarted.get_stats()["books"]["1"]["views"] == 11
+
+
+def test_snapshot_replaces_journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, "STATS_FILE", tmp_path / "analytics.json")
+    shards_dir = tmp_path / "shards"
+    engine = AnalyticsEngine(shards_dir=shards_dir)
+    engine.track_many([build_event("book_view", book_id=1, book_title="Кобзар", user_id=str(i)) for i in range(10)])
+    engine.flush()
+
+    assert analytics.list_segments(engine.shard_dir) == [engine._segment_id]
+    restarted = restart(engine, shards_dir)
+    assert restarted.get_stats()["books"]["1"]["views"] == 10
+
+
+def test_top_clubs_carry_club_books(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, "STATS_FILE", tmp_path / "analytics.json")
+    shards_dir = tmp_path / "shards"
+    writer = AnalyticsEngine(shards_dir=shards_dir)
+    reader = AnalyticsEngine(shards_dir=shards_dir)
+    club = {"club_id": 5, "club_name": "Клуб"}
+    writer.track_many([build_event("club_view", user_id="1", **club) for _ in range(3)])
+    writer.track_many([
+        build_event("book_view", user_id="1", book_id=book_id, book_title=f"Book {book_id}", **club)
+        for book_id in range(1, 10)
+    ])
+    reader.track_many([build_event("club_view", user_id="2", club_id=6, club_name="Інший")])
+    writer.flush()
+
+    items = reader.get_top("club_views", None, 10)
+    assert [(item["id"], item["views"]) for item in items] == [(5, 3), (6, 1)]
+    assert [book["id"] for book in items[0]["books"]] == list(range(1, analytics.TOP_CLUB_BOOKS + 1))
+    assert items[0]["books"][0]["title"] == "Book 1"
+    assert items[1]["books"] == []
+
+
+def test_summary_matches_full_stats(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, "STATS_FILE", tmp_path / "analytics.json")
+    shards_dir = tmp_path / "shards"
+    engines = [AnalyticsEngine(shards_dir=shards_dir) for _ in range(3)]
+    for n, engine in enumerate(engines):
+        engine.track_many([build_event("app_opened", user_id=str(u)) for u in range(n * 5, n * 5 + 10)])
+        engine.track_many([
+            build_event("book_view", user_id=str(n), club_id=n % 2 + 1, club_name="Клуб",
+                        book_id=n * 10 + i, book_title="Книга")
+            for i in range(4)
+        ])
+        engine.track_many([build_event("review_created", user_id=str(n), book_id=1, book_title="Книга")])
+    engines[0].flush()
+
+    summary = engines[1].get_summary()
+    stats = engines[1].get_stats()
+    periods = list(stats["daily_activity"].values()) + list(stats["monthly_activity"].values())
+    assert "clubs" not in summary and "books" not in summary and "daily_activity" not in summary
+    assert summary["clubs_count"] == len(stats["clubs"]) == 2
+    assert summary["books_count"] == len(stats["books"])
+    assert summary["reviews_total"] == stats["reviews_total"] == 3
+    assert summary["unique_users_count"] == stats["unique_users_count"]
+    assert summary["new_users_total"] == sum(day["new_users"] for day in periods) == 20
+    assert summary["recent_activity"] == stats["recent_activity"]
+    assert summary["last_activity"] == stats["last_activity"]
@@ -0,0 +1,92 @@
+"""
+Стрес-тест шардів аналітики: кілька процесів (як воркери uvicorn) пишуть
+події одночасно, часто роблячи знімки, а merge-on-read має дати точні підсумки.
+
+Запуск окремо: python -m pytest tests/test_analytics_stress.py
+Розмір: ANALYTICS_STRESS_WORKERS (4), ANALYTICS_STRESS_EVENTS (3000 на процес)
+"""
+
+import multiprocessing
+import os
+
+WORKERS = int(os.getenv("ANALYTICS_STRESS_WORKERS", "4"))
+EVENTS_PER_WORKER = int(os.getenv("ANALYTICS_STRESS_EVENTS", "3000"))
+BATCH = 25
+BOOKS = 7
+# Менше за EXACT_LIMIT UniqueCounter - унікальні користувачі рахуються точно
+USERS = 300
+
+
+def worker_events(worker: int):
+    from app.analytics import build_event
+
+    for i in range(EVENTS_PER_WORKER):
+        user_id = str((worker * EVENTS_PER_WORKER + i) % USERS)
+        book_id = i % BOOKS + 1
+        activity = "review_created" if i % 10 == 0 else "book_view"
+        yield build_event(activity, user_id=user_id, book_id=book_id, book_title=f"Book {book_id}")
+
+
+def run_worker(shards_dir: str, worker: int, start):
+    from pathlib import Path
+    from app import analytics
+
+    # Знімки кожні кілька пакетів: читач постійно застає заміну знімка і сегментів
+    analytics.SNAPSHOT_EVERY_EVENTS = 200
+    analytics.STATS_FILE = Path(shards_dir).parent / "analytics.json"
+    engine = analytics.AnalyticsEngine(shards_dir=Path(shards_dir))
+    start.wait()
+    batch = []
+    for event in worker_events(worker):
+        batch.append(event)
+        if len(batch) == BATCH:
+            engine.track_many(batch)
+            batch = []
+    if batch:
+        engine.track_many(batch)
+    engine.flush()
+
+
+def test_parallel_workers_exact_totals(tmp_path, monkeypatch):
+    from app import analytics
+    from app.analytics import AnalyticsEngine
+
+    monkeypatch.setattr(analytics, "STATS_FILE", tmp_path / "analytics.json")
+    shards_dir = tmp_path / "shards"
+
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Event()
+    processes = [
+        ctx.Process(target=run_worker, args=(str(shards_dir), worker, start))
+        for worker in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+
+    # Процес читання (як get_stats в ще одному воркері) під час запису
+    reader = AnalyticsEngine(shards_dir=shards_dir)
+    start.set()
+    last_views = 0
+    while any(process.is_alive() for process in processes):
+        stats = reader.get_stats()
+        views = sum(book["views"] for book in stats["books"].values())
+        assert last_views <= views <= WORKERS * EVENTS_PER_WORKER
+        last_views = views
+
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    events = [event for worker in range(WORKERS) for event in worker_events(worker)]
+    expected_views = sum(1 for event in events if event["a"] == "book_view")
+    expected_reviews = len(events) - expected_views
+
+    stats = reader.get_stats()
+    assert sum(book["views"] for book in stats["books"].values()) == expected_views
+    assert sum(book["reviews"] for book in stats["books"].values()) == expected_reviews
+    assert stats["reviews_total"] == expected_reviews
+    assert sum(day["books_views"] for day in stats["daily_activity"].values()) == expected_views
+    assert stats["unique_users_count"] == len({event["u"] for event in events})
+    for book_id in range(1, BOOKS + 1):
+        expected = sum(1 for event in events if event["b"] == book_id and event["a"] == "book_view")
+        assert stats["books"][str(book_id)]["views"] == expected
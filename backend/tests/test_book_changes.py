@@ -0,0 +1,63 @@
+"""
+Дельта-синхронізація списку книг (/api/books/club/{id}/changes?since=): список, зібраний
+з дельт, має збігатися з повним перезавантаженням - зокрема після зміни складу учасників.
+"""
+
+OWNER_ID = 1
+READER_ID = 2
+
+
+def full_list(client, club_id, headers) -> dict:
+    response = client.get(f"/api/books/club/{club_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    return {book["id"]: book for book in response.json()}
+
+
+def sync(client, club_id, headers, books: dict, version: int) -> int:
+    """Застосовує дельту since=version до books; повертає нову версію"""
+    response = client.get(f"/api/books/club/{club_id}/changes", params={"since": version}, headers=headers)
+    assert response.status_code == 200, response.text
+    delta = response.json()
+    for book in delta["changed"]:
+        books[book["id"]] = book
+    for book_id in delta["deleted"]:
+        books.pop(book_id, None)
+    return delta["version"]
+
+
+def test_membership_changes_reach_delta_sync(api_app, auth_headers):
+    from fastapi.testclient import TestClient
+
+    app, _ = api_app
+    owner = auth_headers(OWNER_ID)
+    reader = auth_headers(READER_ID)
+    with TestClient(app) as client:
+        club = client.post("/api/clubs", json={"name": "Delta"}, headers=owner).json()
+        club_id = club["id"]
+        book_id = client.post(
+            "/api/books", json={"title": "Кобзар", "author": "Т. Шевченко", "club_id": club_id}, headers=owner
+        ).json()["id"]
+
+        join = client.post("/api/clubs/join", json={"invite_code": club["invite_code"]}, headers=reader).json()
+        assert client.post(f"/api/clubs/{club_id}/requests/{join['id']}",
+                           json={"action": "approve"}, headers=owner).status_code == 200
+        assert client.post(f"/api/books/{book_id}/borrow", headers=reader).status_code == 200
+
+        books = {}
+        version = sync(client, club_id, owner, books, 0)
+        assert books == full_list(client, club_id, owner)
+        assert books[book_id]["holder_name"] == "User 2"
+
+        # Учасника видалено: holder_name книги, яку він тримає, зникає
+        assert client.delete(f"/api/clubs/{club_id}/members/{READER_ID}", headers=owner).status_code == 204
+        version = sync(client, club_id, owner, books, version)
+        assert books == full_list(client, club_id, owner)
+        assert books[book_id]["holder_name"] is None
+
+        # Повторний вступ повертає ім'я
+        join = client.post("/api/clubs/join", json={"invite_code": club["invite_code"]}, headers=reader).json()
+        assert client.post(f"/api/clubs/{club_id}/requests/{join['id']}",
+                           json={"action": "approve"}, headers=owner).status_code == 200
+        sync(client, club_id, owner, books, version)
+        assert books == full_list(client, club_id, owner)
+        assert books[book_id]["holder_name"] == "User 2"
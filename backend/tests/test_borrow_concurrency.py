@@ -0,0 +1,134 @@
+"""
+Конкурентне позичання: сотні учасників одночасно позичають одну книгу через
+uvicorn з кількома воркерами - успішним має бути рівно один запит, решта отримує 409.
+
+Запуск окремо: python -m pytest tests/test_borrow_concurrency.py
+Розмір: BORROW_STRESS_CLIENTS (300), BORROW_STRESS_ROUNDS (2), BORROW_STRESS_WORKERS (4)
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("uvicorn")
+
+CLIENTS = int(os.getenv("BORROW_STRESS_CLIENTS", "300"))
+ROUNDS = int(os.getenv("BORROW_STRESS_ROUNDS", "2"))
+WORKERS = int(os.getenv("BORROW_STRESS_WORKERS", "4"))
+OWNER_ID = 1
+TESTS_DIR = Path(__file__).resolve().parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_in_parallel(func, args) -> Counter:
+    """Статус-коди func(arg), викликаних одночасно з окремих потоків"""
+    barrier = threading.Barrier(len(args))
+
+    def call(arg):
+        with httpx.Client(timeout=120) as client:
+            barrier.wait()
+            return func(client, arg).status_code
+
+    with ThreadPoolExecutor(len(args)) as pool:
+        return Counter(pool.map(call, args))
+
+
+@pytest.fixture
+def server(api_app, tmp_path):
+    """(base_url, застосунок тестового процесу): uvicorn з WORKERS воркерами на тій самій БД"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_app:app", "--port", str(port),
+         "--workers", str(WORKERS), "--log-level", "error"],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join([str(TESTS_DIR), str(TESTS_DIR.parent)])},
+        stdout=subprocess.DEVNULL,
+        stderr=open(tmp_path / "uvicorn.err", "w"),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            assert process.poll() is None, (tmp_path / "uvicorn.err").read_text()
+            try:
+                if httpx.get(f"{base_url}/api/health", timeout=1).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            assert time.monotonic() < deadline, "uvicorn did not start"
+            time.sleep(0.3)
+        yield base_url, api_app[0]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def test_parallel_borrows_single_winner(server, auth_headers):
+    from fastapi.testclient import TestClient
+    import app.database as database
+    from app.models.db_models import Book, BookLoan, BookStatus, ClubMember, LoanStatus, MemberRole
+
+    base_url, app = server
+    with TestClient(app) as client:
+        club_id = client.post("/api/clubs", json={"name": "Race"}, headers=auth_headers(OWNER_ID)).json()["id"]
+        book_id = client.post(
+            "/api/books", json={"title": "Кобзар", "author": "Т. Шевченко", "club_id": club_id},
+            headers=auth_headers(OWNER_ID)
+        ).json()["id"]
+
+    members = list(range(OWNER_ID + 1, OWNER_ID + 1 + CLIENTS))
+    db = database.SessionLocal()
+    try:
+        db.add_all([
+            ClubMember(club_id=club_id, user_id=str(user_id), user_name=f"User {user_id}",
+                       username=f"user{user_id}", role=MemberRole.MEMBER)
+            for user_id in members
+        ])
+        db.commit()
+
+        for _ in range(ROUNDS):
+            codes = run_in_parallel(
+                lambda http, user_id: http.post(f"{base_url}/api/books/{book_id}/borrow", headers=auth_headers(user_id)),
+                members
+            )
+            assert codes == Counter({200: 1, 409: CLIENTS - 1})
+
+            db.expire_all()
+            reading = db.query(BookLoan).filter(BookLoan.book_id == book_id, BookLoan.status == LoanStatus.READING).all()
+            assert len(reading) == 1
+            book = db.get(Book, book_id)
+            assert book.status == BookStatus.READING
+            assert book.last_loan_id == reading[0].id
+
+            # Переможець повертає книгу кількома одночасними запитами - спрацьовує лише один
+            winner = int(reading[0].user_id)
+            codes = run_in_parallel(
+                lambda http, _: http.post(f"{base_url}/api/books/{book_id}/return", headers=auth_headers(winner)),
+                list(range(8))
+            )
+            assert codes[200] == 1
+            assert set(codes) <= {200, 404, 409}
+
+            db.expire_all()
+            assert db.get(Book, book_id).status == BookStatus.AVAILABLE
+            assert db.query(BookLoan).filter(
+                BookLoan.book_id == book_id, BookLoan.status == LoanStatus.READING
+            ).count() == 0
+
+        assert db.get(Book, book_id).readers_count == ROUNDS
+    finally:
+        db.close()
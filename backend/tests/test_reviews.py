@@ -0,0 +1,58 @@
+"""
+Денормалізовані лічильники відгуків (rating_sum, rating_count, гістограма rating_05 .. rating_50)
+після створення, повторних оновлень і видалення відгуків.
+"""
+
+OWNER_ID = 1
+MEMBER_ID = 2
+
+
+def book_details(client, book_id, headers) -> dict:
+    response = client.get(f"/api/books/book/{book_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def histogram(details) -> dict:
+    return {bucket["rating"]: bucket["count"] for bucket in details["rating_histogram"] if bucket["count"]}
+
+
+def test_rating_updates_keep_histogram_consistent(api_app, auth_headers):
+    from fastapi.testclient import TestClient
+    import app.database as database
+    from app.models.db_models import ClubMember, MemberRole
+
+    app, _ = api_app
+    owner = auth_headers(OWNER_ID)
+    member = auth_headers(MEMBER_ID)
+    with TestClient(app) as client:
+        club_id = client.post("/api/clubs", json={"name": "Reviews"}, headers=owner).json()["id"]
+        book_id = client.post(
+            "/api/books", json={"title": "Кобзар", "author": "Т. Шевченко", "club_id": club_id}, headers=owner
+        ).json()["id"]
+        db = database.SessionLocal()
+        db.add(ClubMember(club_id=club_id, user_id=str(MEMBER_ID), user_name="User 2",
+                          username="user2", role=MemberRole.MEMBER))
+        db.commit()
+        db.close()
+
+        review_url = f"/api/books/{book_id}/review"
+        assert client.post(review_url, json={"rating": 3.0}, headers=owner).status_code == 200
+        assert client.post(review_url, json={"rating": 4.5}, headers=member).status_code == 200
+
+        # Та сама оцінка оновлюється двічі: відгук переходить між стовпчиками, а не множиться
+        assert client.post(review_url, json={"rating": 5.0, "comment": "Ще краще"}, headers=owner).status_code == 200
+        assert client.post(review_url, json={"rating": 0.5}, headers=owner).status_code == 200
+
+        details = book_details(client, book_id, owner)
+        assert details["rating_count"] == 2
+        assert sum(histogram(details).values()) == details["rating_count"]
+        assert histogram(details) == {0.5: 1, 4.5: 1}
+        assert details["average_rating"] == 2.5
+        assert len(client.get(f"/api/books/{book_id}/reviews", headers=owner).json()) == 2
+
+        assert client.delete(review_url, headers=member).status_code == 204
+        details = book_details(client, book_id, owner)
+        assert details["rating_count"] == 1
+        assert histogram(details) == {0.5: 1}
+        assert details["average_rating"] == 0.5
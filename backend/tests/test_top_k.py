@@ -0,0 +1,53 @@
+"""
+Space-Saving: оцінка не занижена (count >= точне значення) і точне значення
+не менше за count - error - зокрема після злиття підсумків.
+"""
+
+import random
+from collections import Counter
+
+from app.utils.top_k import SpaceSaving
+
+
+def summarize(events, capacity):
+    summary = SpaceSaving(capacity)
+    for key in events:
+        summary.add(key)
+    return summary
+
+
+def assert_bounds(summary, exact):
+    for key, count, error in summary.top(summary.capacity):
+        assert count - error <= exact[key] <= count, key
+
+
+def test_merge_disjoint_summaries():
+    first = summarize(["x"] * 5 + ["y"] * 3 + ["z"] * 2, capacity=3)
+    second = summarize(["p"] * 4 + ["q"] + ["r"], capacity=3)
+
+    first.merge(second)
+
+    # Відсутній у підсумку ключ отримує його мінімум (2 і 1) як лічильник і похибку
+    assert first.counters == {"x": [6, 1], "p": [6, 2], "y": [4, 1]}
+    assert_bounds(first, Counter(x=5, y=3, z=2, p=4, q=1, r=1))
+
+
+def test_merge_of_partial_summaries_never_underestimates():
+    rng = random.Random(0)
+    days = [[f"book{int(rng.paretovariate(1.2)) % 200}" for _ in range(500)] for _ in range(7)]
+
+    week = SpaceSaving(20)
+    for day in days:
+        week.merge(summarize(day, capacity=20))
+
+    exact = Counter(key for day in days for key in day)
+    assert_bounds(week, exact)
+    # Найпопулярніший елемент тижня лишається першим
+    assert week.top(1)[0][0] == exact.most_common(1)[0][0]
+
+
+def test_merge_into_empty_summary_is_copy():
+    day = summarize(["a", "b", "a", "c"], capacity=2)
+    merged = SpaceSaving(2)
+    merged.merge(day)
+    assert merged.counters == day.counters
@@ -37,7 +37,12 @@ const API = {
                 return null;
             }
             
-            return await response.json();
+            const data = await response.json();
+            // Посторінкові списки: курсор наступної сторінки приходить у заголовку X-Next-Cursor
+            if (options.withNextCursor) {
+                return { items: data, nextCursor: response.headers.get('X-Next-Cursor') };
+            }
+            return data;
         } catch (error) {
             console.error('API Error:', error);
             // showAlert не підтримується в старих версіях Telegram WebApp
@@ -164,8 +169,15 @@ const API = {
             });
         },
 
-        async getReviews(bookId) {
-            return API.request(`/api/books/${bookId}/reviews`);
+        // Сторінка відгуків: { items, nextCursor }; sort_by - newest або rating
+        async getReviews(bookId, { limit, cursor, sort_by } = {}) {
+            const params = new URLSearchParams();
+            if (limit) params.append('limit', limit);
+            if (cursor) params.append('cursor', cursor);
+            if (sort_by) params.append('sort_by', sort_by);
+            
+            const query = params.toString() ? `?${params}` : '';
+            return API.request(`/api/books/${bookId}/reviews${query}`, { withNextCursor: true });
         },
         
         // Google Books search
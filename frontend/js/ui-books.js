@@ -3,6 +3,10 @@ const UIBooks = {
 
     _requestSeq: 0,
 
+    // Відгуки, відкриті в модальному вікні книги: { bookId, sortBy, nextCursor }
+    reviewsState: null,
+    REVIEWS_PAGE_SIZE: 20,
+
     /**
      * Завантаження та відображення книг
      * @param {number} clubId - ID клубу
@@ -194,12 +198,17 @@ const UIBooks = {
             // Завантажити відгуки
             let reviewsHtml = '';
             try {
-                const reviews = await API.books.getReviews(bookId);
+                // Деталі книги містять першу сторінку відгуків, середній рейтинг і кількість відгуків
+                const reviews = book.reviews || [];
+                const reviewsCount = book.rating_count || reviews.length;
                 console.log('📝 Отримано відгуки:', reviews);
                 
-                if (reviews && reviews.length > 0) {
-                    // Розрахувати середній рейтинг
-                    const avgRating = reviews.reduce((sum, review) => sum + review.rating, 0) / reviews.length;
+                // Наступні сторінки - за reviews_next_cursor (див. loadMoreReviews)
+                UIBooks.reviewsState = { bookId, sortBy: 'newest', nextCursor: book.reviews_next_cursor };
+                
+                if (reviews.length > 0) {
+                    const avgRating = book.average_rating
+                        ?? reviews.reduce((sum, review) => sum + review.rating, 0) / reviews.length;
                     const avgStars = UIUtils.generateStarRating(avgRating);
                     
                     reviewsHtml = `
@@ -209,24 +218,21 @@ const UIBooks = {
                                 <div class="avg-rating">
                                     <span class="avg-stars">${avgStars}</span>
                                     <span class="avg-number">${avgRating.toFixed(1)} з 5</span>
-                                    <span class="reviews-count">(${reviews.length} ${UIUtils.getPluralForm(reviews.length, 'відгук', 'відгуки', 'відгуків')})</span>
+                                    <span class="reviews-count">(${reviewsCount} ${UIUtils.getPluralForm(reviewsCount, 'відгук', 'відгуки', 'відгуків')})</span>
                                 </div>
                             </div>
-                            ${reviews.map(review => {
-                                const stars = UIUtils.generateStarRating(review.rating);
-                                const date = new Date(review.created_at).toLocaleDateString('uk-UA');
-                                
-                                return `
-                                    <div class="review-item">
-                                        <div class="review-header">
-                                            <span class="review-user">👤 ${UIUtils.escapeHtml(review.user_name || review.username || 'Анонім')}</span>
-                                            <span class="review-date">${date}</span>
-                                        </div>
-                                        <div class="review-rating">${stars}</div>
-                                        ${review.comment ? `<div class="review-comment">${UIUtils.escapeHtml(review.comment)}</div>` : ''}
-                                    </div>
-                                `;
-                            }).join('')}
+                            ${reviewsCount > 1 ? `
+                                <div class="reviews-sort">
+                                    <button class="reviews-sort-chip active" data-sort="newest" onclick="UIBooks.setReviewsSort('newest')">Нові</button>
+                                    <button class="reviews-sort-chip" data-sort="rating" onclick="UIBooks.setReviewsSort('rating')">Найвищі оцінки</button>
+                                </div>
+                            ` : ''}
+                            <div id="book-reviews-list">
+                                ${reviews.map(review => UIBooks.renderReviewItem(review)).join('')}
+                            </div>
+                            <button id="load-more-reviews" class="btn btn-secondary btn-full" style="display: ${book.reviews_next_cursor ? 'block' : 'none'}; margin-top: var(--space-md);" onclick="UIBooks.loadMoreReviews()">
+                                Показати ще відгуки
+                            </button>
                         </div>
                     `;
                 } else {
@@ -352,6 +358,75 @@ const UIBooks = {
         }
     },
 
+    /**
+     * Один відгук у модальному вікні книги
+     */
+    renderReviewItem(review) {
+        const stars = UIUtils.generateStarRating(review.rating);
+        const date = new Date(review.created_at).toLocaleDateString('uk-UA');
+        
+        return `
+            <div class="review-item">
+                <div class="review-header">
+                    <span class="review-user">👤 ${UIUtils.escapeHtml(review.user_name || review.username || 'Анонім')}</span>
+                    <span class="review-date">${date}</span>
+                </div>
+                <div class="review-rating">${stars}</div>
+                ${review.comment ? `<div class="review-comment">${UIUtils.escapeHtml(review.comment)}</div>` : ''}
+            </div>
+        `;
+    },
+
+    /**
+     * Наступна сторінка відгуків (або перша - з cursor = null) у поточному сортуванні
+     */
+    async loadMoreReviews(replace = false) {
+        const state = this.reviewsState;
+        if (!state || (!replace && !state.nextCursor)) return;
+        
+        const button = document.getElementById('load-more-reviews');
+        if (button) button.disabled = true;
+        try {
+            const page = await API.books.getReviews(state.bookId, {
+                limit: this.REVIEWS_PAGE_SIZE,
+                cursor: replace ? null : state.nextCursor,
+                sort_by: state.sortBy
+            });
+            // Поки йшов запит, відкрили іншу книгу або змінили сортування
+            if (state !== this.reviewsState) return;
+            
+            const list = document.getElementById('book-reviews-list');
+            if (!list) return;
+            const html = page.items.map(review => this.renderReviewItem(review)).join('');
+            if (replace) {
+                list.innerHTML = html;
+            } else {
+                list.insertAdjacentHTML('beforeend', html);
+            }
+            state.nextCursor = page.nextCursor;
+            if (button) button.style.display = state.nextCursor ? 'block' : 'none';
+        } catch (error) {
+            console.error('Помилка завантаження відгуків:', error);
+        } finally {
+            if (button) button.disabled = false;
+        }
+    },
+
+    /**
+     * Перемикання сортування відгуків: newest або rating
+     */
+    setReviewsSort(sortBy) {
+        if (!this.reviewsState || this.reviewsState.sortBy === sortBy) return;
+        tg.HapticFeedback.impactOccurred('light');
+        
+        document.querySelectorAll('.reviews-sort-chip').forEach(chip => {
+            chip.classList.toggle('active', chip.dataset.sort === sortBy);
+        });
+        // Курсор прив'язаний до сортування, тож список завантажується з першої сторінки
+        this.reviewsState = { bookId: this.reviewsState.bookId, sortBy, nextCursor: null };
+        this.loadMoreReviews(true);
+    },
+
     /**
      * Позичити книгу
      */